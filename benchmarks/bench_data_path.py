@@ -0,0 +1,195 @@
+"""
+End-to-end data path benchmark against a local fake Meteomatics server.
+
+Starts the stand-in server from data_engine.fake_servers (with optional
+latency, injected errors and a rate limit), points the engine at it with a
+throwaway cache store, and measures:
+
+- cold vs. warm (memory tier) vs. warm-disk `get_processed_data_async` calls
+- `get_multiple_variables` fan-out, alone and with concurrent sessions
+- `cache_load` throughput from the memory tier and from the store
+- `analyze_variable` throughput for fresh and repeated series
+
+    python benchmarks/bench_data_path.py [--locations 20] [--latency 0.05] [--error-rate 0.1] [--out results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_engine.main as engine  # noqa: E402
+from data_engine.fake_servers import fake_meteomatics  # noqa: E402
+from data_engine.http_client import close_client, configure_client  # noqa: E402
+from data_engine.memcache import MEMORY_CACHE  # noqa: E402
+from data_engine.spatial import SpatialIndex  # noqa: E402
+from data_engine.store import CacheStore  # noqa: E402
+from modeling.main import analyze_variable  # noqa: E402
+from telemetry.main import METRICS  # noqa: E402
+
+DATE = "2024-07-01"
+VARIABLES = list(engine.VARIABLE_MAP)
+# Measure the Meteomatics path alone (and never reach the real NASA POWER API)
+engine.SOURCES = [engine.METEOMATICS]
+
+
+def reset_engine(root):
+    """Point the engine at an empty store and drop every in-memory cache."""
+    engine.STORE = CacheStore(root)
+    engine.SPATIAL = SpatialIndex()
+    engine._spatial_loaded = False
+    MEMORY_CACHE.clear()
+
+
+def summarize(latencies, **extra):
+    latencies = np.asarray(latencies, dtype=float)
+    return {
+        "calls": int(len(latencies)),
+        "total_seconds": float(latencies.sum()),
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "max_ms": float(latencies.max() * 1000),
+        **extra,
+    }
+
+
+def _ok(result):
+    return result["source"] != "Unavailable"
+
+
+async def timed_calls(calls):
+    """Await each zero-argument coroutine factory in turn; returns (latencies, results)."""
+    latencies, results = [], []
+    for call in calls:
+        start = time.perf_counter()
+        results.append(await call())
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def requests_delta(server, before):
+    return {name: server.stats.get(name, 0) - before.get(name, 0) for name in server.stats}
+
+
+# --- Scenarios ---
+def bench_single_variable(server, locations):
+    results = {}
+    for phase in ("cold", "warm", "warm_disk"):
+        if phase == "warm_disk":
+            MEMORY_CACHE.clear()
+        before = dict(server.stats)
+        calls = [lambda loc=loc: engine.get_processed_data_async(DATE, "Temperature", loc) for loc in locations]
+        latencies, out = asyncio.run(timed_calls(calls))
+        results[phase] = summarize(latencies, ok=sum(map(_ok, out)), server=requests_delta(server, before))
+    return results
+
+
+def bench_fan_out(server, locations, sessions):
+    results = {}
+    before = dict(server.stats)
+    calls = [lambda loc=loc: engine.get_multiple_variables(DATE, VARIABLES, loc) for loc in locations]
+    latencies, out = asyncio.run(timed_calls(calls))
+    results["sequential"] = summarize(latencies, variables=len(VARIABLES),
+                                      ok=sum(_ok(r) for rs in out for r in rs), server=requests_delta(server, before))
+
+    # Concurrent sessions asking for the same new location should share one fetch
+    async def concurrent(loc):
+        return await asyncio.gather(*(engine.get_multiple_variables(DATE, VARIABLES, loc) for _ in range(sessions)))
+
+    latencies = []
+    before = dict(server.stats)
+    for lat, lon in np.random.default_rng(1).uniform([-40, -100], [40, 100], size=(3, 2)):
+        start = time.perf_counter()
+        asyncio.run(concurrent({"lat": round(lat, 4), "lon": round(lon, 4)}))
+        latencies.append(time.perf_counter() - start)
+    results["concurrent"] = summarize(latencies, sessions=sessions, server=requests_delta(server, before))
+    return results
+
+
+def bench_cache_load(locations, passes):
+    results = {}
+    for tier in ("memory", "store"):
+        latencies = []
+        for _ in range(passes):
+            if tier == "store":
+                MEMORY_CACHE.clear()
+            for loc in locations:
+                start = time.perf_counter()
+                engine.cache_load(loc["lat"], loc["lon"], "Temperature", "meteomatics")
+                latencies.append(time.perf_counter() - start)
+        stats = summarize(latencies)
+        stats["loads_per_second"] = stats["calls"] / stats["total_seconds"]
+        results[tier] = stats
+    return results
+
+
+def bench_analyze(n_series, seed):
+    rng = np.random.default_rng(seed)
+    fresh = [{"values": rng.gumbel(20, 3, size=30)} for _ in range(n_series)]
+    results = {}
+    for name, series in (("fresh", fresh), ("repeated", fresh)):
+        start = time.perf_counter()
+        for data in series:
+            analyze_variable(data, 25.0)
+        elapsed = time.perf_counter() - start
+        results[name] = {"calls": n_series, "total_seconds": elapsed, "fits_per_second": n_series / elapsed}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=20, help="Distinct locations per scenario")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions in the fan-out scenario")
+    parser.add_argument("--passes", type=int, default=20, help="Passes over the locations for cache_load")
+    parser.add_argument("--series", type=int, default=2000, help="Series for the analyze_variable scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake server latency per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random fake server latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit", type=float, help="Fake server requests per second before 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("METEOMATICS_USERNAME", "bench")
+    os.environ.setdefault("METEOMATICS_PASSWORD", "bench")
+    rng = np.random.default_rng(args.seed)
+    coords = rng.uniform([-40, -100], [40, 100], size=(2 * args.locations, 2)).round(4)
+    single = [{"lat": lat, "lon": lon} for lat, lon in coords[:args.locations]]
+    multi = [{"lat": lat, "lon": lon} for lat, lon in coords[args.locations:]]
+
+    results = {
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+    }
+    server = fake_meteomatics(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              rate_limit=args.rate_limit, seed=args.seed)
+    with tempfile.TemporaryDirectory() as root, server:
+        configure_client(base_url=server.url)
+        reset_engine(Path(root) / "store")
+        results["get_processed_data_async"] = bench_single_variable(server, single)
+        results["get_multiple_variables"] = bench_fan_out(server, multi, args.sessions)
+        results["cache_load"] = bench_cache_load(single, args.passes)
+        results["server"] = dict(server.stats)
+        results["scheduler"] = engine.SCHEDULER.stats()
+        close_client()
+    results["analyze_variable"] = bench_analyze(args.series, args.seed)
+    results["stages"] = METRICS.snapshot()["stages"]
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold-start benchmark: import time of the app, the engine and headless workers.
+
+Each target is imported in a fresh interpreter with `-X importtime`, a few
+times over, after one discarded warm-up run that compiles bytecode. Reports
+the median total import time, wall time to interpreter exit, the heaviest
+top-level packages and which of the known heavy dependencies were loaded (they
+should only be imported on first use). The "app" target runs the top-level
+imports of src/frontend/app.py without executing the Streamlit script.
+
+    python benchmarks/bench_import.py [--repeat 5] [--target engine --target app] [--out results.json]
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).parent.parent / "src"
+
+
+def app_imports():
+    """The import statements at the top level of the Streamlit app, as source code."""
+    path = SRC / "frontend" / "app.py"
+    tree = ast.parse(path.read_text())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+TARGETS = {
+    "engine": "import data_engine.main",
+    "model": "import modeling.main",
+    "service": "import service.main",
+    "worker": "import pipeline.main",
+    "app": app_imports,
+}
+# Imported lazily by the code above; listed here to catch regressions
+HEAVY_MODULES = ("scipy.stats", "sklearn", "matplotlib", "pyarrow", "pyarrow.dataset", "pandas", "folium")
+
+
+def parse_importtime(stderr):
+    """Per-module (self_us, cumulative_us, name, depth) rows from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return rows
+
+
+def run_once(code):
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=SRC, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{proc.stderr.splitlines()[-1] if proc.stderr else ''}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def bench_target(code, repeat, top):
+    run_once(code)  # compile .pyc files
+    walls, totals, runs = [], [], []
+    for _ in range(repeat):
+        wall, rows = run_once(code)
+        walls.append(wall)
+        totals.append(sum(self_us for self_us, _, _, _ in rows) / 1000)
+        runs.append(rows)
+    rows = runs[totals.index(statistics.median_low(totals))]
+    packages = {}
+    for _, cumulative_us, name, depth in rows:
+        if depth == 1:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0) + cumulative_us / 1000
+    loaded = {name for _, _, name, _ in rows}
+    return {
+        "import_ms_median": round(statistics.median(totals), 1),
+        "import_ms_min": round(min(totals), 1),
+        "wall_ms_median": round(statistics.median(walls) * 1000, 1),
+        "modules": len(rows),
+        "top_packages_ms": {k: round(v, 1) for k, v in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", action="append", choices=list(TARGETS), help="Targets to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs per target")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest top-level packages to report")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+    }
+    for name in args.target or list(TARGETS):
+        code = TARGETS[name]() if callable(TARGETS[name]) else TARGETS[name]
+        results[name] = bench_target(code, args.repeat, args.top)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Bulk multi-location fetching for batch jobs.
+
+Points are checked against the cached histories first; points missing any of
+the requested annual samples are grouped into multi-coordinate Meteomatics
+requests that run with bounded concurrency and a request-rate budget. Results
+stream back per point as each request finishes.
+"""
+import asyncio
+import logging
+
+import numpy as np
+
+from data_engine.main import (
+    _is_supported,
+    _series_result,
+    _unavailable,
+    annual_targets,
+    cache_load,
+    cache_load_nearest,
+    cache_save_many,
+    fetch_meteomatics_series,
+    present_mask,
+)
+from data_engine.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 5.0  # requests per second
+
+
+async def iter_bulk_variables(points, variable_names, selected_date, chunk_size=DEFAULT_CHUNK_SIZE,
+                              concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=None):
+    """Yield (index, {variable: result}) for each point as soon as its data is ready.
+
+    Only the annual samples for `selected_date` are fetched (one value per year per
+    point), which keeps multi-coordinate responses small; they are stored as rows
+    of each point's daily history.
+
+    Args:
+        points: Sequence of (lat, lon) pairs or an (N, 2) array
+        variable_names: Variables to fetch for every point
+        selected_date: Analysis date, 'YYYY-MM-DD'
+        chunk_size: Maximum coordinates per Meteomatics request
+        concurrency: Maximum requests in flight
+        rate: Maximum requests per second (None for no limit)
+        burst: Requests allowed back-to-back before `rate` applies
+    """
+    points = [(float(lat), float(lon)) for lat, lon in np.asarray(points, dtype=float).reshape(-1, 2)]
+    supported = [v for v in dict.fromkeys(variable_names) if _is_supported(v)]
+    unsupported = [v for v in variable_names if v not in supported]
+    targets = annual_targets(selected_date)
+    targets = targets[targets <= np.datetime64("today", "D")]
+
+    # 1. Serve points whose histories already hold every annual sample
+    pending = []
+    for i, (lat, lon) in enumerate(points):
+        results = {v: _unavailable(v, f"Variable '{v}' is not available from Meteomatics API.") for v in unsupported}
+        missing = []
+        for var in supported:
+            history, _, distance = cache_load_nearest(lat, lon, var, "meteomatics")
+            if history is None or not present_mask(history.dates, targets)[0].all():
+                missing.append(var)
+            else:
+                results[var] = _series_result(var, history, selected_date, 0, "Meteomatics (cache)", distance)
+        if missing:
+            pending.append((i, results, missing))
+        else:
+            yield i, results
+
+    # 2. Fetch the rest in multi-coordinate chunks
+    chunks = iter([pending[k:k + chunk_size] for k in range(0, len(pending), chunk_size)])
+    n_workers = min(concurrency, -(-len(pending) // chunk_size))
+    if n_workers == 0 or len(targets) == 0:
+        for i, results, missing in pending:
+            results.update({var: _unavailable(var) for var in missing})
+            yield i, results
+        return
+    bucket = TokenBucket(rate, burst) if rate else None
+    queue = asyncio.Queue(maxsize=concurrency * chunk_size)
+
+    async def worker():
+        try:
+            for chunk in chunks:
+                variables = [v for v in supported if any(v in missing for _, _, missing in chunk)]
+                try:
+                    if bucket is not None:
+                        await bucket.acquire()
+                    fetched = await fetch_meteomatics_series(
+                        [points[i] for i, _, _ in chunk], targets[0], targets[-1], variables, step="P1Y"
+                    )
+                    # One store fragment per variable for the whole chunk
+                    for var in variables:
+                        cache_save_many(var, "meteomatics", [
+                            (*points[i], *point_data[var]) for (i, _, missing), point_data in zip(chunk, fetched)
+                            if var in missing and point_data[var] is not None
+                        ])
+                    for (i, results, missing), point_data in zip(chunk, fetched):
+                        lat, lon = points[i]
+                        for var in missing:
+                            history = cache_load(lat, lon, var, "meteomatics")
+                            results[var] = (
+                                _series_result(var, history, selected_date, 0, "Meteomatics")
+                                if history is not None else _unavailable(var)
+                            )
+                except Exception as e:
+                    logger.warning("Bulk fetch error for %d point(s): %s", len(chunk), e)
+                    for _, results, missing in chunk:
+                        for var in missing:
+                            results.setdefault(var, _unavailable(var, str(e)))
+                for i, results, _ in chunk:
+                    await queue.put((i, results))
+        finally:
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(n_workers)]
+    finished = 0
+    try:
+        while finished < n_workers:
+            item = await queue.get()
+            if item is None:
+                finished += 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_bulk_variables(points, variable_names, selected_date, **kwargs):
+    """Collect `iter_bulk_variables` into a list of {variable: result} dicts in point order."""
+    results = [None] * len(points)
+    async for i, point_results in iter_bulk_variables(points, variable_names, selected_date, **kwargs):
+        results[i] = point_results
+    return results
@@ -0,0 +1,66 @@
+"""
+Configuration for the data engine outside of Streamlit.
+
+Settings are read from a TOML file with the same layout as Streamlit's
+`.streamlit/secrets.toml` (e.g. a `[meteomatics]` table with `username` and
+`password`), so the app, the HTTP service and headless jobs share one file.
+The file is the one named by RISK_EXPLORER_CONFIG, else the first
+`.streamlit/secrets.toml` found in the working directory or the project root.
+Environment variables fill in whatever the file does not set.
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ENV = "RISK_EXPLORER_CONFIG"
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+SEARCH_PATHS = (Path.cwd() / ".streamlit" / "secrets.toml", PROJECT_ROOT / ".streamlit" / "secrets.toml")
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def config_path():
+    """The config file in use, or None if there is none."""
+    if os.environ.get(CONFIG_ENV):
+        return Path(os.environ[CONFIG_ENV])
+    return next((path for path in SEARCH_PATHS if path.is_file()), None)
+
+
+def load_config(reload=False):
+    """The parsed config file as a dict (empty if there is none or it cannot be read); read once."""
+    global _config
+    with _config_lock:
+        if _config is None or reload:
+            path = config_path()
+            _config = {}
+            if path is not None:
+                try:
+                    with open(path, "rb") as f:
+                        _config = tomllib.load(f)
+                except (OSError, tomllib.TOMLDecodeError) as e:
+                    logger.warning("Could not read config %s: %s", path, e)
+        return _config
+
+
+def setting(section, key, env=None, default=None):
+    """`[section] key` from the config file, else environment variable `env`, else `default`."""
+    value = load_config().get(section, {}).get(key)
+    if value is None and env:
+        value = os.environ.get(env)
+    return default if value is None else value
+
+
+def meteomatics_credentials():
+    """(username, password) for Meteomatics, or None if either is unset."""
+    user = setting("meteomatics", "username", "METEOMATICS_USERNAME")
+    pw = setting("meteomatics", "password", "METEOMATICS_PASSWORD")
+    return (user, pw) if user and pw else None
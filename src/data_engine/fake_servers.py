@@ -0,0 +1,260 @@
+"""
+Local stand-in servers for the data engine's providers (Meteomatics, NASA POWER).
+
+Used by benchmarks and tests to exercise the HTTP path without real
+credentials or network access. Responses follow the provider's JSON shape with
+deterministic synthetic values. Servers can add latency, fail a fraction of
+requests and enforce a request rate, to mimic a slow or overloaded provider.
+"""
+import calendar
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from data_engine.ratelimit import TokenBucket
+
+
+def synthetic_value(parameter, lat, lon, day):
+    """Deterministic, seasonal value for a parameter at a location and date."""
+    doy = day.timetuple().tm_yday
+    season = math.sin(2 * math.pi * (doy - 80) / 365.25) * (1 if lat >= 0 else -1)
+    wiggle = math.sin(day.year * 12.9898 + lat * 78.233 + lon * 37.719 + doy) * 0.5
+    name = parameter.split(":")[0]
+    if name.startswith("t_2m") or name == "T2M":
+        return round(15 - abs(lat) * 0.3 + 10 * season + 4 * wiggle, 2)
+    if name.startswith("precip") or name == "PRECTOTCORR":
+        return round(max(0.0, 3 + 6 * wiggle + 2 * season), 2)
+    if name.startswith("wind_speed") or name == "WS2M":
+        return round(4 + 2 * abs(wiggle) + season, 2)
+    if name.startswith("relative_humidity") or name == "RH2M":
+        return round(min(100.0, max(0.0, 65 - 15 * season + 10 * wiggle)), 2)
+    return round(wiggle, 2)
+
+
+def _parse_time(text):
+    return datetime.strptime(text[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+def _time_steps(spec):
+    """Expand a Meteomatics `start--end:step` time specification."""
+    span, step = spec.split(":P", 1) if ":P" in spec else (spec, "1D")
+    start, end = (_parse_time(t) for t in span.split("--"))
+    count, unit = int(step[:-1]), step[-1]
+    steps = []
+    while True:
+        i = len(steps) * count
+        if unit == "Y":
+            year = start.year + i
+            leap_day = (start.month, start.day) == (2, 29) and not calendar.isleap(year)
+            current = start.replace(year=year, day=28) if leap_day else start.replace(year=year)
+        else:
+            current = start + timedelta(days=i)
+        if current > end:
+            return steps
+        steps.append(current)
+
+
+class _MeteomaticsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stats_add("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.stats_add("requests")
+        if not self.server.admit(self):
+            return
+        try:
+            times, params, coords, _ = unquote(self.path).strip("/").split("/")
+            steps = _time_steps(times)
+            points = [tuple(float(x) for x in c.split(",")) for c in coords.split("+")]
+        except Exception:
+            return self._send(400, {"status": "error", "message": f"Bad request path {self.path}"})
+        body = {
+            "version": "3.0",
+            "status": "OK",
+            "data": [
+                {
+                    "parameter": param,
+                    "coordinates": [
+                        {
+                            "lat": lat,
+                            "lon": lon,
+                            "dates": [
+                                {"date": s.strftime("%Y-%m-%dT%H:%M:%SZ"), "value": synthetic_value(param, lat, lon, s)}
+                                for s in steps
+                            ],
+                        }
+                        for lat, lon in points
+                    ],
+                }
+                for param in params.split(",")
+            ],
+        }
+        self._send(200, body)
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up on this request (timed out, or a hedge won)
+
+
+class _NasaPowerHandler(_MeteomaticsHandler):
+    """Daily point endpoint: /api/temporal/daily/point?parameters=..&latitude=..&longitude=..&start=..&end=.."""
+
+    # Days before today that have no data yet, answered with the fill value like the real API
+    LAG_DAYS = 3
+    FILL_VALUE = -999.0
+
+    def do_GET(self):
+        self.server.stats_add("requests")
+        if not self.server.admit(self):
+            return
+        try:
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            params = query["parameters"].split(",")
+            lat, lon = float(query["latitude"]), float(query["longitude"])
+            start, end = (datetime.strptime(query[k], "%Y%m%d") for k in ("start", "end"))
+        except Exception:
+            return self._send(422, {"messages": [f"Bad request {self.path}"]})
+        if url.path.rstrip("/") != "/api/temporal/daily/point":
+            return self._send(404, {"messages": [f"No route {url.path}"]})
+        available = datetime.now() - timedelta(days=self.LAG_DAYS)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        body = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "header": {"fill_value": self.FILL_VALUE, "start": query["start"], "end": query["end"]},
+            "properties": {
+                "parameter": {
+                    param: {
+                        d.strftime("%Y%m%d"): synthetic_value(param, lat, lon, d) if d <= available else self.FILL_VALUE
+                        for d in days
+                    }
+                    for param in params
+                }
+            },
+        }
+        self._send(200, body)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded HTTP server on localhost that counts connections and requests.
+
+    Args:
+        handler: Request handler class
+        port: Port to listen on (0 picks a free one)
+        latency: Seconds added to every response
+        jitter: Extra latency drawn uniformly from [0, jitter) seconds
+        error_rate: Fraction of requests answered with HTTP 500
+        rate_limit: Requests per second allowed before answering HTTP 429 (None for no limit)
+        burst: Requests allowed back-to-back before `rate_limit` applies
+        seed: Seed for the latency jitter and error draws
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler, port=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, burst=None,
+                 seed=0):
+        super().__init__(("127.0.0.1", port), handler)
+        self.stats = {"connections": 0, "requests": 0, "errors": 0, "rate_limited": 0}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    def admit(self, handler):
+        """Apply latency, rate limit and injected errors. Returns False if a reply was already sent."""
+        with self._stats_lock:
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if self.bucket is not None:
+            wait = self.bucket.try_acquire()
+            if wait:
+                self.stats_add("rate_limited")
+                handler._send(429, {"status": "error", "message": "Rate limit exceeded"},
+                              {"Retry-After": str(max(1, math.ceil(wait)))})
+                return False
+        if fail:
+            self.stats_add("errors")
+            handler._send(500, {"status": "error", "message": "Injected server error"})
+            return False
+        return True
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats_add(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + n
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def fake_meteomatics(port=0, **options):
+    """Create (not start) a stand-in for the Meteomatics time-series API. Options are as for FakeServer."""
+    return FakeServer(_MeteomaticsHandler, port, **options)
+
+
+def fake_nasa_power(port=0, **options):
+    """Create (not start) a stand-in for the NASA POWER daily point API; its endpoint is
+    `server.url + "/api/temporal/daily/point"`. Options are as for FakeServer."""
+    return FakeServer(_NasaPowerHandler, port, **options)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a fake provider API on localhost.")
+    parser.add_argument("--provider", choices=("meteomatics", "nasa_power"), default="meteomatics")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before answering 429")
+    args = parser.parse_args()
+    factory = fake_nasa_power if args.provider == "nasa_power" else fake_meteomatics
+    server = factory(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     rate_limit=args.rate_limit)
+    print(f"Fake {args.provider} API listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,113 @@
+"""
+Regional grids for area-wide risk maps.
+
+A bounding box is split into `n_lat` x `n_lon` cells and the annual samples for
+the selected calendar day are fetched for every cell centre in bulk
+(multi-coordinate Meteomatics requests, see data_engine.bulk), so each point
+lands in the cache like any other location. The result is one compact float32
+array of shape (years, n_lat, n_lon), ready for vectorized fitting with
+modeling.main.analyze_grid.
+"""
+import logging
+
+import numpy as np
+
+from data_engine.bulk import iter_bulk_variables
+from data_engine.main import VARIABLE_MAP, annual_targets
+from data_engine.spatial import EARTH_RADIUS_KM
+from data_engine.timeseries import TimeSeries
+from telemetry.main import timed
+
+logger = logging.getLogger(__name__)
+
+MAX_CELLS = 50 * 50
+
+
+class RegionalGrid:
+    """Annual samples of one variable on a regular lat/lon grid (rows run south to north)."""
+
+    __slots__ = ("dates", "lats", "lons", "values", "variable", "unit")
+
+    def __init__(self, dates, lats, lons, values, variable=None, unit=None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.values = np.asarray(values, dtype=np.float32)
+        expected = (len(self.dates), len(self.lats), len(self.lons))
+        if self.values.shape != expected:
+            raise ValueError(f"values have shape {self.values.shape}, expected {expected}")
+        self.variable = variable
+        self.unit = unit
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.dates.nbytes + self.lats.nbytes + self.lons.nbytes
+
+    @property
+    def bounds(self):
+        """Outer cell edges as ((south, west), (north, east))."""
+        half_lat = (self.lats[1] - self.lats[0]) / 2 if len(self.lats) > 1 else 0.0
+        half_lon = (self.lons[1] - self.lons[0]) / 2 if len(self.lons) > 1 else 0.0
+        return ((self.lats[0] - half_lat, self.lons[0] - half_lon), (self.lats[-1] + half_lat, self.lons[-1] + half_lon))
+
+    def coverage(self):
+        """Fraction of cells with at least one value."""
+        return float(np.mean(np.any(~np.isnan(self.values), axis=0)))
+
+    def cell(self, i, j):
+        """The series of cell (i, j) as a TimeSeries."""
+        return TimeSeries(self.dates, self.values[:, i, j].astype(float), self.variable, self.unit, "grid",
+                          lat=float(self.lats[i]), lon=float(self.lons[j]))
+
+    def __repr__(self):
+        return f"RegionalGrid({self.variable!r}, shape={self.shape}, coverage={self.coverage():.0%})"
+
+
+def bbox_around(lat, lon, half_width_km):
+    """(south, west, north, east) of a square box `2 * half_width_km` wide centred on a point."""
+    dlat = np.degrees(half_width_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+    return (max(lat - dlat, -90.0), lon - dlon, min(lat + dlat, 90.0), lon + dlon)
+
+
+def grid_axes(bbox, shape):
+    """Cell-centre latitudes (south to north) and longitudes (west to east) of `bbox` split into `shape` cells."""
+    south, west, north, east = bbox
+    n_lat, n_lon = shape
+    lat_edges = np.linspace(south, north, n_lat + 1)
+    lon_edges = np.linspace(west, east, n_lon + 1)
+    return (lat_edges[:-1] + lat_edges[1:]) / 2, (lon_edges[:-1] + lon_edges[1:]) / 2
+
+
+async def fetch_grid(bbox, shape, variable_name, selected_date, **bulk_options):
+    """
+    Fetch the annual samples of one variable for every cell of a grid.
+    Args:
+        bbox: (south, west, north, east) in degrees
+        shape: (n_lat, n_lon) cells, at most MAX_CELLS in total
+        variable_name: UI variable name
+        selected_date: Analysis date, 'YYYY-MM-DD'
+        bulk_options: chunk_size, concurrency, rate, burst for iter_bulk_variables
+    Returns:
+        RegionalGrid; cells without data are NaN
+    """
+    n_lat, n_lon = shape
+    if n_lat * n_lon > MAX_CELLS:
+        raise ValueError(f"Grid of {n_lat}x{n_lon} cells exceeds the limit of {MAX_CELLS}.")
+    lats, lons = grid_axes(bbox, shape)
+    dates = annual_targets(selected_date)
+    values = np.full((len(dates), n_lat, n_lon), np.nan, dtype=np.float32)
+    points = np.stack(np.meshgrid(lats, lons, indexing="ij"), axis=-1).reshape(-1, 2)
+    with timed("grid_fetch", variable=variable_name):
+        async for k, results in iter_bulk_variables(points, [variable_name], selected_date, **bulk_options):
+            series = results[variable_name]
+            if len(series) == len(dates):
+                values[:, k // n_lon, k % n_lon] = series.values
+    unit = VARIABLE_MAP[variable_name][1] if variable_name in VARIABLE_MAP else None
+    grid = RegionalGrid(dates, lats, lons, values, variable_name, unit)
+    logger.info("Fetched %s (%.1f kB).", grid, grid.nbytes / 1024)
+    return grid
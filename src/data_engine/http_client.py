@@ -0,0 +1,160 @@
+"""
+Long-lived, pooled HTTP client for the data engine.
+
+httpx.AsyncClient is bound to the event loop it was created on, while Streamlit
+starts a fresh loop for every `asyncio.run`. The client therefore lives on a
+dedicated background event loop owned by the engine, and requests made from any
+other loop are handed over to it. Connections are kept alive and reused across
+calls and sessions. Synchronous callers (the Streamlit script) can run whole
+engine coroutines on that loop with `run_sync` or `submit` instead of starting
+a new loop per call.
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+METEOMATICS_URL = "https://api.meteomatics.com"
+
+
+class EngineClient:
+    """Pooled httpx client running on its own event loop thread."""
+
+    def __init__(self, base_url=METEOMATICS_URL, max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=30.0, timeout=15.0, http2=True):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._client = None
+
+    def start(self):
+        """Start the engine loop and client if they are not running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, limits=self.limits, timeout=self.timeout, http2=self.http2
+            )
+            self._loop = loop
+            self._thread = threading.Thread(target=self._run, args=(loop,), name="data-engine-loop", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _run(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule `coro` on the engine loop. Returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro, timeout=None):
+        """Run `coro` on the engine loop and block until it finishes (not callable from that loop)."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run_sync() would block the engine loop it waits on; await the coroutine instead.")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    async def request(self, method, url, **kwargs):
+        """Send a request through the shared pool, from whichever loop the caller is on."""
+        self.start()
+        if asyncio.get_running_loop() is self._loop:
+            return await self._send(method, url, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(self._send(method, url, **kwargs), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def _send(self, method, url, **kwargs):
+        self.requests += 1
+        return await self._client.request(method, url, **kwargs)
+
+    def close(self, timeout=5.0):
+        """Close pooled connections and stop the engine loop."""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop = self._thread = self._client = None
+        if thread is None:
+            return
+        if loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout)
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+# --- Process-wide client ---
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared engine client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EngineClient()
+        return _client
+
+
+def configure_client(**kwargs):
+    """Replace the shared client with one built from `kwargs` (see EngineClient)."""
+    global _client
+    with _client_lock:
+        old, _client = _client, EngineClient(**kwargs)
+    if old is not None:
+        old.close()
+    return _client
+
+
+def submit(coro):
+    """Schedule `coro` on the shared engine loop. Returns a concurrent.futures.Future."""
+    return get_client().submit(coro)
+
+
+def run_sync(coro, timeout=None):
+    """Run `coro` on the shared engine loop and wait for its result."""
+    return get_client().run_sync(coro, timeout)
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        old, _client = _client, None
+    if old is not None:
+        old.close()
+
+
+atexit.register(close_client)
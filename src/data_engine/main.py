@@ -1,23 +1,29 @@
-
-
-
-
-import os
 import asyncio
-import httpx
+import logging
+import queue
+import threading
+import time
 import numpy as np
-import pandas as pd
-from datetime import datetime
 from pathlib import Path
-import json
-import streamlit as st
+from data_engine.config import meteomatics_credentials
+from data_engine.http_client import get_client, run_sync, submit
+from data_engine.memcache import MEMORY_CACHE, MemoryCache
+from data_engine.scheduler import CircuitOpenError, RequestScheduler
+from data_engine.singleflight import FLIGHTS
+from data_engine.sources import NasaPowerSource, Source, fetch_first_good
+from data_engine.spatial import SpatialIndex, haversine_km, tolerance_for
+from data_engine.store import CacheStore, cache_key, merge_series
+from data_engine.timeseries import TimeSeries
+from telemetry.main import METRICS, timed
 
 """
 NASA Hackathon Data Engine
-Hybrid backend for async weather/climate data fetching from NASA POWER, GES DISC OPeNDAP, and Meteomatics (fallback).
+Hybrid backend for async weather/climate data fetching from Meteomatics and NASA POWER (see data_engine.sources).
 Caches all results in /data/cache/.
 """
 
+logger = logging.getLogger(__name__)
+
 # --- Variable mapping (UI name -> (NASA var, unit, Meteomatics var, GES DISC var)) ---
 VARIABLE_MAP = {
     'Temperature':      ('T2M', '°C', 't_2m:C', None),
@@ -28,112 +34,572 @@ VARIABLE_MAP = {
 
 # --- Caching helpers ---
 CACHE_DIR = Path(__file__).parent.parent.parent / "data" / "cache"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+STORE = CacheStore(CACHE_DIR / "store")
+SPATIAL = SpatialIndex()
+_spatial_lock = threading.Lock()
+_spatial_loaded = False
+
+METRICS.register_collector("memory_cache", MEMORY_CACHE.stats)
+METRICS.register_collector("singleflight", FLIGHTS.stats)
+METRICS.register_collector("spatial", lambda: SPATIAL.stats())
+
+def _ensure_spatial_index():
+    """Index every series already in the store, once per process."""
+    global _spatial_loaded
+    with _spatial_lock:
+        if _spatial_loaded:
+            return
+        for row in STORE.keys().itertuples(index=False):
+            SPATIAL.add((row.variable, row.source), row.lat, row.lon)
+        _spatial_loaded = True
+
+def cache_save(lat, lon, variable, dates, values, source):
+    """Append daily observations to the history of a location and refresh the memory tier."""
+    key = cache_key(lat, lon, source)
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype=float)
+    with timed("cache_write", source=source):
+        STORE.append(variable, key, lat, lon, source, dates, values)
+        # Only extend a history already held in memory; otherwise the next load reads the full store.
+        cached = MEMORY_CACHE.get((variable, key))
+        if cached is not None:
+            dates, values = merge_series(cached.dates, cached.values, dates, values)
+            MEMORY_CACHE.put((variable, key), TimeSeries(dates, values, variable, source=source))
+        SPATIAL.add((variable, source), lat, lon)
+
+def cache_save_many(variable, source, items):
+    """cache_save for many locations at once, written as one store fragment per partition.
+
+    `items` is a list of (lat, lon, dates, values).
+    """
+    series = [(cache_key(lat, lon, source), lat, lon, np.asarray(dates, dtype="datetime64[D]"),
+               np.asarray(values, dtype=float)) for lat, lon, dates, values in items]
+    with timed("cache_write", source=source):
+        STORE.append_many(variable, source, series)
+        for key, lat, lon, dates, values in series:
+            cached = MEMORY_CACHE.get((variable, key))
+            if cached is not None:
+                dates, values = merge_series(cached.dates, cached.values, dates, values)
+                MEMORY_CACHE.put((variable, key), TimeSeries(dates, values, variable, source=source))
+            SPATIAL.add((variable, source), lat, lon)
+
+def cache_load(lat, lon, variable, source):
+    """Daily history of a location as a TimeSeries, or None."""
+    key = cache_key(lat, lon, source)
+    cached = MEMORY_CACHE.get((variable, key))
+    if cached is not None:
+        METRICS.inc("cache_requests_total", tier="memory", result="hit")
+        return cached
+    hit = STORE.get(variable, key, lat, lon)
+    METRICS.inc("cache_requests_total", tier="store", result="miss" if hit is None else "hit")
+    if hit is None:
+        return None
+    dates, values = hit
+    cached = TimeSeries(dates, values, variable, source=source)
+    MEMORY_CACHE.put((variable, key), cached)
+    return cached
+
+def cache_load_nearest(lat, lon, variable, source, tolerance_km=None):
+    """Exact history lookup, then the nearest cached location within the source's tolerance.
+
+    Returns (data, (lat, lon), distance_km); data is None on a miss.
+    """
+    cached = cache_load(lat, lon, variable, source)
+    if cached is not None:
+        return cached, (lat, lon), 0.0
+    _ensure_spatial_index()
+    tolerance = tolerance_for(source) if tolerance_km is None else tolerance_km
+    near = SPATIAL.nearest((variable, source), lat, lon, tolerance)
+    if near is None:
+        return None, (lat, lon), None
+    near_lat, near_lon, distance = near
+    cached = cache_load(near_lat, near_lon, variable, source)
+    if cached is None:
+        return None, (lat, lon), None
+    return cached, (near_lat, near_lon), distance
+
+
+
+
+
+# --- History slicing ---
+HISTORY_YEARS = 30
+_NO_DATES = np.array([], dtype="datetime64[D]")
+
+def annual_targets(selected_date, years=HISTORY_YEARS):
+    """The selected calendar day in each of the last `years` years (Feb 29 falls back to Feb 28)."""
+    day = np.datetime64(selected_date, "D")
+    month = day.astype("datetime64[M]")
+    day_offset = day - month.astype("datetime64[D]")
+    year = month.astype("datetime64[Y]").astype(int) + 1970
+    months = ((np.arange(year - years + 1, year + 1) - 1970) * 12 + month.astype(int) % 12).astype("datetime64[M]")
+    last_days = (months + 1).astype("datetime64[D]") - 1
+    return np.minimum(months.astype("datetime64[D]") + day_offset, last_days)
+
+def window_targets(selected_date, window=0, years=HISTORY_YEARS):
+    """All days within `window` days of the selected calendar day, in each year."""
+    return (annual_targets(selected_date, years)[:, None] + np.arange(-window, window + 1)).ravel()
 
-def cache_path(lat, lon, variable, date, source):
-    safe_var = variable.replace(" ", "_")
-    return CACHE_DIR / f"{safe_var}_{lat:.4f}_{lon:.4f}_{date}_{source}.parquet"
+def present_mask(dates, targets):
+    """Boolean mask of `targets` found in the sorted `dates`, plus their positions."""
+    if len(dates) == 0:
+        return np.zeros(len(targets), dtype=bool), np.zeros(len(targets), dtype=int)
+    idx = np.minimum(np.searchsorted(dates, targets), len(dates) - 1)
+    return dates[idx] == targets, idx
 
-def cache_save(lat, lon, variable, date, data, source):
-    path = cache_path(lat, lon, variable, date, source)
-    df = pd.DataFrame({"dates": data["dates"], "values": data["values"]})
-    df.to_parquet(path, index=False)
+def slice_history(dates, values, selected_date, window=0, years=HISTORY_YEARS):
+    """Values on the selected calendar day (± window days) in each year, NaN where missing."""
+    targets = window_targets(selected_date, window, years)
+    found, idx = present_mask(dates, targets)
+    return targets, np.where(found, values[idx] if len(values) else np.nan, np.nan)
 
-def cache_load(lat, lon, variable, date, source):
-    path = cache_path(lat, lon, variable, date, source)
-    if path.exists():
-        df = pd.read_parquet(path)
-        return {
-            "dates": df["dates"].tolist(),
-            "values": df["values"].tolist(),
-        }
-    return None
+def history_span(selected_date, window=0, years=HISTORY_YEARS):
+    """Daily range kept for a query: whole calendar years up to the selected one, capped at today."""
+    targets = annual_targets(selected_date, years)
+    start = targets[0].astype("datetime64[Y]").astype("datetime64[D]") - window
+    end = (targets[-1].astype("datetime64[Y]") + 1).astype("datetime64[D]") - 1 + window
+    return start, min(end, np.datetime64("today", "D"))
+
+def missing_spans(dates, start, end, max_spans=3):
+    """Contiguous (start, end) ranges of [start, end] absent from the sorted `dates`.
+
+    More than `max_spans` gaps collapse into one range covering all of them.
+    """
+    if end < start:
+        return []
+    lo, hi = np.searchsorted(dates, [start, end + 1])
+    present = dates[lo:hi]
+    if len(present) == int((end - start).astype(int)) + 1:
+        return []
+    missing = np.setdiff1d(np.arange(start, end + 1), present, assume_unique=True)
+    breaks = np.flatnonzero(np.diff(missing) > np.timedelta64(1, "D"))
+    starts = np.concatenate([missing[:1], missing[breaks + 1]])
+    ends = np.concatenate([missing[breaks], missing[-1:]])
+    if len(starts) > max_spans:
+        return [(missing[0], missing[-1])]
+    return list(zip(starts, ends))
 
 
 
 
 
 # --- Meteomatics API ---
-async def fetch_meteomatics_data(lat, lon, date, variable):
-    """Fetch daily data from Meteomatics API for the last 30 years for a variable."""
-    _, unit, meteomatics_var, _ = VARIABLE_MAP.get(variable, (None, None, None, None))
-    if not meteomatics_var:
-        return None
-    import os
-    user = st.secrets["meteomatics"].get("username") if "meteomatics" in st.secrets and "username" in st.secrets["meteomatics"] else os.environ.get("METEOMATICS_USERNAME")
-    pw = st.secrets["meteomatics"].get("password") if "meteomatics" in st.secrets and "password" in st.secrets["meteomatics"] else os.environ.get("METEOMATICS_PASSWORD")
-    end_date = datetime.strptime(date, '%Y-%m-%d')
-    years = [end_date.year - i for i in range(29, -1, -1)]
-    dates = [end_date.replace(year=year).strftime('%Y-%m-%d') for year in years]
-    start = dates[0] + "T00:00:00Z"
-    end = dates[-1] + "T00:00:00Z"
-    url = (
-        f"https://api.meteomatics.com/{start}--{end}:P1Y/{meteomatics_var}/{lat},{lon}/json"
-    )
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, auth=(user, pw), timeout=15)
-            resp.raise_for_status()
+MAX_DAYS_PER_REQUEST = 3660
+# Rate limit, retries and circuit breaker for every Meteomatics call; hedging is off by default because
+# each hedge spends quota. Replace with a differently configured RequestScheduler to tune or test it.
+SCHEDULER = RequestScheduler(rate=10, burst=20, max_retries=3, hedge_percentile=None, name="meteomatics")
+
+METRICS.register_collector("scheduler", lambda: SCHEDULER.stats())
+
+def meteomatics_auth():
+    """Meteomatics credentials from the config file, falling back to the environment. None if unset."""
+    return meteomatics_credentials()
+
+def _merge_parts(parts, n_points, variables):
+    merged = [{v: None for v in variables} for _ in range(n_points)]
+    for i in range(n_points):
+        for v in variables:
+            series = [part[i][v] for part in parts if part[i][v] is not None]
+            if series:
+                merged[i][v] = (np.concatenate([d for d, _ in series]), np.concatenate([x for _, x in series]))
+    return merged
+
+async def fetch_meteomatics_series(points, start, end, variables, step="P1D"):
+    """Fetch `variables` at `points` from `start` to `end` (inclusive) in one Meteomatics request.
+
+    Daily ranges longer than MAX_DAYS_PER_REQUEST are split into concurrent requests.
+    Returns one {variable: (dates, values) or None} dict per point, in the order of `points`.
+    """
+    params = {VARIABLE_MAP[v][2]: v for v in variables if v in VARIABLE_MAP and VARIABLE_MAP[v][2]}
+    results = [{v: None for v in variables} for _ in points]
+    if not params or not points or end < start:
+        return results
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    if step == "P1D" and int((end - start).astype(int)) >= MAX_DAYS_PER_REQUEST:
+        chunks = [(s, min(s + MAX_DAYS_PER_REQUEST - 1, end)) for s in np.arange(start, end + 1, MAX_DAYS_PER_REQUEST)]
+        parts = await asyncio.gather(*(fetch_meteomatics_series(points, s, e, variables) for s, e in chunks))
+        return _merge_parts(parts, len(points), variables)
+    coords = "+".join(f"{lat},{lon}" for lat, lon in points)
+    path = f"/{start}T00:00:00Z--{end}T00:00:00Z:{step}/{','.join(params)}/{coords}/json"
+    auth = meteomatics_auth()
+    try:
+        with timed("network", source="meteomatics"):
+            resp = await SCHEDULER.request(lambda: get_client().get(path, auth=auth))
+        with timed("json_parse", source="meteomatics"):
             data = resp.json()
-            timeseries = data['data'][0]['coordinates'][0]['dates']
-            values = [d['value'] for d in timeseries]
-            dates = [d['date'][:10] for d in timeseries]
-            return {
-                "dates": dates,
-                "values": [None if v is None or (isinstance(v, float) and np.isnan(v)) else float(v) for v in values],
-                "variable": variable,
-                "unit": unit,
-                "source": "Meteomatics"
-            }
+            for entry in data['data']:
+                variable = params.get(entry['parameter'])
+                if variable is None:
+                    continue
+                for i, coord in enumerate(entry['coordinates'][:len(points)]):
+                    timeseries = coord['dates']
+                    results[i][variable] = (
+                        np.array([d['date'][:10] for d in timeseries], dtype="datetime64[D]"),
+                        np.array([d['value'] for d in timeseries], dtype=float),
+                    )
+        METRICS.inc("source_requests_total", source="meteomatics", status="ok")
+    except CircuitOpenError:
+        METRICS.inc("source_requests_total", source="meteomatics", status="circuit_open")
+    except Exception as e:
+        METRICS.inc("source_requests_total", source="meteomatics", status="error")
+        logger.warning("Meteomatics API error for %s at %d point(s): %s", ", ".join(params.values()), len(points), e)
+    return results
+
+class MeteomaticsSource(Source):
+    """Meteomatics time-series API, one request per missing span (see fetch_meteomatics_series)."""
+
+    name = "meteomatics"
+    label = "Meteomatics"
+
+    def code(self, variable):
+        return self.variable_map[variable][2] if variable in self.variable_map else None
+
+    def available(self):
+        return meteomatics_auth() is not None
+
+    async def fetch(self, lat, lon, spans, variables):
+        parts = await asyncio.gather(*(fetch_meteomatics_series([(lat, lon)], s, e, variables) for s, e in spans))
+        return _merge_parts(parts, 1, variables)[0]
+
+
+
+
+# --- Sources ---
+METEOMATICS = MeteomaticsSource(VARIABLE_MAP, SCHEDULER)
+NASA_POWER = NasaPowerSource(VARIABLE_MAP)
+SOURCES = [METEOMATICS, NASA_POWER]  # in order of preference
+# 'fallback' asks the next source only when one has no data; 'race' asks all at once for lower latency,
+# at the cost of a request to every source (and its quota and rate limit) for each cold fetch
+SOURCE_POLICY = "fallback"
+
+METRICS.register_collector("nasa_power_scheduler", lambda: NASA_POWER.scheduler.stats())
+
+def _sources_for(variable_name):
+    return [s for s in SOURCES if s.supports(variable_name)]
+
+def _source_spans(lat, lon, start, end):
+    """spans_for callback: what each source's own cached history at the point still misses."""
+    def spans_for(source, variable_name):
+        history = cache_load(lat, lon, variable_name, source.name)
+        return missing_spans(history.dates if history is not None else _NO_DATES, start, end)
+    return spans_for
+
+async def fetch_history(lat, lon, start, end, variables):
+    """Fill the daily history of `variables` at one point over [start, end] from the first source with data."""
+    answers = await fetch_first_good(SOURCES, lat, lon, variables, _source_spans(lat, lon, start, end),
+                                     SOURCE_POLICY)
+    for var, (source, series) in answers.items():
+        cache_save(lat, lon, var, *series, source.name)
+
+def _best_history(lat, lon, variable_name, start, end, nearest=False):
+    """
+    The cached history to answer from, preferring complete ones and then earlier sources.
+    Returns:
+        Tuple (history, source, point, distance_km, complete); history is None if no source has any
+    """
+    fallback = (None, None, (lat, lon), None, False)
+    for source in _sources_for(variable_name):
+        if nearest:
+            history, point, distance = cache_load_nearest(lat, lon, variable_name, source.name)
+        else:
+            history, point, distance = cache_load(lat, lon, variable_name, source.name), (lat, lon), 0.0
+        if history is None:
+            continue
+        if not missing_spans(history.dates, start, end):
+            return history, source, point, distance, True
+        if fallback[0] is None:
+            fallback = (history, source, point, distance, False)
+    return fallback
+
+
+
+
+# --- Main async data fetch ---
+def _unavailable(variable_name, message=None):
+    unit = VARIABLE_MAP[variable_name][1] if variable_name in VARIABLE_MAP else None
+    if message:
+        return TimeSeries.empty(variable_name, unit, "Unavailable", message=message)
+    return TimeSeries.empty(variable_name, unit, "Unavailable")
+
+def _is_supported(variable_name):
+    """Whether Meteomatics has the variable (the multi-coordinate bulk path is Meteomatics-only)."""
+    if not METEOMATICS.supports(variable_name):
+        logger.info("Variable '%s' not available from Meteomatics.", variable_name)
+        return False
+    return True
+
+def _flight_key(lat, lon, variable_name, start, end):
+    """In-flight registry key: the normalized location key the cache tiers use, plus the span fetched.
+
+    Requests for other dates or windows need other spans, so they must not wait on this fetch.
+    """
+    return (variable_name, cache_key(lat, lon, "meteomatics"), str(start), str(end))
+
+def _series_result(variable_name, history, selected_date, window, source, distance=None):
+    """Slice a history for the query, or an empty result if it holds no values for it."""
+    targets, sliced = slice_history(history.dates, history.values, selected_date, window)
+    if not np.any(~np.isnan(sliced)):
+        logger.info("No data available for %s from %s.", variable_name, source)
+        return _unavailable(variable_name)
+    result = TimeSeries(targets, sliced, variable_name, VARIABLE_MAP[variable_name][1], source)
+    if distance:
+        result.meta["distance_km"] = round(distance, 3)
+    return result
+
+# Callbacks told about every result served, e.g. the prefetcher's access log
+_access_listeners = []
+
+def add_access_listener(listener):
+    """Call `listener(lat, lon, variable, selected_date, origin)` for every result served.
+
+    `origin` is 'cache', 'memo', 'api', 'stale', 'unavailable', 'error' or 'timeout'.
+    """
+    if listener not in _access_listeners:
+        _access_listeners.append(listener)
+
+def _served(lat, lon, variable_name, selected_date, origin):
+    METRICS.inc("results_total", origin=origin)
+    for listener in _access_listeners:
+        try:
+            listener(lat, lon, variable_name, selected_date, origin)
         except Exception as e:
-            print(f"Meteomatics API error for {variable}: {e}")
-            return None
+            logger.warning("Access listener failed: %s", e)
+
+async def get_processed_data_async(selected_date, variable_name, location, window=0):
+    """Fetch data for a variable at a location and date."""
+    return (await get_multiple_variables(selected_date, [variable_name], location, window))[0]
 
+async def get_multiple_variables(selected_date, variable_names, location, window=0, timeout=None):
+    """Fetch multiple variables for the selected calendar day (± window days) over the last 30 years.
 
+    Each variable's full daily history is kept in the cache; queries are answered by slicing it,
+    and only date ranges missing from it are fetched (one combined request per range).
+    """
+    results = {}
+    async for var, result in iter_multiple_variables(selected_date, variable_names, location, window, timeout):
+        results[var] = result
+    return [results[var] for var in variable_names]
 
+async def _fetch_topup(plat, plon, start, end, variables):
+    """Leader fetch of the history missing for `variables`; settles their in-flight claims."""
+    try:
+        await fetch_history(plat, plon, start, end, variables)
+    except BaseException as e:
+        for var in variables:
+            FLIGHTS.resolve(_flight_key(plat, plon, var, start, end), error=e)
+        raise
+    for var in variables:
+        FLIGHTS.resolve(_flight_key(plat, plon, var, start, end))
 
-# --- Main async data fetch (Meteomatics only) ---
-async def get_processed_data_async(selected_date, variable_name, location):
-    """Fetch data for a variable at a location and date using Meteomatics only."""
+async def iter_multiple_variables(selected_date, variable_names, location, window=0, timeout=None):
+    """Yield (variable, result) for each variable as soon as its data is ready.
+
+    Cached variables come first; fetched ones follow in completion order, so one slow request
+    does not hold back the others. Missing history is fetched from SOURCES under SOURCE_POLICY.
+    Variables not ready within `timeout` seconds are yielded as unavailable (with 'timed_out'
+    set); their fetch keeps running and fills the cache.
+    """
     lat, lon = float(location['lat']), float(location['lon'])
-    # If variable is not mapped to Meteomatics, return empty result with message
-    if variable_name not in VARIABLE_MAP or VARIABLE_MAP[variable_name][2] is None:
-        print(f"Variable '{variable_name}' not available from Meteomatics.")
-        return {
-            "dates": [],
-            "values": [],
-            "variable": variable_name,
-            "unit": None,
-            "source": "Unavailable",
-            "message": f"Variable '{variable_name}' is not available from Meteomatics API."
-        }
-    # 1. Try cache for Meteomatics
-    meteo_cache = cache_load(lat, lon, variable_name, selected_date, "meteomatics")
-    if meteo_cache:
-        print(f"Loaded {variable_name} from Meteomatics cache.")
-        return {
-            **meteo_cache,
-            "variable": variable_name,
-            "unit": VARIABLE_MAP[variable_name][1],
-            "source": "Meteomatics (cache)"
-        }
-    # 2. Fetch Meteomatics
-    data_meteo = await fetch_meteomatics_data(lat, lon, selected_date, variable_name)
-    if data_meteo and any(v is not None for v in data_meteo["values"]):
-        cache_save(lat, lon, variable_name, selected_date, data_meteo, "meteomatics")
-        print(f"Fetched {variable_name} from Meteomatics API.")
-        return data_meteo
-    # 3. If all fail, return empty
-    print(f"No data available for {variable_name} from Meteomatics.")
-    return {
-        "dates": [],
-        "values": [],
-        "variable": variable_name,
-        "unit": VARIABLE_MAP[variable_name][1],
-        "source": "Unavailable"
-    }
-
-async def get_multiple_variables(selected_date, variable_names, location):
-    """Fetch multiple variables in parallel."""
-    tasks = [get_processed_data_async(selected_date, var, location) for var in variable_names]
-    return await asyncio.gather(*tasks)
+    start, end = history_span(selected_date, window)
+    ready = []
+    topups = {}  # point -> [variables]
+    for var in dict.fromkeys(variable_names):
+        sources = _sources_for(var)
+        if not sources:
+            logger.info("Variable '%s' not available from any source.", var)
+            ready.append((var, _unavailable(var, f"Variable '{var}' is not available from any data source.")))
+            continue
+        with timed("cache_lookup"):
+            history, source, point, distance, complete = _best_history(lat, lon, var, start, end, nearest=True)
+        if complete:
+            logger.info("Loaded %s from %s cache.", var, source.label)
+            _served(lat, lon, var, selected_date, "cache")
+            ready.append((var, _series_result(var, history, selected_date, window, f"{source.label} (cache)",
+                                              distance)))
+        elif history is not None and not any(s.available() and s.healthy() for s in sources):
+            # Every provider is failing; answer from what the cache holds instead of waiting on them
+            logger.info("No healthy source; serving %s from stale %s cache.", var, source.label)
+            _served(lat, lon, var, selected_date, "stale")
+            ready.append((var, _series_result(var, history, selected_date, window,
+                                              f"{source.label} (stale cache)", distance)))
+        else:
+            topups.setdefault(point, []).append(var)
+
+    tasks = {}  # task -> (point, variables it makes ready)
+    for (plat, plon), needed in topups.items():
+        # Concurrent identical top-ups share one fetch; everyone re-reads the cache afterwards.
+        group = []
+        for var in needed:
+            future, leader = FLIGHTS.claim(_flight_key(plat, plon, var, start, end))
+            if leader:
+                group.append(var)
+            else:
+                tasks[asyncio.ensure_future(FLIGHTS.wait(future))] = ((plat, plon), [var])
+        if group:
+            tasks[asyncio.ensure_future(_fetch_topup(plat, plon, start, end, group))] = ((plat, plon), group)
+
+    for item in ready:
+        yield item
+
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    pending = set(tasks)
+    while pending:
+        remaining = None if deadline is None else max(0.0, deadline - loop.time())
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            (plat, plon), variables = tasks[task]
+            error = task.exception()
+            for var in variables:
+                if error is not None:
+                    logger.warning("Fetching %s failed: %s", var, error)
+                    _served(lat, lon, var, selected_date, "error")
+                    yield var, _unavailable(var, str(error))
+                    continue
+                history, source, _, _, complete = _best_history(plat, plon, var, start, end)
+                if history is None:
+                    logger.info("No data available for %s from any source.", var)
+                    _served(lat, lon, var, selected_date, "unavailable")
+                    yield var, _unavailable(var)
+                    continue
+                distance = None if (plat, plon) == (lat, lon) else float(haversine_km(lat, lon, plat, plon))
+                if not complete:
+                    # Every top-up failed but older history is cached
+                    logger.info("Serving %s from stale %s cache.", var, source.label)
+                    _served(lat, lon, var, selected_date, "stale")
+                    yield var, _series_result(var, history, selected_date, window,
+                                              f"{source.label} (stale cache)", distance)
+                    continue
+                logger.info("Fetched %s from %s.", var, source.label)
+                _served(lat, lon, var, selected_date, "api")
+                yield var, _series_result(var, history, selected_date, window, source.label, distance)
+
+    for task in pending:
+        # Nobody awaits the task any more; retrieve its outcome so errors are not reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        for var in tasks[task][1]:
+            logger.warning("Timed out waiting for %s after %gs.", var, timeout)
+            _served(lat, lon, var, selected_date, "timeout")
+            result = _unavailable(var, f"Timed out after {timeout:g} s; the data will be ready on a later run.")
+            result.meta["timed_out"] = True
+            yield var, result
+
+
+
+
+
+# --- Memoized synchronous entry point (Streamlit reruns) ---
+RESULT_MAX_AGE = 15 * 60     # seconds a memoized result is served without revalidation
+PARTIAL_MAX_AGE = 60         # same, for results with unavailable variables
+RESULT_STALE_TTL = 6 * 3600  # stale results are still served (and refreshed in the background) this long
+RESULTS = MemoryCache(max_bytes=64 * 1024 * 1024, ttl=RESULT_STALE_TTL)
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+METRICS.register_collector("result_memo", RESULTS.stats)
+
+def _result_key(selected_date, variable_names, location, window):
+    return (selected_date, round(float(location['lat']), 4), round(float(location['lon']), 4),
+            tuple(variable_names), window)
+
+async def _refresh_results(key, selected_date, variable_names, location, window):
+    """Fetch and memoize a result; runs on the engine loop."""
+    try:
+        results = await get_multiple_variables(selected_date, variable_names, location, window)
+        _memoize(key, results)
+        return results
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
+def _memoize(key, results):
+    partial = any((r["source"] == "Unavailable" and r["variable"] in VARIABLE_MAP)
+                  or r["source"].endswith("(stale cache)") for r in results)
+    RESULTS.put(key, {"results": results, "fetched_at": time.monotonic(), "partial": partial})
+
+def _memoized(key, selected_date, variable_names, location, window, max_age):
+    """Memoized results for `key`, scheduling a background refresh when they are stale. None on a miss."""
+    entry = RESULTS.get(key)
+    if entry is None:
+        METRICS.inc("result_memo_total", result="miss")
+        return None
+    for var in variable_names:
+        _served(float(location['lat']), float(location['lon']), var, selected_date, "memo")
+    age = time.monotonic() - entry["fetched_at"]
+    if age < (PARTIAL_MAX_AGE if entry["partial"] else max_age):
+        METRICS.inc("result_memo_total", result="fresh")
+        return entry["results"]
+    METRICS.inc("result_memo_total", result="stale")
+    with _revalidating_lock:
+        start = key not in _revalidating
+        _revalidating.add(key)
+    if start:
+        submit(_refresh_results(key, selected_date, list(variable_names), dict(location), window))
+    return entry["results"]
+
+def get_multiple_variables_cached(selected_date, variable_names, location, window=0, max_age=RESULT_MAX_AGE,
+                                  timeout=None):
+    """Blocking, memoized get_multiple_variables for synchronous callers such as the Streamlit script.
+
+    Runs on the engine's persistent event loop. Results are memoized per (date, location, variables,
+    window): fresh ones are returned as is, stale ones are returned immediately while a background
+    refresh runs (stale-while-revalidate), and only a miss waits for the fetch.
+    """
+    key = _result_key(selected_date, variable_names, location, window)
+    results = _memoized(key, selected_date, variable_names, location, window, max_age)
+    if results is not None:
+        return results
+    return run_sync(_refresh_results(key, selected_date, list(variable_names), dict(location), window), timeout)
+
+async def get_multiple_variables_cached_async(selected_date, variable_names, location, window=0,
+                                              max_age=RESULT_MAX_AGE, timeout=None):
+    """get_multiple_variables_cached for coroutines running on another event loop (e.g. an HTTP server)."""
+    key = _result_key(selected_date, variable_names, location, window)
+    results = _memoized(key, selected_date, variable_names, location, window, max_age)
+    if results is not None:
+        return results
+    future = submit(_refresh_results(key, selected_date, list(variable_names), dict(location), window))
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+_STREAM_DONE = object()
+
+def stream_multiple_variables(selected_date, variable_names, location, window=0, timeout=None,
+                              max_age=RESULT_MAX_AGE):
+    """Synchronous generator of (variable, result) pairs as they become ready, for progressive UIs.
+
+    Memoized results (see get_multiple_variables_cached) are yielded at once. Otherwise
+    iter_multiple_variables runs on the engine loop with per-variable deadline `timeout`, and
+    the complete result set is memoized unless a variable timed out.
+    """
+    key = _result_key(selected_date, variable_names, location, window)
+    results = _memoized(key, selected_date, variable_names, location, window, max_age)
+    if results is not None:
+        yield from zip(variable_names, results)
+        return
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in iter_multiple_variables(selected_date, variable_names, location, window, timeout):
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+            raise
+        finally:
+            items.put(_STREAM_DONE)
+
+    submit(pump())
+    collected = {}
+    while True:
+        item = items.get()
+        if item is _STREAM_DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        collected[item[0]] = item[1]
+        yield item
+    results = [collected[var] for var in variable_names]
+    if not any(r.get("timed_out") for r in results):
+        _memoize(key, results)
@@ -0,0 +1,125 @@
+"""
+Process-wide in-memory cache tier for the data engine.
+
+Sits in front of the on-disk store and is shared by every Streamlit session in
+the process (modules are imported once per process). Entries hold NumPy arrays or TimeSeries,
+are evicted least-recently-used once the byte bound is reached, and expire after
+a TTL.
+"""
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data_engine.timeseries import TimeSeries
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 6 * 3600
+
+
+def _nbytes(value):
+    """Approximate memory footprint of a cached value."""
+    if isinstance(value, (np.ndarray, TimeSeries)):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    """Mark arrays read-only so one session cannot mutate another's data."""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, TimeSeries):
+        value.freeze()
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with TTL expiry and a byte-size bound."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, nbytes, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, nbytes, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= nbytes
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            # Too large to cache, but the caller still replaced the old value: drop it
+            self.invalidate(key)
+            return
+        _freeze(value)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (expires_at, nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by all sessions in this process.
+MEMORY_CACHE = MemoryCache()
@@ -0,0 +1,343 @@
+"""
+Background cache warming for popular locations.
+
+Every result the engine serves is written to an access log (buffered, in
+SQLite next to the cache store). Periodically the prefetcher:
+
+1. ranks the most requested (location, variable) keys of the last days,
+2. queues a job for each key whose cached history does not yet cover the
+   analysis dates of the coming days (persistent, so queued work survives a
+   restart),
+3. runs queued jobs through the normal fetch path (sources, request
+   scheduler, single-flight) until the day's request budget is spent,
+4. expires cold data from the cache store by age and size, never touching
+   the hot keys.
+
+The warm-hit ratio (queries answered from cache) and the provider requests
+spent on prefetching (only those the prefetcher sent itself, not concurrent
+user traffic) are reported by `stats()` and as telemetry gauges.
+
+    python -m data_engine.prefetch --budget 100
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_engine.http_client import run_sync
+from data_engine.main import (
+    CACHE_DIR,
+    FLIGHTS,
+    SOURCES,
+    STORE,
+    _best_history,
+    _fetch_topup,
+    _flight_key,
+    add_access_listener,
+    history_span,
+)
+from data_engine.scheduler import RequestMeter
+from data_engine.store import cache_key
+from telemetry.main import METRICS
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = CACHE_DIR / "prefetch.sqlite"
+DEFAULT_BUDGET = 200          # provider requests per day
+DEFAULT_INTERVAL = 6 * 3600   # seconds between prefetch runs
+LOOKAHEAD_DAYS = 7            # prefetch analysis dates from today to this many days ahead
+HOT_KEY_DAYS = 14             # access history used to rank keys
+HOT_KEY_LIMIT = 50
+MAX_ATTEMPTS = 3
+CACHE_MAX_AGE = 180 * 86400   # drop keys not written for this long...
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # ...and shrink the store below this size
+WARM_ORIGINS = ("cache",)
+# Memoized answers are mostly Streamlit reruns of a query already logged; counting them would let one
+# user moving a slider outrank everyone else and push the warm-hit ratio towards 100%
+UNLOGGED_ORIGINS = ("memo",)
+FLUSH_EVERY = 100
+
+
+def _today():
+    return np.datetime64("today", "D")
+
+
+# --- Persistent state ---
+class PrefetchQueue:
+    """SQLite-backed access log, job queue and per-day request budget."""
+
+    def __init__(self, path=None):
+        path = DB_PATH if path is None else path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending = []
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS access ("
+                "lat REAL, lon REAL, variable TEXT, date TEXT, origin TEXT, ts REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS access_ts ON access (ts)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY, lat REAL, lon REAL, variable TEXT, start TEXT, end TEXT, "
+                "status TEXT, attempts INTEGER DEFAULT 0, cost INTEGER DEFAULT 0, created REAL, updated REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS budget (day TEXT PRIMARY KEY, spent INTEGER)")
+
+    # Access log
+    def record_access(self, lat, lon, variable, selected_date, origin):
+        """Buffer one served result (except UNLOGGED_ORIGINS); written in batches of FLUSH_EVERY."""
+        if origin in UNLOGGED_ORIGINS:
+            return
+        with self._lock:
+            self._pending.append((round(lat, 4), round(lon, 4), variable, str(selected_date), origin, time.time()))
+            if len(self._pending) < FLUSH_EVERY:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+            if rows:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO access VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def hot_keys(self, days=HOT_KEY_DAYS, limit=HOT_KEY_LIMIT):
+        """Most requested (lat, lon, variable) over the last `days` days, as (lat, lon, variable, hits)."""
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT lat, lon, variable, COUNT(*) AS hits FROM access WHERE ts >= ? "
+                "GROUP BY lat, lon, variable ORDER BY hits DESC, MAX(ts) DESC LIMIT ?",
+                (time.time() - days * 86400, limit),
+            ).fetchall()
+
+    def warm_stats(self, days=1):
+        """Accesses and warm hits (answered from a cache tier) over the last `days` days."""
+        self.flush()
+        with self._lock:
+            total, warm = self._conn.execute(
+                f"SELECT COUNT(*), SUM(origin IN ({','.join('?' * len(WARM_ORIGINS))})) FROM access WHERE ts >= ?",
+                (*WARM_ORIGINS, time.time() - days * 86400),
+            ).fetchone()
+        warm = warm or 0
+        return {"accesses": total, "warm_hits": warm, "warm_hit_ratio": warm / total if total else 0.0}
+
+    def prune(self, days=HOT_KEY_DAYS):
+        """Forget accesses older than `days` days."""
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM access WHERE ts < ?", (time.time() - days * 86400,))
+
+    # Jobs
+    def enqueue(self, lat, lon, variable, start, end):
+        """Queue a fetch unless the same one is already pending. Returns True if queued."""
+        now = time.time()
+        with self._lock, self._conn:
+            exists = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE lat = ? AND lon = ? AND variable = ? AND start = ? AND end = ? "
+                "AND status = 'pending'", (lat, lon, variable, str(start), str(end)),
+            ).fetchone()
+            if exists:
+                return False
+            self._conn.execute(
+                "INSERT INTO jobs (lat, lon, variable, start, end, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)", (lat, lon, variable, str(start), str(end), now, now),
+            )
+            return True
+
+    def pending(self, limit):
+        """Oldest pending jobs as (id, lat, lon, variable, start, end, attempts)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, lat, lon, variable, start, end, attempts FROM jobs WHERE status = 'pending' "
+                "ORDER BY created LIMIT ?", (limit,),
+            ).fetchall()
+
+    def finish(self, job_id, status, cost=0):
+        """Record a job's outcome: 'done', 'failed', or 'pending' to retry it later."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, cost = cost + ?, updated = ? WHERE id = ?",
+                (status, cost, time.time(), job_id),
+            )
+
+    def job_stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*), SUM(cost) FROM jobs GROUP BY status").fetchall()
+        stats = {f"jobs_{status}": count for status, count, _ in rows}
+        stats["requests_spent_total"] = sum(cost or 0 for _, _, cost in rows)
+        return stats
+
+    # Budget
+    def spent(self, day):
+        with self._lock:
+            row = self._conn.execute("SELECT spent FROM budget WHERE day = ?", (str(day),)).fetchone()
+        return row[0] if row else 0
+
+    def spend(self, day, requests):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO budget VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET spent = spent + excluded.spent",
+                (str(day), requests),
+            )
+
+
+# --- Scheduler ---
+class Prefetcher:
+    """
+    Learns hot keys from the access log and keeps their histories warm.
+    Args:
+        queue: PrefetchQueue (default: the one at DB_PATH)
+        budget: Provider requests the prefetcher may spend per day
+        lookahead_days: Analysis dates from today up to this many days ahead are prefetched
+        hot_keys: Number of (location, variable) keys kept warm
+        max_age, max_bytes: Cache store expiry limits (None to skip)
+    """
+
+    def __init__(self, queue=None, budget=DEFAULT_BUDGET, lookahead_days=LOOKAHEAD_DAYS, hot_keys=HOT_KEY_LIMIT,
+                 max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+        self.queue = queue or PrefetchQueue()
+        self.budget = budget
+        self.lookahead_days = lookahead_days
+        self.hot_keys = hot_keys
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._thread = None
+        self._stop = threading.Event()
+
+    def plan(self, today=None):
+        """Queue a job for every hot key whose history misses an upcoming analysis date. Returns jobs queued."""
+        today = _today() if today is None else np.datetime64(today, "D")
+        spans = {history_span(today + i) for i in range(self.lookahead_days + 1)}
+        queued = 0
+        for lat, lon, variable, _ in self.queue.hot_keys(limit=self.hot_keys):
+            for start, end in sorted(spans):
+                _, _, point, _, complete = _best_history(lat, lon, variable, start, end, nearest=True)
+                if not complete and self.queue.enqueue(*point, variable, start, end):
+                    queued += 1
+        return queued
+
+    async def _run_job(self, lat, lon, variable, start, end):
+        start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+        future, leader = FLIGHTS.claim(_flight_key(lat, lon, variable, start, end))
+        if not leader:
+            await FLIGHTS.wait(future)  # someone is already fetching it
+            return
+        await _fetch_topup(lat, lon, start, end, [variable])
+
+    async def run_once(self, today=None):
+        """
+        Plan, run queued jobs within today's budget, and expire cold cache data.
+        Returns:
+            Dictionary with queued, done, retried (re-queued), failed and deferred jobs, requests spent and the
+            expiry summary
+        """
+        today = _today() if today is None else np.datetime64(today, "D")
+        summary = {"queued": self.plan(today), "done": 0, "retried": 0, "failed": 0, "deferred": 0, "requests": 0}
+        outcomes = {"done": "done", "pending": "retried", "failed": "failed"}
+        jobs = self.queue.pending(limit=10 * self.hot_keys)
+        for n, (job_id, lat, lon, variable, start, end, attempts) in enumerate(jobs):
+            if self.queue.spent(today) >= self.budget:
+                summary["deferred"] = len(jobs) - n
+                logger.info("Prefetch budget of %d requests spent; %d jobs deferred.", self.budget,
+                            summary["deferred"])
+                break
+            # Only count this job's own requests: users share the schedulers meanwhile
+            meter = RequestMeter()
+            try:
+                with meter:
+                    await self._run_job(lat, lon, variable, start, end)
+                _, _, _, _, complete = _best_history(lat, lon, variable, np.datetime64(start), np.datetime64(end))
+                status = "done" if complete else ("failed" if attempts + 1 >= MAX_ATTEMPTS else "pending")
+            except Exception as e:
+                logger.warning("Prefetch of %s at (%s, %s) failed: %s", variable, lat, lon, e)
+                status = "failed" if attempts + 1 >= MAX_ATTEMPTS else "pending"
+            cost = meter.attempts
+            self.queue.finish(job_id, status, cost)
+            self.queue.spend(today, cost)
+            summary["requests"] += cost
+            summary[outcomes[status]] += 1
+            METRICS.inc("prefetch_jobs_total", status=status)
+            METRICS.inc("prefetch_requests_total", cost)
+        keep = {cache_key(lat, lon, source.name) for lat, lon, _, _ in self.queue.hot_keys(limit=self.hot_keys)
+                for source in SOURCES}
+        summary["expired"] = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: STORE.expire(self.max_age, self.max_bytes, keep))
+        self.queue.prune()
+        logger.info("Prefetch run: %s", summary)
+        return summary
+
+    def stats(self):
+        stats = {"budget": self.budget, "requests_spent_today": self.queue.spent(_today())}
+        stats.update(self.queue.warm_stats())
+        stats.update(self.queue.job_stats())
+        return stats
+
+    # Background thread
+    def start(self, interval=DEFAULT_INTERVAL):
+        """Log accesses and run the prefetcher every `interval` seconds on a daemon thread."""
+        add_access_listener(self.queue.record_access)
+        METRICS.register_collector("prefetch", self.stats)
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="prefetcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.queue.flush()
+
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                run_sync(self.run_once())
+            except Exception as e:
+                logger.warning("Prefetch run failed: %s", e)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def start_prefetcher(budget=DEFAULT_BUDGET, interval=DEFAULT_INTERVAL, **options):
+    """Start the process-wide prefetcher once (safe to call on every Streamlit rerun)."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(budget=budget, **options).start(interval)
+        return _prefetcher
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Warm the data engine cache for popular locations.")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET, help="Provider requests per day")
+    parser.add_argument("--lookahead-days", type=int, default=LOOKAHEAD_DAYS)
+    parser.add_argument("--hot-keys", type=int, default=HOT_KEY_LIMIT)
+    parser.add_argument("--interval", type=float, help="Keep running, every this many seconds (default: once)")
+    parser.add_argument("--stats", action="store_true", help="Only print warm-hit and prefetch statistics")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    prefetcher = Prefetcher(budget=args.budget, lookahead_days=args.lookahead_days, hot_keys=args.hot_keys)
+    if not args.stats:
+        while True:
+            print(json.dumps(run_sync(prefetcher.run_once()), default=str))
+            if args.interval is None:
+                break
+            time.sleep(args.interval)
+    print(json.dumps(prefetcher.stats(), indent=2))
@@ -0,0 +1,287 @@
+"""
+Request scheduling for provider calls: rate limiting, retries, hedging and a
+circuit breaker.
+
+Every attempt takes a token from a shared token bucket. Throttling (429),
+server errors (5xx) and transport errors are retried with jittered exponential
+backoff ("full jitter"), honouring Retry-After. Once enough latencies have been
+seen, a request still running past the chosen latency percentile is hedged with
+a second attempt and the first success wins. Repeated failures open a circuit
+breaker; while it is open requests fail fast with CircuitOpenError so callers
+can serve what they already have cached, and after a cool-down one trial
+request decides whether it closes again.
+
+A RequestMeter counts the attempts sent on behalf of one caller (the task
+that opens it and the tasks it starts), whatever other traffic shares the
+schedulers meanwhile.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import numpy as np
+
+from data_engine.ratelimit import TokenBucket
+from telemetry.main import METRICS
+
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+_METER = contextvars.ContextVar("request_meter", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request while the provider's circuit is open."""
+
+
+class RetryableError(RuntimeError):
+    """A response or error worth retrying; `retry_after` is the server's hint in seconds, if any."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (after `threshold` failures) -> half-open trial."""
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return "open"
+        return "half_open"
+
+    @property
+    def is_open(self):
+        """True while requests would be rejected (open, or half-open with the trial in flight)."""
+        with self._lock:
+            state = self._state()
+            return state == "open" or (state == "half_open" and self._trial)
+
+    def allow(self):
+        """Whether a request may go out now; in half-open state only one trial is let through."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """Give up a half-open trial without a verdict (e.g. it was cancelled); the next request retries."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None or self._trial:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class RequestMeter:
+    """
+    Counts the provider attempts sent by the current task and the tasks it starts, across all schedulers.
+
+        with RequestMeter() as meter:
+            await fetch(...)
+        meter.attempts
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self._token = None
+
+    def __enter__(self):
+        self._token = _METER.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _METER.reset(self._token)
+
+
+class RequestScheduler:
+    """
+    Sends requests for one provider with rate limiting, retries, hedging and a circuit breaker.
+    Args:
+        rate: Attempts per second across all callers (None for no limit)
+        burst: Attempts allowed back-to-back before `rate` applies
+        max_retries: Retries after the first attempt
+        backoff_base: Base delay in seconds; retry n waits up to backoff_base * 2**n
+        backoff_max: Cap on a single backoff delay, in seconds
+        hedge_percentile: Latency percentile after which a hedge attempt is sent (None to disable)
+        hedge_min_samples: Latencies to observe before hedging starts
+        breaker_threshold: Consecutive failed requests that open the circuit
+        breaker_reset: Seconds the circuit stays open before a trial request
+        seed: Seed for the backoff jitter
+        name: Label for the scheduler's telemetry counters
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 hedge_percentile=None, hedge_min_samples=20, breaker_threshold=5, breaker_reset=30.0, seed=None,
+                 name="provider"):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._random = random.Random(seed)
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                       "failures": 0, "rejected": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+        METRICS.inc("scheduler_events_total", n, scheduler=self.name, event=name)
+
+    def backoff(self, retry, retry_after=None):
+        """Delay before retry number `retry` (0-based): full jitter, at least the server's Retry-After."""
+        delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or there are too few samples."""
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            latencies = np.array(self._latencies)
+        return float(np.percentile(latencies, self.hedge_percentile))
+
+    async def _attempt(self, send):
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        self._count("attempts")
+        meter = _METER.get()
+        if meter is not None:
+            meter.attempts += 1
+        start = time.perf_counter()
+        try:
+            resp = await send()
+        except httpx.TransportError as e:
+            raise RetryableError(f"{type(e).__name__}: {e}") from e
+        if resp.status_code in RETRY_STATUSES:
+            retry_after = resp.headers.get("Retry-After")
+            retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+            raise RetryableError(f"HTTP {resp.status_code}", retry_after)
+        resp.raise_for_status()
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return resp
+
+    async def _hedged(self, send):
+        delay = self.hedge_delay()
+        first = asyncio.ensure_future(self._attempt(send))
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        self._count("hedges")
+        second = asyncio.ensure_future(self._attempt(send))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(self, send):
+        """
+        Run `send` (a zero-argument coroutine function returning an httpx.Response) under the policy.
+        Returns:
+            The first successful response
+        Raises:
+            CircuitOpenError while the circuit is open, the last RetryableError once retries are
+            exhausted, or httpx.HTTPStatusError for non-retryable statuses
+        """
+        self._count("requests")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError("Provider circuit is open; serving cached data only")
+        try:
+            for retry in range(self.max_retries + 1):
+                try:
+                    resp = await self._hedged(send)
+                except RetryableError as e:
+                    if retry == self.max_retries:
+                        self._count("failures")
+                        self.breaker.record_failure()
+                        raise
+                    self._count("retries")
+                    await asyncio.sleep(self.backoff(retry, e.retry_after))
+                except httpx.HTTPStatusError:
+                    # The provider answered; a client error is not a sign of an unhealthy provider
+                    self.breaker.record_success()
+                    raise
+                else:
+                    self.breaker.record_success()
+                    return resp
+        except (RetryableError, httpx.HTTPStatusError):
+            raise  # already recorded above
+        except Exception:
+            # Undecodable responses, invalid URLs, errors from `send` itself
+            self._count("failures")
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the provider, but must not keep the half-open trial slot
+            self.breaker.release()
+            raise
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+            latencies = np.array(self._latencies) if self._latencies else np.array([0.0])
+        stats.update({
+            "circuit_open": int(self.breaker.is_open),
+            "breaker_trips": self.breaker.trips,
+            "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        })
+        return stats
@@ -0,0 +1,71 @@
+"""
+Single-flight deduplication for concurrent identical fetches.
+
+The first caller for a key becomes the leader and does the work; callers that
+arrive while it is in flight wait for the leader's result instead of issuing
+their own request. Results are handed over through concurrent.futures.Future,
+so followers may sit on a different asyncio loop than the leader (every
+Streamlit session runs its own).
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Registry of in-flight fetches keyed on the normalized cache key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, key):
+        """Return (future, is_leader). The leader must call `resolve` for the key."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.leaders += 1
+            return future, True
+
+    def resolve(self, key, result=None, error=None):
+        """Publish the leader's result (or error) to every waiter and retire the key."""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    async def wait(future):
+        # Shielded so a cancelled follower does not cancel the shared future.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def do(self, key, fn):
+        """Run `await fn()` once per key, sharing the result with concurrent callers."""
+        future, leader = self.claim(key)
+        if not leader:
+            return await self.wait(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.resolve(key, error=e)
+            raise
+        self.resolve(key, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+# Shared by all sessions in this process.
+FLIGHTS = SingleFlight()
@@ -0,0 +1,194 @@
+"""
+Data sources for daily point histories, and the policy that picks between them.
+
+A Source fetches the missing daily spans of some variables at one point and
+returns {variable: (dates, values) or None}. Each source has its own request
+scheduler (rate limit, retries, circuit breaker). `fetch_first_good` asks
+several sources either one after the other ("fallback") or all at once ("race")
+and keeps, per variable, the first answer that holds any values; with racing,
+the remaining requests are cancelled as soon as every variable is answered.
+
+NASA POWER serves a whole daily point series in one request and needs no
+credentials:
+https://power.larc.nasa.gov/docs/services/api/temporal/daily/
+"""
+import asyncio
+import logging
+
+import numpy as np
+
+from data_engine.http_client import get_client
+from data_engine.scheduler import CircuitOpenError, RequestScheduler
+from telemetry.main import METRICS, timed
+
+logger = logging.getLogger(__name__)
+
+NASA_POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+NASA_POWER_FILL_VALUE = -999.0
+POLICIES = ("race", "fallback")
+
+
+class Source:
+    """A provider of daily point histories.
+    Attributes:
+        name: Source component of the cache key (e.g. 'meteomatics')
+        label: Name shown with results (e.g. 'Meteomatics')
+        scheduler: RequestScheduler the source's requests go through
+    """
+
+    name = None
+    label = None
+
+    def __init__(self, variable_map, scheduler=None):
+        self.variable_map = variable_map
+        self.scheduler = scheduler or RequestScheduler(name=self.name)
+
+    def code(self, variable):
+        """The provider's parameter code for a UI variable name, or None if it has none."""
+        return None
+
+    def supports(self, variable):
+        return self.code(variable) is not None
+
+    def available(self):
+        """False when the source cannot be used at all (e.g. missing credentials)."""
+        return True
+
+    def healthy(self):
+        """False while the source's circuit breaker is open."""
+        return not self.scheduler.breaker.is_open
+
+    async def fetch(self, lat, lon, spans, variables):
+        """
+        Fetch daily values for `variables` at one point.
+        Args:
+            lat, lon: Point coordinates
+            spans: List of (start, end) datetime64[D] ranges to fetch, inclusive
+            variables: UI variable names supported by this source
+        Returns:
+            {variable: (dates, values) or None}
+        """
+        raise NotImplementedError
+
+
+class NasaPowerSource(Source):
+    """NASA POWER daily point API (MERRA-2 / CERES based, ~0.5° grid, no credentials needed).
+
+    Uses the NASA codes of VARIABLE_MAP. Note that WS2M is wind speed at 2 m, where Meteomatics
+    reports it at 10 m.
+    """
+
+    name = "nasa_power"
+    label = "NASA POWER"
+
+    def __init__(self, variable_map, url=NASA_POWER_URL, community="RE", scheduler=None):
+        super().__init__(variable_map, scheduler or RequestScheduler(rate=5, burst=5, max_retries=2,
+                                                                      name=self.name))
+        self.url = url
+        self.community = community
+
+    def code(self, variable):
+        return self.variable_map[variable][0] if variable in self.variable_map else None
+
+    async def fetch(self, lat, lon, spans, variables):
+        results = {v: None for v in variables}
+        codes = {self.code(v): v for v in variables if self.supports(v)}
+        if not codes or not spans:
+            return results
+        # One request covers every span: the API returns a full daily series per parameter
+        start, end = min(s for s, _ in spans), max(e for _, e in spans)
+        params = {
+            "parameters": ",".join(codes), "community": self.community,
+            "latitude": f"{lat:.4f}", "longitude": f"{lon:.4f}", "format": "JSON",
+            "start": str(start).replace("-", ""), "end": str(end).replace("-", ""),
+        }
+        try:
+            with timed("network", source=self.name):
+                resp = await self.scheduler.request(lambda: get_client().get(self.url, params=params))
+            with timed("json_parse", source=self.name):
+                data = resp.json()
+                fill = float(data.get("header", {}).get("fill_value", NASA_POWER_FILL_VALUE))
+                for code, series in data["properties"]["parameter"].items():
+                    variable = codes.get(code)
+                    if variable is None or not series:
+                        continue
+                    days = list(series)
+                    dates = np.array([f"{d[:4]}-{d[4:6]}-{d[6:8]}" for d in days], dtype="datetime64[D]")
+                    values = np.array([series[d] for d in days], dtype=float)
+                    values[values == fill] = np.nan
+                    order = np.argsort(dates, kind="stable")
+                    results[variable] = (dates[order], values[order])
+            METRICS.inc("source_requests_total", source=self.name, status="ok")
+        except CircuitOpenError:
+            METRICS.inc("source_requests_total", source=self.name, status="circuit_open")
+        except Exception as e:
+            METRICS.inc("source_requests_total", source=self.name, status="error")
+            logger.warning("NASA POWER API error for %s at (%s, %s): %s", ", ".join(codes), lat, lon, e)
+        return results
+
+
+# --- Policy ---
+def _good(series):
+    return series is not None and bool(np.any(~np.isnan(series[1])))
+
+
+async def _fetch_from(source, lat, lon, variables, spans_for):
+    """Fetch from one source, one request per distinct set of missing spans."""
+    groups = {}
+    for var in variables:
+        spans = tuple(spans_for(source, var))
+        if spans:
+            groups.setdefault(spans, []).append(var)
+    parts = await asyncio.gather(*(source.fetch(lat, lon, list(spans), group) for spans, group in groups.items()))
+    merged = {}
+    for part in parts:
+        merged.update(part)
+    return merged
+
+
+async def fetch_first_good(sources, lat, lon, variables, spans_for, policy="race"):
+    """
+    Fetch `variables` at one point from the first source that has values for them.
+    Args:
+        sources: Sources in order of preference
+        lat, lon: Point coordinates
+        variables: UI variable names
+        spans_for: Function (source, variable) -> list of (start, end) spans that source still misses
+        policy: 'race' to ask every source at once, 'fallback' to ask them one after the other
+    Returns:
+        {variable: (source, (dates, values))} for the variables some source answered
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown source policy '{policy}'. Expected one of {POLICIES}.")
+    candidates = [s for s in sources if s.available() and s.healthy()]
+    answers = {}
+
+    def collect(source, part):
+        for var, series in part.items():
+            if var not in answers and _good(series):
+                answers[var] = (source, series)
+                METRICS.inc("source_wins_total", source=source.name)
+
+    if policy == "fallback":
+        for source in candidates:
+            wanted = [v for v in variables if v not in answers and source.supports(v)]
+            if wanted:
+                collect(source, await _fetch_from(source, lat, lon, wanted, spans_for))
+        return answers
+
+    tasks = {}
+    for source in candidates:
+        wanted = [v for v in variables if source.supports(v)]
+        if wanted:
+            tasks[asyncio.ensure_future(_fetch_from(source, lat, lon, wanted, spans_for))] = source
+    pending = set(tasks)
+    try:
+        while pending and len(answers) < len(variables):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the earlier source when several finish together
+            for task in sorted(done, key=lambda t: candidates.index(tasks[t])):
+                collect(tasks[task], task.result())
+    finally:
+        for task in pending:
+            task.cancel()
+    return answers
@@ -0,0 +1,136 @@
+"""
+Spatial index over cached series.
+
+Lets the engine serve a request from the nearest cached point within a
+tolerance that matches the source's native resolution, so users a few metres
+apart (or a geocoded city vs. typed coordinates) share one cache entry.
+Coordinates are snapped to a fine grid for an O(1) check of the surrounding
+cells, used when its answer is provably the nearest point; a haversine
+BallTree answers the general nearest-neighbour query. The tree is rebuilt in
+batches: points added since the last build are scanned linearly until
+REBUILD_EVERY of them have piled up.
+"""
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+SNAP_DEG = 0.01
+REBUILD_EVERY = 256  # points added before the BallTree is rebuilt
+
+# Reuse radius per source, roughly matching the provider's native grid.
+SOURCE_TOLERANCE_KM = {
+    "meteomatics": 1.0,
+    "nasa_power": 25.0,
+}
+DEFAULT_TOLERANCE_KM = 1.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    """Nearest cached point per namespace (e.g. variable and source)."""
+
+    def __init__(self, snap_deg=SNAP_DEG, rebuild_every=REBUILD_EVERY):
+        self.snap_deg = snap_deg
+        self.rebuild_every = rebuild_every
+        self._lock = threading.Lock()
+        self._cells = {}  # namespace -> {snapped cell: [(lat, lon), ...]}
+        self._coords = {}  # namespace -> [(lat, lon), ...]
+        self._trees = {}  # namespace -> (BallTree, number of leading _coords it covers)
+        self.hits = 0
+        self.misses = 0
+        self.distances = deque(maxlen=1000)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.snap_deg), math.floor(lon / self.snap_deg))
+
+    def add(self, namespace, lat, lon):
+        with self._lock:
+            cells = self._cells.setdefault(namespace, {})
+            bucket = cells.setdefault(self._cell(lat, lon), [])
+            if (lat, lon) in bucket:
+                return
+            bucket.append((lat, lon))
+            self._coords.setdefault(namespace, []).append((lat, lon))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(c) for c in self._coords.values())
+
+    def _grid_margin_km(self, lat, lon):
+        """Lower bound on the distance from (lat, lon) to any point outside its 3x3 block of cells."""
+        ci, cj = self._cell(lat, lon)
+        lat_lo, lat_hi = (ci - 1) * self.snap_deg, (ci + 2) * self.snap_deg
+        lon_lo, lon_hi = (cj - 1) * self.snap_deg, (cj + 2) * self.snap_deg
+        # Degrees of longitude shrink towards the poles; use the block's most poleward edge
+        shrink = math.cos(math.radians(min(90.0, max(abs(lat_lo), abs(lat_hi)))))
+        margin = min(lat - lat_lo, lat_hi - lat, (lon - lon_lo) * shrink, (lon_hi - lon) * shrink)
+        return EARTH_RADIUS_KM * math.radians(margin)
+
+    @staticmethod
+    def _closest(points, lat, lon):
+        arr = np.array(points)
+        dist = haversine_km(lat, lon, arr[:, 0], arr[:, 1])
+        k = int(np.argmin(dist))
+        return points[k][0], points[k][1], float(dist[k])
+
+    def _nearest_locked(self, namespace, lat, lon):
+        # Grid-snapped fast path: same or adjacent cell, only if nothing outside them can be closer
+        cells = self._cells.get(namespace)
+        if not cells:
+            return None
+        ci, cj = self._cell(lat, lon)
+        candidates = [p for di in (-1, 0, 1) for dj in (-1, 0, 1) for p in cells.get((ci + di, cj + dj), ())]
+        if candidates:
+            found = self._closest(candidates, lat, lon)
+            if found[2] <= self._grid_margin_km(lat, lon):
+                return found
+        coords = self._coords[namespace]
+        tree, indexed = self._trees.get(namespace, (None, 0))
+        if len(coords) - indexed >= self.rebuild_every:
+            from sklearn.neighbors import BallTree  # about a second to import; only needed past the grid
+
+            tree, indexed = BallTree(np.radians(coords), metric="haversine"), len(coords)
+            self._trees[namespace] = (tree, indexed)
+        found = self._closest(coords[indexed:], lat, lon) if len(coords) > indexed else None
+        if tree is not None:
+            dist, idx = tree.query(np.radians([[lat, lon]]), k=1)
+            near = coords[int(idx[0, 0])]
+            if found is None or dist[0, 0] * EARTH_RADIUS_KM < found[2]:
+                found = near[0], near[1], float(dist[0, 0] * EARTH_RADIUS_KM)
+        return found
+
+    def nearest(self, namespace, lat, lon, tolerance_km):
+        """Return (lat, lon, distance_km) of the nearest indexed point within tolerance, else None."""
+        with self._lock:
+            found = self._nearest_locked(namespace, lat, lon)
+            if found is None or found[2] > tolerance_km:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.distances.append(found[2])
+            return found
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            dist = np.array(self.distances) if self.distances else np.array([0.0])
+            return {
+                "points": sum(len(c) for c in self._coords.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "mean_distance_km": float(dist.mean()),
+                "max_distance_km": float(dist.max()),
+            }
+
+
+def tolerance_for(source):
+    return SOURCE_TOLERANCE_KM.get(source, DEFAULT_TOLERANCE_KM)
@@ -0,0 +1,489 @@
+"""
+Consolidated columnar cache store for the data engine.
+
+All cached series live in a single Parquet store partitioned by variable and a
+coarse spatial tile:
+
+    <root>/variable=<Variable_Name>/tile=<lat_idx>_<lon_idx>/part-<id>.parquet
+
+Writers append new fragments atomically (write to a hidden temp file, then
+rename). Compaction merges a partition's fragments into one file sorted by key,
+so Parquet row-group statistics act as an in-file index for point lookups.
+"""
+import functools
+import os
+import logging
+import math
+import shutil
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+TILE_DEG = 5.0
+ROW_GROUP_SIZE = 4096
+COMPACT_MIN_FRAGMENTS = 8
+COMPACT_INTERVAL = 300
+LOCK_STALE_SECONDS = 600
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_schema():
+    """Arrow schema of the store's rows; built on first use so importing the store does not load pyarrow."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("key", pa.string()),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("source", pa.string()),
+        ("date", pa.date32()),
+        ("value", pa.float64()),
+        ("written", pa.int64()),
+    ])
+
+
+def cache_key(lat, lon, source):
+    """Normalized cache key for the daily history of a location from one source."""
+    return f"{lat:.4f}_{lon:.4f}_{source}"
+
+
+def _dedupe(dates, values, written):
+    """Keep the most recently written value per date, sorted by date."""
+    order = np.lexsort((written, dates))
+    sorted_dates = dates[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = sorted_dates[1:] != sorted_dates[:-1]
+    idx = order[keep]
+    return dates[idx], values[idx]
+
+
+def merge_series(old_dates, old_values, new_dates, new_values):
+    """Merge two daily series, preferring the new values on overlapping dates."""
+    dates = np.concatenate([old_dates, new_dates])
+    values = np.concatenate([old_values, new_values])
+    written = np.concatenate([np.zeros(len(old_dates), dtype=np.int64), np.ones(len(new_dates), dtype=np.int64)])
+    return _dedupe(dates, values, written)
+
+
+class CacheStore:
+    """Partitioned Parquet store with point lookups, range scans and compaction."""
+
+    def __init__(self, root, tile_deg=TILE_DEG):
+        self.root = Path(root)
+        self.tile_deg = tile_deg
+        self._lock = threading.RLock()
+        # partition dir -> (fragment names indexed, {key: set(fragment names)})
+        self._index = {}
+        self._compactor = None
+        self._stop = threading.Event()
+
+    # --- Layout ---
+    def tile_for(self, lat, lon):
+        return f"{math.floor(lat / self.tile_deg)}_{math.floor(lon / self.tile_deg)}"
+
+    def partition_dir(self, variable, lat, lon):
+        safe_var = variable.replace(" ", "_")
+        return self.root / f"variable={safe_var}" / f"tile={self.tile_for(lat, lon)}"
+
+    @staticmethod
+    def fragments(partition):
+        return sorted(p for p in partition.glob("part-*.parquet"))
+
+    def partitions(self):
+        return sorted(p for p in self.root.glob("variable=*/tile=*") if p.is_dir())
+
+    # --- Index ---
+    def _partition_index(self, partition):
+        """Return {key: set(fragment names)} for a partition, reading the keys of fragments not seen before."""
+        import pyarrow.parquet as pq
+
+        # A listdir rather than the directory mtime: a fragment written by another process within
+        # the same timestamp tick would leave the mtime unchanged
+        frags = self.fragments(partition)
+        names = frozenset(frag.name for frag in frags)
+        with self._lock:
+            cached = self._index.get(partition)
+            if cached and cached[0] == names:
+                return cached[1]
+            known = {}
+            if cached:
+                for key, key_names in cached[1].items():
+                    for name in key_names:
+                        known.setdefault(name, set()).add(key)
+            index = {}
+            seen = set()
+            for frag in frags:
+                keys = known.get(frag.name)
+                if keys is None:
+                    try:
+                        keys = set(pq.read_table(frag, columns=["key"]).column("key").unique().to_pylist())
+                    except FileNotFoundError:
+                        continue
+                seen.add(frag.name)
+                for key in keys:
+                    index.setdefault(key, set()).add(frag.name)
+            self._index[partition] = (frozenset(seen), index)
+            return index
+
+    # --- Writes ---
+    def append(self, variable, key, lat, lon, source, dates, values):
+        """Atomically append one series as a new fragment of its partition."""
+        import pyarrow as pa
+
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.asarray(values, dtype=float)
+        table = pa.table({
+            "key": pa.array([key] * len(dates), pa.string()),
+            "lat": pa.array(np.full(len(dates), lat, dtype=float)),
+            "lon": pa.array(np.full(len(dates), lon, dtype=float)),
+            "source": pa.array([source] * len(dates), pa.string()),
+            "date": pa.array(dates, pa.date32()),
+            "value": pa.array(values, pa.float64()),
+            "written": pa.array(np.full(len(dates), time.time_ns(), dtype=np.int64)),
+        }, schema=arrow_schema())
+        self.write_fragment(self.partition_dir(variable, lat, lon), table)
+        self.start_background_compaction()
+
+    def append_many(self, variable, source, series):
+        """Append many series in one fragment per partition (one file instead of one per location).
+        Args:
+            variable: Variable name
+            source: Source name
+            series: Iterable of (key, lat, lon, dates, values)
+        """
+        import pyarrow as pa
+
+        schema = arrow_schema()
+        columns = {}
+        stamp = time.time_ns()
+        for key, lat, lon, dates, values in series:
+            dates = np.asarray(dates, dtype="datetime64[D]")
+            cols = columns.setdefault(self.partition_dir(variable, lat, lon), {n: [] for n in schema.names})
+            n = len(dates)
+            cols["key"].append(np.full(n, key, dtype=object))
+            cols["lat"].append(np.full(n, lat, dtype=float))
+            cols["lon"].append(np.full(n, lon, dtype=float))
+            cols["source"].append(np.full(n, source, dtype=object))
+            cols["date"].append(dates)
+            cols["value"].append(np.asarray(values, dtype=float))
+            cols["written"].append(np.full(n, stamp, dtype=np.int64))
+        for partition, cols in columns.items():
+            table = pa.table({name: pa.array(np.concatenate(parts), schema.field(name).type)
+                              for name, parts in cols.items()}, schema=schema)
+            self.write_fragment(partition, table)
+        if columns:
+            self.start_background_compaction()
+
+    def write_fragment(self, partition, table):
+        import pyarrow.parquet as pq
+
+        partition.mkdir(parents=True, exist_ok=True)
+        tmp = partition / f".tmp-{uuid.uuid4().hex}.parquet"
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+        final = partition / f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        os.replace(tmp, final)
+        return final
+
+    # --- Reads ---
+    def get(self, variable, key, lat, lon):
+        """Point lookup. Returns (dates datetime64[D], values float) or None."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        partition = self.partition_dir(variable, lat, lon)
+        for _ in range(2):
+            names = self._partition_index(partition).get(key)
+            if not names:
+                return None
+            try:
+                tables = [
+                    pq.read_table(partition / name, columns=["date", "value", "written"], filters=[("key", "=", key)])
+                    for name in sorted(names)
+                ]
+                break
+            except FileNotFoundError:
+                # A compaction replaced the fragment under us; refresh the index and retry.
+                with self._lock:
+                    self._index.pop(partition, None)
+        else:
+            return None
+        table = pa.concat_tables(tables)
+        if table.num_rows == 0:
+            return None
+        dates = table.column("date").to_numpy().astype("datetime64[D]")
+        values = table.column("value").to_numpy(zero_copy_only=False).astype(float)
+        written = table.column("written").to_numpy()
+        return _dedupe(dates, values, written)
+
+    def _dataset(self):
+        import pyarrow.dataset as ds  # dataset scans are rare; keep them off the import path
+
+        if next(self.root.glob("variable=*/tile=*/part-*.parquet"), None) is None:
+            return None
+        return ds.dataset(self.root, format="parquet", partitioning="hive")
+
+    def scan(self, variable=None, lat_range=None, lon_range=None, date_range=None, source=None):
+        """Bulk range scan. Returns a DataFrame with one row per (key, date), latest write wins."""
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=[f.name for f in arrow_schema()] + ["variable", "tile"])
+        expr = None
+
+        def _and(e):
+            return e if expr is None else expr & e
+
+        if variable is not None:
+            expr = _and(ds.field("variable") == variable.replace(" ", "_"))
+        if lat_range is not None:
+            expr = _and((ds.field("lat") >= lat_range[0]) & (ds.field("lat") <= lat_range[1]))
+        if lon_range is not None:
+            expr = _and((ds.field("lon") >= lon_range[0]) & (ds.field("lon") <= lon_range[1]))
+        if date_range is not None:
+            start, end = pa.array(np.asarray(date_range, dtype="datetime64[D]"), pa.date32())
+            expr = _and((ds.field("date") >= start) & (ds.field("date") <= end))
+        if source is not None:
+            expr = _and(ds.field("source") == source)
+        df = dataset.to_table(filter=expr).to_pandas()
+        df["variable"] = df["variable"].astype(str).str.replace("_", " ")
+        df = df.sort_values(["variable", "key", "date", "written"])
+        return df.drop_duplicates(["variable", "key", "date"], keep="last").reset_index(drop=True)
+
+    def keys(self):
+        """Distinct (variable, key, lat, lon, source) entries, reading only the key columns."""
+        import pandas as pd
+
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=["variable", "key", "lat", "lon", "source"])
+        df = dataset.to_table(columns=["variable", "key", "lat", "lon", "source"]).to_pandas()
+        df["variable"] = df["variable"].astype(str).str.replace("_", " ")
+        return df.drop_duplicates(["variable", "key"]).reset_index(drop=True)
+
+    # --- Compaction ---
+    @contextmanager
+    def _partition_lock(self, partition):
+        """Cross-process lock for rewriting a partition; yields False if another process holds it."""
+        lock = partition / ".compact.lock"
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.time() - lock.stat().st_mtime < LOCK_STALE_SECONDS:
+                yield False
+                return
+            lock.unlink(missing_ok=True)
+            with self._partition_lock(partition) as acquired:
+                yield acquired
+            return
+        try:
+            yield True
+        finally:
+            os.close(fd)
+            lock.unlink(missing_ok=True)
+
+    def compact_partition(self, partition, min_fragments=2):
+        """Merge a partition's fragments into one key-sorted file. Returns True if compacted."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        frags = self.fragments(partition)
+        if len(frags) < min_fragments:
+            return False
+        with self._partition_lock(partition) as acquired:
+            if not acquired:
+                return False
+            df = pa.concat_tables([pq.read_table(f, schema=arrow_schema()) for f in frags]).to_pandas()
+            df = df.sort_values(["key", "date", "written"]).drop_duplicates(["key", "date"], keep="last")
+            table = pa.Table.from_pandas(df, schema=arrow_schema(), preserve_index=False)
+            self.write_fragment(partition, table)
+            for f in frags:
+                f.unlink(missing_ok=True)
+            return True
+
+    def compact(self, min_fragments=2):
+        """Compact every partition with at least `min_fragments` fragments."""
+        return sum(self.compact_partition(p, min_fragments) for p in self.partitions())
+
+    def start_background_compaction(self, interval=COMPACT_INTERVAL):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._stop.clear()
+            self._compactor = threading.Thread(
+                target=self._compaction_loop, args=(interval,), name="cache-store-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    def stop_background_compaction(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _compaction_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.compact(COMPACT_MIN_FRAGMENTS)
+            except Exception as e:
+                logger.warning("Cache store compaction error: %s", e)
+
+
+    # --- Expiry ---
+    def _last_written(self, partition):
+        import pyarrow.parquet as pq
+
+        latest = 0
+        for frag in self.fragments(partition):
+            written = pq.read_table(frag, columns=["written"]).column("written")
+            if len(written):
+                latest = max(latest, int(written.to_numpy().max()))
+        return latest
+
+    def _expire_partition(self, partition, cutoff, keep):
+        """Drop the keys of a partition last written before `cutoff` (ns). Returns the number dropped."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        frags = self.fragments(partition)
+        if not frags:
+            return 0
+        with self._partition_lock(partition) as acquired:
+            if not acquired:
+                return 0
+            table = pa.concat_tables([pq.read_table(f, schema=arrow_schema()) for f in frags])
+            df = table.select(["key", "written"]).to_pandas()
+            last = df.groupby("key")["written"].max()
+            cold = [key for key, written in last.items() if written < cutoff and key not in keep]
+            if not cold:
+                return 0
+            remaining = table.filter(pc.invert(pc.is_in(table.column("key"), value_set=pa.array(cold))))
+            if remaining.num_rows:
+                self.write_fragment(partition, remaining)
+            for f in frags:
+                f.unlink(missing_ok=True)
+        with self._lock:
+            self._index.pop(partition, None)
+        return len(cold)
+
+    def expire(self, max_age=None, max_bytes=None, keep=()):
+        """
+        Remove cold data: keys not written for `max_age` seconds, then whole partitions, least recently
+        written first, until the store is at most `max_bytes`.
+        Args:
+            max_age: Seconds since a key's last write after which it is dropped (None to skip)
+            max_bytes: Size limit for the store (None to skip)
+            keep: Keys never dropped by age, and whose partitions are never dropped for size
+        Returns:
+            Dictionary with keys_removed, partitions_removed, bytes_before and bytes_after
+        """
+        keep = set(keep)
+        before = self.stats()["bytes"]
+        keys_removed = partitions_removed = 0
+        if max_age is not None:
+            cutoff = time.time_ns() - int(max_age * 1e9)
+            for partition in self.partitions():
+                keys_removed += self._expire_partition(partition, cutoff, keep)
+        if max_bytes is not None:
+            total = self.stats()["bytes"]
+            if total > max_bytes:
+                candidates = []
+                for partition in self.partitions():
+                    keys = set(self._partition_index(partition))
+                    if keys & keep:
+                        continue
+                    size = sum(f.stat().st_size for f in self.fragments(partition))
+                    if size == 0:
+                        continue
+                    candidates.append((self._last_written(partition), size, partition))
+                for _, size, partition in sorted(candidates, key=lambda c: (c[0], str(c[2]))):
+                    if total <= max_bytes:
+                        break
+                    shutil.rmtree(partition, ignore_errors=True)
+                    with self._lock:
+                        self._index.pop(partition, None)
+                    total -= size
+                    partitions_removed += 1
+        after = self.stats()["bytes"]
+        if keys_removed or partitions_removed:
+            logger.info("Expired %d keys and %d partitions (%d -> %d bytes).", keys_removed, partitions_removed,
+                        before, after)
+        return {"keys_removed": keys_removed, "partitions_removed": partitions_removed,
+                "bytes_before": before, "bytes_after": after}
+
+    def stats(self):
+        """Partition count, fragment count and total size in bytes of the store."""
+        partitions = self.partitions()
+        frags = [f for p in partitions for f in self.fragments(p)]
+        return {"partitions": len(partitions), "fragments": len(frags),
+                "bytes": sum(f.stat().st_size for f in frags if f.exists())}
+
+
+# --- Migration from the legacy one-file-per-query cache ---
+def migrate_legacy_cache(store, legacy_dir, remove=False):
+    """Import `<Var>_<lat>_<lon>_<date>_<source>.parquet` files into the store. Returns files imported.
+
+    Their annual samples become (sparse) rows of each location's daily history.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    batches = {}
+    imported = []
+    for path in sorted(Path(legacy_dir).glob("*.parquet")):
+        try:
+            safe_var, lat, lon, _, source = path.stem.rsplit("_", 4)
+            lat, lon = float(lat), float(lon)
+            df = pd.read_parquet(path)
+        except Exception as e:
+            logger.warning("Skipping legacy cache file %s: %s", path.name, e)
+            continue
+        variable = safe_var.replace("_", " ")
+        n = len(df)
+        batches.setdefault(store.partition_dir(variable, lat, lon), []).append(pa.table({
+            "key": pa.array([cache_key(lat, lon, source)] * n, pa.string()),
+            "lat": pa.array(np.full(n, lat)),
+            "lon": pa.array(np.full(n, lon)),
+            "source": pa.array([source] * n, pa.string()),
+            "date": pa.array(np.asarray(df["dates"], dtype="datetime64[D]"), pa.date32()),
+            "value": pa.array(np.asarray(df["values"], dtype=float), pa.float64()),
+            "written": pa.array(np.full(n, int(path.stat().st_mtime_ns), dtype=np.int64)),
+        }, schema=arrow_schema()))
+        imported.append(path)
+    for partition, tables in batches.items():
+        store.write_fragment(partition, pa.concat_tables(tables))
+    if remove:
+        for path in imported:
+            path.unlink(missing_ok=True)
+    return len(imported)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the data engine cache store.")
+    parser.add_argument("command", choices=["migrate", "compact", "expire", "stats"])
+    parser.add_argument("--cache-dir", default=str(Path(__file__).parent.parent.parent / "data" / "cache"))
+    parser.add_argument("--remove", action="store_true", help="Delete legacy files after importing them.")
+    parser.add_argument("--max-age-days", type=float, help="expire: drop keys not written for this many days")
+    parser.add_argument("--max-mb", type=float, help="expire: shrink the store to at most this many MB")
+    args = parser.parse_args()
+    store = CacheStore(Path(args.cache_dir) / "store")
+    if args.command == "migrate":
+        print(f"Imported {migrate_legacy_cache(store, args.cache_dir, remove=args.remove)} legacy cache files.")
+    elif args.command == "compact":
+        print(f"Compacted {store.compact()} partitions.")
+    elif args.command == "expire":
+        print(store.expire(max_age=args.max_age_days * 86400 if args.max_age_days else None,
+                           max_bytes=args.max_mb * 1024 * 1024 if args.max_mb else None))
+    else:
+        print(store.stats())
@@ -0,0 +1,134 @@
+"""
+Compact time-series container used throughout the data engine.
+
+A TimeSeries holds `datetime64[D]` dates and a float64 value array (NaN marks a
+missing value) plus a few descriptive fields, in `__slots__` so instances carry
+no per-object dict. It converts to and from Arrow tables: the value column is
+shared with Arrow without copying, the dates are cast between datetime64[D] and
+date32.
+
+Code written against the old result dicts keeps working: `ts["values"]`,
+`ts.get("message")` and `"unit" in ts` read the same fields, and `as_dict()`
+returns the old JSON-friendly shape (ISO date strings, lists of floats/None).
+"""
+import numpy as np
+
+_NO_DATES = np.array([], dtype="datetime64[D]")
+_NO_VALUES = np.array([], dtype=float)
+_FIELDS = ("dates", "values", "variable", "unit", "source")
+
+
+class TimeSeries:
+    """Daily (or sparse annual) series of one variable at one location."""
+
+    __slots__ = ("dates", "values", "variable", "unit", "source", "meta")
+
+    def __init__(self, dates, values, variable=None, unit=None, source=None, **meta):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.values = np.asarray(values, dtype=float)
+        if self.dates.shape != self.values.shape:
+            raise ValueError(f"dates and values differ in shape: {self.dates.shape} vs {self.values.shape}")
+        self.variable = variable
+        self.unit = unit
+        self.source = source
+        # Optional extras such as 'message', 'distance_km' or 'timed_out'
+        self.meta = meta
+
+    @classmethod
+    def empty(cls, variable=None, unit=None, source=None, **meta):
+        return cls(_NO_DATES, _NO_VALUES, variable, unit, source, **meta)
+
+    # --- Dict compatibility ---
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            return getattr(self, key)
+        return self.meta[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELDS:
+            setattr(self, key, value)
+        else:
+            self.meta[key] = value
+
+    def __contains__(self, key):
+        return key in _FIELDS or key in self.meta
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(_FIELDS) + list(self.meta)
+
+    def as_dict(self):
+        """The legacy result dict: ISO date strings and a list of floats with None for missing values."""
+        result = {
+            "dates": np.datetime_as_string(self.dates, unit="D").tolist(),
+            "values": [None if np.isnan(v) else float(v) for v in self.values],
+            "variable": self.variable,
+            "unit": self.unit,
+            "source": self.source,
+        }
+        result.update(self.meta)
+        return result
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a legacy result dict (or any mapping with 'dates' and 'values')."""
+        values = np.array([np.nan if v is None else v for v in data.get("values", [])], dtype=float)
+        extras = {k: v for k, v in data.items() if k not in _FIELDS}
+        return cls(data.get("dates", _NO_DATES), values, data.get("variable"), data.get("unit"),
+                   data.get("source"), **extras)
+
+    # --- Arrow ---
+    def to_arrow(self):
+        """Arrow table with 'date' (date32) and 'value' (float64) columns; descriptive fields go in metadata."""
+        import pyarrow as pa
+
+        metadata = {k: str(getattr(self, k)) for k in ("variable", "unit", "source") if getattr(self, k) is not None}
+        return pa.table(
+            {"date": pa.array(self.dates, pa.date32()), "value": pa.array(self.values, pa.float64())},
+            metadata=metadata or None,
+        )
+
+    @classmethod
+    def from_arrow(cls, table, **fields):
+        """Build from a table with 'date' and 'value' columns; `fields` override the table metadata."""
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+        for name in ("variable", "unit", "source"):
+            fields.setdefault(name, metadata.get(name))
+        values = table.column("value")
+        if values.null_count == 0 and values.num_chunks == 1:
+            values = values.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            values = values.to_numpy(zero_copy_only=False).astype(float)  # nulls become NaN
+        dates = table.column("date").to_numpy().astype("datetime64[D]")
+        return cls(dates, values, **fields)
+
+    # --- Helpers ---
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return (f"TimeSeries({self.variable!r}, {len(self)} points, source={self.source!r}"
+                f"{', ' + ', '.join(f'{k}={v!r}' for k, v in self.meta.items()) if self.meta else ''})")
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.values.nbytes
+
+    @property
+    def valid(self):
+        """Boolean mask of the points that have a value."""
+        return ~np.isnan(self.values)
+
+    def valid_values(self):
+        return self.values[self.valid]
+
+    def freeze(self):
+        """Mark the arrays read-only (shared cache entries must not be mutated)."""
+        self.dates.setflags(write=False)
+        self.values.setflags(write=False)
+        return self
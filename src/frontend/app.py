@@ -49,7 +49,9 @@ def get_condition_label(variable, value):
             return "Storm-level"
     return "Unknown"
 import streamlit as st
-import pandas as pd
+import numpy as np
+import logging
+import os
 import sys
 from pathlib import Path
 
@@ -59,9 +61,23 @@ sys.path.insert(0, str(src_path))
 
 # Use relative imports for local modules
 from frontend import ui_helpers, visualizations
-import asyncio
-from data_engine.main import get_processed_data_async, get_multiple_variables
-from modeling.main import analyze_variable
+from data_engine.grid import bbox_around, fetch_grid
+from data_engine.main import stream_multiple_variables
+from data_engine.http_client import run_sync
+from data_engine.prefetch import start_prefetcher
+from modeling.main import DEFAULT_THRESHOLD, DEFAULT_THRESHOLDS, analyze_grid, analyze_variable, threshold_sweep
+from telemetry.main import METRICS, start_exporter
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# Prometheus-style metrics at http://localhost:<port>/metrics when RISK_EXPLORER_METRICS_PORT is set
+if os.environ.get("RISK_EXPLORER_METRICS_PORT"):
+    start_exporter(int(os.environ["RISK_EXPLORER_METRICS_PORT"]))
+# Keep popular locations warm in the background, spending at most this many provider requests a day
+if os.environ.get("RISK_EXPLORER_PREFETCH_BUDGET"):
+    start_prefetcher(budget=int(os.environ["RISK_EXPLORER_PREFETCH_BUDGET"]))
+
+# Seconds to wait for each variable before showing the others without it
+VARIABLE_TIMEOUT = 20
 
 st.set_page_config(
     page_title="Historical Risk Explorer",
@@ -84,6 +100,9 @@ st.sidebar.markdown("Adjust the parameters below to customize your analysis.")
 location = ui_helpers.location_input()
 selected_date = ui_helpers.date_input()
 selected_variables = ui_helpers.variable_selector()
+interactive_charts = st.sidebar.checkbox("Interactive charts (rendered in the browser)", value=False)
+chart_mode = "vega" if interactive_charts else "png"
+show_performance = st.sidebar.checkbox("Show performance panel", value=False)
 
 if not selected_variables:
     st.warning("Please select at least one environmental variable from the sidebar.")
@@ -102,28 +121,75 @@ if 'analysis_complete' not in st.session_state:
 
 if st.session_state.analysis_complete:
     all_results = []
-    summary_labels = []
-    # Use session_state to cache per-variable data
-    if 'weather_cache' not in st.session_state:
-        st.session_state.weather_cache = {}
-    weather_cache = st.session_state.weather_cache
-    # Fetch all variables asynchronously
-    async def fetch_all():
-        return await get_multiple_variables(selected_date, selected_variables, location)
-
-    with st.spinner('Processing all selected variables...'):
-        results = asyncio.run(fetch_all())
-
-    for idx, variable in enumerate(selected_variables):
-        historical_data = results[idx]
-        values = historical_data['values']
-        # Filter out None values for mean calculation
-        valid_vals = [v for v in values if v is not None]
-        mean_val = sum(valid_vals) / len(valid_vals) if valid_vals else 0
+    # Per-run lookup of results; the data engine keeps the shared process-wide cache
+    weather_cache = {}
+    # Show selected variables in summary, with icons and color for eye-catching effect
+    ICONS = {
+        'Temperature': '🌡️',
+        'Precipitation': '🌧️',
+        'Wind Speed': '💨',
+        'Humidity': '💧',
+    }
+    selected_vars_str = ', '.join([f"{ICONS.get(var, '')} {var}" for var in selected_variables])
+
+    def render_summary(placeholder, summary_labels, pending):
+        # Build a natural language summary
+        friendly_phrases = []
+        for var, lbl in summary_labels:
+            if var == 'Temperature' and lbl in ['Very Hot', 'Hot']:
+                friendly_phrases.append('it will feel <span style="color:#e25822;font-weight:bold">very hot</span>')
+            elif var == 'Temperature' and lbl in ['Freezing', 'Cold']:
+                friendly_phrases.append('it will feel <span style="color:#1e90ff;font-weight:bold">cold</span>')
+            elif var == 'Precipitation' and lbl in ['Stormy', 'Heavy']:
+                friendly_phrases.append('expect <span style="color:#0077b6;font-weight:bold">heavy rain</span>')
+            elif var == 'Precipitation' and lbl == 'Dry':
+                friendly_phrases.append('it will be <span style="color:#f4a261;font-weight:bold">dry</span>')
+            elif var == 'Wind Speed' and lbl in ['Very Windy', 'Storm-level']:
+                friendly_phrases.append('it will be <span style="color:#b5179e;font-weight:bold">very windy</span>')
+            elif var == 'Humidity' and lbl == 'Very Humid':
+                friendly_phrases.append('the air will feel <span style="color:#43aa8b;font-weight:bold">very humid</span>')
+            else:
+                friendly_phrases.append(f"{lbl.lower()} {var.lower()}")
+
+        summary_sentence = " and ".join(friendly_phrases) or "waiting for data"
+        pending_note = f" (still fetching {', '.join(pending)})" if pending else ""
+        placeholder.markdown(f"""
+            <div style="background:#23272f;border:1.5px solid #343942;padding:1.2em 1em 1em 1em;border-radius:1em;margin-bottom:1em;box-shadow:0 2px 8px 0 rgba(0,0,0,0.18);">
+                <span style="font-size:1.3em;font-weight:bold;color:#f8fafc;">📝 Personalized Weather Insight</span><br>
+                <span style="font-size:1.1em;color:#f8fafc;">{summary_sentence.capitalize()}{pending_note}.</span><br>
+                <span style="font-size:1em;color:#b0b8c1;">Variables analyzed: {selected_vars_str}</span>
+            </div>
+        """, unsafe_allow_html=True)
+
+    # Fetch on the engine's event loop and show each variable as soon as it arrives;
+    # results are memoized across reruns
+    summary_placeholder = st.empty()
+    status_slots = {var: col.empty() for var, col in zip(selected_variables, st.columns(len(selected_variables)))}
+    for variable, slot in status_slots.items():
+        slot.info(f"⏳ Fetching {ICONS.get(variable, '')} {variable}...")
+    labels = {}
+    arrived = set()
+    for variable, historical_data in stream_multiple_variables(selected_date, selected_variables, location,
+                                                               timeout=VARIABLE_TIMEOUT):
+        # Missing values are NaN and left out of the mean
+        valid_vals = historical_data.valid_values()
+        mean_val = float(valid_vals.mean()) if valid_vals.size else 0
         label = get_condition_label(variable, mean_val)
         cache_key = f"{selected_date}_{location['lat']}_{location['lon']}_{variable}"
         weather_cache[cache_key] = (historical_data, mean_val, label)
-        summary_labels.append((variable, label))
+        arrived.add(variable)
+        slot = status_slots[variable]
+        if valid_vals.size:
+            labels[variable] = label
+            slot.success(f"{ICONS.get(variable, '')} {variable}: {label} ({mean_val:.1f} {historical_data['unit']})")
+        else:
+            slot.warning(f"{ICONS.get(variable, '')} {variable}: {historical_data.get('message', 'No data available.')}")
+        render_summary(summary_placeholder, [(var, labels[var]) for var in selected_variables if var in labels],
+                       [var for var in selected_variables if var not in arrived])
+
+    for variable in selected_variables:
+        cache_key = f"{selected_date}_{location['lat']}_{location['lon']}_{variable}"
+        historical_data, mean_val, label = weather_cache[cache_key]
         result_record = {
             'Variable': variable,
             'Location_Lat': location['lat'],
@@ -135,43 +201,6 @@ if st.session_state.analysis_complete:
         }
         all_results.append(result_record)
 
-
-    # Show selected variables in summary, with icons and color for eye-catching effect
-    ICONS = {
-        'Temperature': '🌡️',
-        'Precipitation': '🌧️',
-        'Wind Speed': '💨',
-        'Humidity': '💧',
-    }
-    selected_vars_str = ', '.join([f"{ICONS.get(var, '')} {var}" for var in selected_variables])
-
-    # Build a natural language summary
-    friendly_phrases = []
-    for var, lbl in summary_labels:
-        if var == 'Temperature' and lbl in ['Very Hot', 'Hot']:
-            friendly_phrases.append('it will feel <span style="color:#e25822;font-weight:bold">very hot</span>')
-        elif var == 'Temperature' and lbl in ['Freezing', 'Cold']:
-            friendly_phrases.append('it will feel <span style="color:#1e90ff;font-weight:bold">cold</span>')
-        elif var == 'Precipitation' and lbl in ['Stormy', 'Heavy']:
-            friendly_phrases.append('expect <span style="color:#0077b6;font-weight:bold">heavy rain</span>')
-        elif var == 'Precipitation' and lbl == 'Dry':
-            friendly_phrases.append('it will be <span style="color:#f4a261;font-weight:bold">dry</span>')
-        elif var == 'Wind Speed' and lbl in ['Very Windy', 'Storm-level']:
-            friendly_phrases.append('it will be <span style="color:#b5179e;font-weight:bold">very windy</span>')
-        elif var == 'Humidity' and lbl == 'Very Humid':
-            friendly_phrases.append('the air will feel <span style="color:#43aa8b;font-weight:bold">very humid</span>')
-        else:
-            friendly_phrases.append(f"{lbl.lower()} {var.lower()}")
-
-    summary_sentence = " and ".join(friendly_phrases)
-    st.markdown(f"""
-        <div style="background:#23272f;border:1.5px solid #343942;padding:1.2em 1em 1em 1em;border-radius:1em;margin-bottom:1em;box-shadow:0 2px 8px 0 rgba(0,0,0,0.18);">
-            <span style="font-size:1.3em;font-weight:bold;color:#f8fafc;">📝 Personalized Weather Insight</span><br>
-            <span style="font-size:1.1em;color:#f8fafc;">{summary_sentence.capitalize()}.</span><br>
-            <span style="font-size:1em;color:#b0b8c1;">Variables analyzed: {selected_vars_str}</span>
-        </div>
-    """, unsafe_allow_html=True)
-
     # Advanced Results toggleable
     if 'show_advanced' not in st.session_state:
         st.session_state.show_advanced = False
@@ -180,35 +209,40 @@ if st.session_state.analysis_complete:
         st.session_state.show_advanced = not st.session_state.show_advanced
 
     if st.session_state.show_advanced:
+        show_ci = st.checkbox("Show 90% confidence intervals (bootstrap)", value=False)
         for idx, variable in enumerate(selected_variables):
             cache_key = f"{selected_date}_{location['lat']}_{location['lon']}_{variable}"
             historical_data, mean_val, label = weather_cache[cache_key]
             st.markdown(f"## 📊 {variable} (Advanced)")
-            default_thresholds = {
-                'Temperature': 25.0,
-                'Precipitation': 60.0,
-                'Wind Speed': 20.0,
-                'Humidity': 70.0,
-            }
-            threshold = ui_helpers.threshold_input(variable, default_thresholds.get(variable, 50.0))
+            threshold = ui_helpers.threshold_input(variable, DEFAULT_THRESHOLDS.get(variable, DEFAULT_THRESHOLD))
             with st.spinner(f'Analyzing {variable}...'):
-                analysis_result = analyze_variable(historical_data, threshold)
+                if show_ci:
+                    analysis_result = analyze_variable(historical_data, threshold, bootstrap=1000, time_budget=5)
+                else:
+                    analysis_result = analyze_variable(historical_data, threshold)
             col1, col2 = st.columns([2, 1])
             with col1:
                 st.subheader("Risk Metrics")
                 st.metric("Exceedance Probability", f"{analysis_result['probability']}%")
                 st.metric("Risk Index", f"{analysis_result['risk_index']:.3f}")
+                if show_ci and np.isfinite(analysis_result['probability_ci'][0]):
+                    prob_lo, prob_hi = analysis_result['probability_ci']
+                    risk_lo, risk_hi = analysis_result['risk_index_ci']
+                    st.caption(f"90% CI: probability {prob_lo}%-{prob_hi}%, risk index {risk_lo:.3f}-{risk_hi:.3f}")
+                return_period = threshold_sweep(historical_data, [threshold])['return_period'][0]
+                st.metric("Return Period", f"{return_period:.1f} years" if np.isfinite(return_period) else "Not expected")
                 st.metric("Mean Value", f"{analysis_result['mean']} {historical_data['unit']}")
                 st.metric("Std Deviation", f"{analysis_result['std']} {historical_data['unit']}")
             with col2:
                 st.subheader("Data Distribution")
-                visualizations.plot_histogram(historical_data, threshold)
+                visualizations.plot_histogram(historical_data, threshold, mode=chart_mode)
             st.subheader("Historical Trend")
-            visualizations.plot_probability_trend(historical_data, threshold, analysis_result)
+            visualizations.plot_probability_trend(historical_data, threshold, analysis_result, mode=chart_mode)
             st.markdown("---")
         # Export results
         st.markdown("## 💾 Export Results")
         st.markdown("Download the combined analysis results as a CSV file.")
+        import pandas as pd
         results_df = pd.DataFrame(all_results)
         csv = results_df.to_csv(index=False)
         st.download_button(
@@ -221,3 +255,37 @@ if st.session_state.analysis_complete:
         st.success("✅ Analysis complete! You can now download the results.")
 else:
     st.info("👆 Click the 'Analyze Variables' button above to start the analysis.")
+
+# Regional mode: the same analysis for every cell of a grid around the location
+with st.expander("🗺️ Regional Risk Map"):
+    st.markdown("Exceedance probability and risk index for every cell of a grid around the selected location.")
+    col1, col2, col3 = st.columns(3)
+    region_variable = col1.selectbox("Variable", selected_variables, key="region_variable")
+    half_width = col2.slider("Half-width (km)", 10, 250, 50, step=10, key="region_half_width")
+    cells = col3.slider("Cells per side", 5, 50, 20, key="region_cells")
+    region_threshold = st.number_input(
+        f"Threshold for {region_variable} (region)",
+        value=float(DEFAULT_THRESHOLDS.get(region_variable, DEFAULT_THRESHOLD)), step=1.0, key="region_threshold",
+    )
+    field_labels = {caption: field for field, (caption, _, _) in visualizations.GRID_FIELDS.items()}
+    region_field = field_labels[st.radio("Show", list(field_labels), horizontal=True, key="region_field")]
+    region_key = (selected_date, location['lat'], location['lon'], region_variable, half_width, cells)
+    if st.button("Analyze Region"):
+        with st.spinner(f"Fetching {cells * cells} grid cells..."):
+            bbox = bbox_around(float(location['lat']), float(location['lon']), half_width)
+            st.session_state.region = (region_key, run_sync(fetch_grid(bbox, (cells, cells), region_variable,
+                                                                         selected_date)))
+    region = st.session_state.get("region")
+    if region is not None and region[0] == region_key:
+        grid = region[1]
+        if grid.coverage() == 0:
+            st.warning("No data for this region (regional maps use Meteomatics multi-point requests).")
+        else:
+            # Fitting every cell is one vectorized call, so a new threshold re-renders without refetching
+            grid_analysis = analyze_grid(grid.values, region_threshold)
+            visualizations.plot_risk_grid(grid, grid_analysis, region_field)
+            st.caption(f"{cells}×{cells} cells, {grid.shape[0]} years, {grid.coverage():.0%} of cells with data. "
+                       f"Highest exceedance probability: {np.nanmax(grid_analysis['probability']):.1f}%")
+
+if show_performance:
+    ui_helpers.performance_panel(METRICS.snapshot())
@@ -0,0 +1,259 @@
+"""
+Chart rendering layer for the Streamlit views.
+
+Long series are downsampled before plotting (largest-triangle-three-buckets by
+default, or min/max bucketing), histograms are binned with NumPy, and finished
+charts are cached by a hash of the data plus the threshold, so a Streamlit
+rerun that shows the same data reuses the rendered output. Charts come out
+either as PNG bytes (matplotlib, Agg backend, no pyplot global state) or as
+Vega-Lite specs that the browser renders itself.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from telemetry.main import METRICS
+
+MAX_POINTS = 1000
+MARKER_MAX_POINTS = 100  # draw point markers only on short series
+HIST_BINS = 10
+CHART_CACHE_SIZE = 128
+
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+
+# --- Downsampling ---
+def lttb(x, y, n_out):
+    """
+    Largest-triangle-three-buckets downsampling (Steinarsson, 2013).
+    Args:
+        x: Increasing numeric x values
+        y: Values at x (no NaNs)
+        n_out: Number of points to keep (the first and last are always kept)
+    Returns:
+        Index array of the kept points, in order
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2 buckets between the end points
+    starts, ends = edges[:-1], edges[1:]
+    # Average point of every bucket, used as the third triangle vertex for the bucket before it
+    sums_x = np.add.reduceat(x[1:n - 1], starts - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], starts - 1)
+    counts = ends - starts
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_buckets(y, n_buckets):
+    """Indices of the minimum and maximum of `y` in each of `n_buckets` equal buckets, in order."""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    padded = np.full(size * n_buckets, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(buckets), axis=1)
+    base = np.arange(n_buckets)[valid] * size
+    lo = base + np.nanargmin(buckets[valid], axis=1)
+    hi = base + np.nanargmax(buckets[valid], axis=1)
+    return np.unique(np.concatenate([lo, hi]))
+
+
+def downsample(dates, values, max_points=MAX_POINTS, method="lttb"):
+    """Drop NaNs and reduce a (datetime64 dates, values) series to at most `max_points` points."""
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype=float)
+    ok = ~np.isnan(values)
+    dates, values = dates[ok], values[ok]
+    if len(values) <= max_points:
+        return dates, values
+    if method == "minmax":
+        keep = minmax_buckets(values, max_points // 2)
+    elif method == "lttb":
+        keep = lttb(dates.astype(float), values, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method '{method}'. Expected 'lttb' or 'minmax'.")
+    return dates[keep], values[keep]
+
+
+def histogram(values, bins=HIST_BINS):
+    """Counts and bin edges of the non-NaN values. Returns (counts, edges), empty if there are none."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0)
+    return np.histogram(values, bins=bins)
+
+
+def grid_image(values, vmin, vmax, cmap="YlOrRd"):
+    """RGBA image (uint8, north-up) of a (lat, lon) array with rows running south to north; NaN is transparent."""
+    from matplotlib import colormaps
+
+    values = np.asarray(values, dtype=float)[::-1]
+    scaled = np.clip((values - vmin) / (vmax - vmin), 0, 1) if vmax > vmin else np.zeros_like(values)
+    rgba = colormaps[cmap](np.nan_to_num(scaled), bytes=True)
+    rgba[np.isnan(values), 3] = 0
+    return rgba
+
+
+# --- Cache ---
+def data_hash(*arrays):
+    """Content hash of the arrays (dates, values, ...) used as the chart cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def cached_chart(key, render):
+    """Return the cached chart for `key`, rendering and storing it with `render()` on a miss."""
+    with _chart_cache_lock:
+        chart = _chart_cache.get(key)
+        if chart is not None:
+            _chart_cache.move_to_end(key)
+            METRICS.inc("chart_cache_total", result="hit")
+            return chart
+    METRICS.inc("chart_cache_total", result="miss")
+    chart = render()
+    with _chart_cache_lock:
+        _chart_cache[key] = chart
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return chart
+
+
+# --- Matplotlib (PNG) ---
+def _png(fig):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    return buf.getvalue()
+
+
+def trend_png(dates, values, threshold, variable, unit, max_points=MAX_POINTS, method="lttb"):
+    """PNG of the series with the threshold line and exceedances, downsampled to `max_points`."""
+    from matplotlib.figure import Figure
+
+    dates, values = downsample(dates, values, max_points, method)
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    marker = "o" if len(values) <= MARKER_MAX_POINTS else None
+    ax.plot(dates, values, marker=marker, linestyle='-', linewidth=2 if marker else 1, markersize=4,
+            label='Historical Data')
+    ax.axhline(y=threshold, color='r', linestyle='--', linewidth=2, label=f'Threshold ({threshold} {unit})')
+    exceeding = values > threshold
+    if exceeding.any():
+        ax.scatter(dates[exceeding], values[exceeding], color='red', s=50 if marker else 12, zorder=5,
+                   label='Exceeds Threshold')
+    ax.set_xlabel('Date', fontsize=12, fontweight='bold')
+    ax.set_ylabel(f'{variable} ({unit})', fontsize=12, fontweight='bold')
+    ax.set_title(f'{variable} Historical Trend', fontsize=14, fontweight='bold')
+    ax.legend(loc='best')
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate(rotation=45, ha='right')
+    fig.tight_layout()
+    return _png(fig)
+
+
+def histogram_png(values, threshold, variable, unit, title_suffix="", bins=HIST_BINS):
+    """PNG of the value distribution with the threshold line."""
+    from matplotlib.figure import Figure
+
+    counts, edges = histogram(values, bins)
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='skyblue', edgecolor='black', alpha=0.7)
+    ax.axvline(x=threshold, color='r', linestyle='--', linewidth=2, label=f'Threshold ({threshold} {unit})')
+    ax.set_xlabel(f'{variable} ({unit})', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Frequency', fontsize=12, fontweight='bold')
+    ax.set_title(f'{variable} Distribution {title_suffix}', fontsize=14, fontweight='bold')
+    ax.legend(loc='best')
+    ax.grid(True, alpha=0.3, axis='y')
+    fig.tight_layout()
+    return _png(fig)
+
+
+# --- Vega-Lite (client-side) ---
+def trend_spec(dates, values, threshold, variable, unit, max_points=MAX_POINTS, method="lttb"):
+    """Vega-Lite spec of the downsampled series, threshold rule and exceedances."""
+    dates, values = downsample(dates, values, max_points, method)
+    rows = [{"date": d, "value": float(v)} for d, v in zip(np.datetime_as_string(dates, unit="D"), values)]
+    y_title = f"{variable} ({unit})"
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": f"{variable} Historical Trend",
+        "height": 320,
+        "layer": [
+            {
+                "data": {"values": rows},
+                "mark": {"type": "line", "point": len(rows) <= MARKER_MAX_POINTS},
+                "encoding": {
+                    "x": {"field": "date", "type": "temporal", "title": "Date"},
+                    "y": {"field": "value", "type": "quantitative", "title": y_title},
+                },
+            },
+            {
+                "data": {"values": [row for row in rows if row["value"] > threshold]},
+                "mark": {"type": "point", "color": "red", "filled": True},
+                "encoding": {
+                    "x": {"field": "date", "type": "temporal"},
+                    "y": {"field": "value", "type": "quantitative"},
+                },
+            },
+            {
+                "data": {"values": [{"threshold": float(threshold)}]},
+                "mark": {"type": "rule", "color": "red", "strokeDash": [6, 4], "strokeWidth": 2},
+                "encoding": {"y": {"field": "threshold", "type": "quantitative"}},
+            },
+        ],
+    }
+
+
+def histogram_spec(values, threshold, variable, unit, title_suffix="", bins=HIST_BINS):
+    """Vega-Lite spec of the pre-binned distribution and threshold rule."""
+    counts, edges = histogram(values, bins)
+    rows = [{"start": float(lo), "end": float(hi), "count": int(c)} for lo, hi, c in zip(edges[:-1], edges[1:], counts)]
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": f"{variable} Distribution {title_suffix}".strip(),
+        "height": 320,
+        "layer": [
+            {
+                "data": {"values": rows},
+                "mark": {"type": "bar", "color": "skyblue", "stroke": "black", "opacity": 0.7},
+                "encoding": {
+                    "x": {"field": "start", "type": "quantitative", "bin": {"binned": True},
+                          "title": f"{variable} ({unit})"},
+                    "x2": {"field": "end"},
+                    "y": {"field": "count", "type": "quantitative", "title": "Frequency"},
+                },
+            },
+            {
+                "data": {"values": [{"threshold": float(threshold)}]},
+                "mark": {"type": "rule", "color": "red", "strokeDash": [6, 4], "strokeWidth": 2},
+                "encoding": {"x": {"field": "threshold", "type": "quantitative"}},
+            },
+        ],
+    }
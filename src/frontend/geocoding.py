@@ -0,0 +1,273 @@
+"""
+Place search for the location picker.
+
+Queries are normalized (case, accents, punctuation, spacing) and resolved in
+order from:
+
+1. a persistent SQLite cache of earlier answers,
+2. an optional local gazetteer (a GeoNames `cities*.txt` dump) held in a
+   sorted, bisect-searchable prefix index, which also drives autocomplete,
+3. the Google Geocoding API, called on a background thread with a timeout so
+   the Streamlit script never blocks on it for longer than `wait` seconds.
+
+Remote answers are written to the cache when they arrive, so a search that
+was still pending resolves instantly on the next rerun.
+"""
+import bisect
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+CACHE_PATH = DATA_DIR / "cache" / "geocode.sqlite"
+# Any GeoNames cities dump (cities500/1000/5000/15000.txt); override with GEONAMES_PATH
+GAZETTEER_PATH = DATA_DIR / "gazetteer" / "cities15000.txt"
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+REMOTE_TIMEOUT = 5.0
+NEGATIVE_TTL = 24 * 3600  # "not found" answers are retried after this many seconds
+
+
+def normalize_query(text):
+    """Canonical cache / index key: lowercase ASCII words separated by single spaces."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9,]+", " ", text.lower()).replace(",", " , ").split()).replace(" ,", ",")
+
+
+# --- Persistent cache ---
+class GeocodeCache:
+    """SQLite-backed map of normalized query -> place (or a remembered miss)."""
+
+    def __init__(self, path=None):
+        path = CACHE_PATH if path is None else path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "query TEXT PRIMARY KEY, name TEXT, lat REAL, lon REAL, source TEXT, created REAL)"
+            )
+
+    def get(self, key):
+        """Cached place dict for a normalized key, {} for a remembered miss, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, lat, lon, source, created FROM geocode WHERE query = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        name, lat, lon, source, created = row
+        if lat is None:
+            return {} if time.time() - created < NEGATIVE_TTL else None
+        return {"name": name, "lat": lat, "lon": lon, "source": source}
+
+    def put(self, key, place):
+        """Store a place dict for `key` (None records a miss)."""
+        place = place or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+                (key, place.get("name"), place.get("lat"), place.get("lon"), place.get("source"), time.time()),
+            )
+
+
+# --- Local gazetteer ---
+class Gazetteer:
+    """Prefix index over place names; exact and prefix lookups are two bisections."""
+
+    def __init__(self, places):
+        """
+        Args:
+            places: Iterable of (name, lat, lon, country_code, population, alternate_names)
+        """
+        self.places = []
+        keys = []
+        for name, lat, lon, country, population, alternates in places:
+            idx = len(self.places)
+            self.places.append({"name": name, "lat": lat, "lon": lon, "country": country,
+                                "population": population})
+            for alias in dict.fromkeys(normalize_query(n) for n in (name, *alternates)):
+                if alias:
+                    keys.append((alias, -population, idx))
+        keys.sort()
+        self._keys = [k for k, _, _ in keys]
+        self._entries = [(pop, idx) for _, pop, idx in keys]
+
+    @classmethod
+    def from_geonames(cls, path, alternates=False):
+        """Load a GeoNames cities dump (tab-separated, see download.geonames.org/export/dump).
+
+        Alternate names (translations, old names) make the index several times larger; off by default.
+        """
+        def rows():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    cols = line.rstrip("\n").split("\t")
+                    if len(cols) < 15:
+                        continue
+                    names = [cols[2]] + (cols[3].split(",") if alternates and cols[3] else [])
+                    yield cols[1], float(cols[4]), float(cols[5]), cols[8], int(cols[14] or 0), names
+        return cls(rows())
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_right(self._keys, prefix + "\x7f")
+        return lo, hi
+
+    def _place(self, idx):
+        place = self.places[idx]
+        label = f"{place['name']}, {place['country']}" if place["country"] else place["name"]
+        return {"name": label, "lat": place["lat"], "lon": place["lon"], "source": "gazetteer"}
+
+    def _split(self, query):
+        # "paris, fr" -> name "paris" restricted to country FR
+        key = normalize_query(query)
+        name, _, country = key.partition(",")
+        return name.strip(), country.strip().upper()
+
+    def lookup(self, query):
+        """Most populous place whose name (or alias) matches the query exactly, or None."""
+        name, country = self._split(query)
+        lo = bisect.bisect_left(self._keys, name)
+        hi = bisect.bisect_right(self._keys, name)
+        for _, idx in self._entries[lo:hi]:  # sorted by population, largest first
+            if not country or self.places[idx]["country"] == country:
+                return self._place(idx)
+        return None
+
+    def suggest(self, prefix, limit=8):
+        """Up to `limit` distinct places whose names start with `prefix`, most populous first."""
+        name, country = self._split(prefix)
+        if not name:
+            return []
+        lo, hi = self._range(name)
+        seen = {}
+        # A place can match under several aliases, so take some headroom before de-duplicating
+        for pop, idx in heapq.nsmallest(limit * 8, self._entries[lo:hi]):
+            if idx not in seen and (not country or self.places[idx]["country"] == country):
+                seen[idx] = None
+                if len(seen) >= limit:
+                    break
+        return [self._place(idx) for idx in seen]
+
+
+# --- Remote fallback ---
+def google_maps_api_key():
+    """Google API key from Streamlit secrets, falling back to GOOGLE_MAPS_API_KEY."""
+    try:
+        import streamlit as st
+        google = st.secrets["google"] if "google" in st.secrets else {}
+    except Exception:
+        google = {}
+    return google.get("maps_api_key") or os.environ.get("GOOGLE_MAPS_API_KEY")
+
+
+def geocode_google(query, api_key, timeout=REMOTE_TIMEOUT):
+    """Google Geocoding API lookup. Returns a place dict, or None when nothing matches."""
+    resp = requests.get(GOOGLE_GEOCODE_URL, params={"address": query, "key": api_key}, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    if data["status"] == "ZERO_RESULTS":
+        return None
+    if data["status"] != "OK":
+        raise RuntimeError(f"Geocoding API status {data['status']}")
+    result = data["results"][0]
+    loc = result["geometry"]["location"]
+    return {"name": result.get("formatted_address", query), "lat": loc["lat"], "lon": loc["lng"],
+            "source": "google"}
+
+
+class Geocoder:
+    """Cache -> gazetteer -> background remote lookup, with in-flight deduplication."""
+
+    def __init__(self, cache=None, gazetteer=None, remote=geocode_google, api_key=None, max_workers=2):
+        self.cache = cache
+        self.gazetteer = gazetteer
+        self.remote = remote
+        self.api_key = api_key
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geocode")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def suggest(self, prefix, limit=8):
+        return self.gazetteer.suggest(prefix, limit) if self.gazetteer is not None else []
+
+    def _remote_lookup(self, key, query):
+        try:
+            place = self.remote(query, self.api_key)
+            if self.cache is not None:
+                self.cache.put(key, place)
+            return place
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def geocode(self, query, wait=2.0):
+        """
+        Resolve a place name.
+        Args:
+            query: Free-text place name, optionally "name, country code"
+            wait: Seconds to wait for a remote lookup before returning 'pending'
+        Returns:
+            Tuple (status, place): status is 'found', 'not_found', 'pending' or 'error';
+            place is a dict with 'name', 'lat', 'lon', 'source' when found
+        """
+        key = normalize_query(query)
+        if not key:
+            return "not_found", None
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return ("found", cached) if cached else ("not_found", None)
+        if self.gazetteer is not None:
+            place = self.gazetteer.lookup(query)
+            if place is not None:
+                if self.cache is not None:
+                    self.cache.put(key, place)
+                return "found", place
+        if self.remote is None or not self.api_key:
+            return "not_found", None
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._executor.submit(self._remote_lookup, key, query)
+        try:
+            place = future.result(timeout=wait)
+        except FutureTimeoutError:
+            return "pending", None
+        except Exception as e:
+            logger.warning("Geocoding '%s' failed: %s", query, e)
+            return "error", None
+        return ("found", place) if place else ("not_found", None)
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    """Process-wide geocoder; the gazetteer is loaded once if the dump file exists."""
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            path = Path(os.environ.get("GEONAMES_PATH", GAZETTEER_PATH))
+            gazetteer = None
+            if path.exists():
+                start = time.perf_counter()
+                gazetteer = Gazetteer.from_geonames(path)
+                logger.info("Loaded %d gazetteer places from %s in %.2fs", len(gazetteer.places), path,
+                            time.perf_counter() - start)
+            _geocoder = Geocoder(GeocodeCache(), gazetteer, api_key=google_maps_api_key())
+        return _geocoder
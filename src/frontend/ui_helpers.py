@@ -1,6 +1,7 @@
 import streamlit as st
-import requests
+import streamlit.components.v1
 from datetime import datetime
+from frontend import geocoding
 
 def location_input():
     """
@@ -19,23 +20,25 @@ def location_input():
     if "lon" not in st.session_state:
         st.session_state.lon = -74.0060
 
-    # Place search
+    # Place search: cache and local gazetteer first, Google only as a background fallback
+    geocoder = geocoding.get_geocoder()
     place_name = st.sidebar.text_input("Search for a place (city, address, etc.)", "")
+    suggestions = geocoder.suggest(place_name) if len(place_name.strip()) >= 2 else []
+    choice = None
+    if suggestions:
+        labels = [p["name"] for p in suggestions]
+        choice = suggestions[labels.index(st.sidebar.selectbox("Matching places", labels))]
     if st.sidebar.button("Search") and place_name:
-        import os
-        api_key = st.secrets["google"].get("maps_api_key") if "google" in st.secrets and "maps_api_key" in st.secrets["google"] else os.environ.get("GOOGLE_MAPS_API_KEY")
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?address={place_name}&key={api_key}"
-        resp = requests.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data["status"] == "OK":
-                loc = data["results"][0]["geometry"]["location"]
-                st.session_state.lat = loc["lat"]
-                st.session_state.lon = loc["lng"]
-            else:
-                st.sidebar.error(f"No results found for '{place_name}'")
-        else:
+        status, place = ("found", choice) if choice else geocoder.geocode(place_name)
+        if status == "found":
+            st.session_state.lat = place["lat"]
+            st.session_state.lon = place["lon"]
+        elif status == "pending":
+            st.sidebar.info(f"Still looking up '{place_name}'; press Search again in a moment.")
+        elif status == "error":
             st.sidebar.error("Failed to contact Google Geocoding API")
+        else:
+            st.sidebar.error(f"No results found for '{place_name}'")
 
     # Manual lat/lon entry
     lat = st.sidebar.number_input(
@@ -60,7 +63,7 @@ def location_input():
 
     # Google Maps embed with marker at the selected location and zoomed in
     st.write("### 🌍 Selected Location")
-    api_key = st.secrets["google"].get("maps_api_key") if "google" in st.secrets and "maps_api_key" in st.secrets["google"] else os.environ.get("GOOGLE_MAPS_API_KEY")
+    api_key = geocoding.google_maps_api_key()
     map_url = (
         f"https://www.google.com/maps/embed/v1/place?key={api_key}"
         f"&q={lat},{lon}"
@@ -108,3 +111,32 @@ def threshold_input(variable_name, default_value):
         step=1.0,
     )
     return threshold
+
+
+def performance_panel(snapshot):
+    """
+    Shows per-stage timings, counters and cache statistics from telemetry.
+    Args:
+        snapshot: Dictionary from telemetry.main.METRICS.snapshot()
+    """
+    import pandas as pd
+    with st.expander("⏱️ Performance", expanded=True):
+        stages = snapshot["stages"]
+        if stages:
+            st.markdown("**Stage timings (this process)**")
+            df = pd.DataFrame.from_dict(stages, orient="index")[["count", "mean_ms", "p95_ms", "max_ms", "total_s"]]
+            st.dataframe(df.sort_values("total_s", ascending=False).round(3), use_container_width=True)
+        else:
+            st.caption("No timings recorded yet.")
+        counters = [
+            {"metric": name, "labels": labels, "value": value}
+            for name, series in snapshot["counters"].items()
+            for labels, value in series.items()
+        ]
+        if counters:
+            st.markdown("**Counters**")
+            st.dataframe(pd.DataFrame(counters), hide_index=True, use_container_width=True)
+        if snapshot["gauges"]:
+            st.markdown("**Cache statistics**")
+            gauges = pd.DataFrame(list(snapshot["gauges"].items()), columns=["metric", "value"])
+            st.dataframe(gauges, hide_index=True, use_container_width=True)
@@ -1,9 +1,10 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+from frontend import charts
+from telemetry.main import timed
 
-def plot_probability_trend(historical_data, threshold, analysis_result):
+@timed("plot_render", plot="trend")
+def plot_probability_trend(historical_data, threshold, analysis_result, mode="png"):
     """
     Plots the historical data trend with threshold line.
 
@@ -11,85 +12,93 @@ def plot_probability_trend(historical_data, threshold, analysis_result):
         historical_data: Dictionary with 'dates', 'values', 'variable', 'unit'
         threshold: Threshold value
         analysis_result: Dictionary with analysis results
+        mode: 'png' for a cached server-side image, 'vega' for a client-side Vega-Lite chart
     """
-    fig, ax = plt.subplots(figsize=(10, 5))
-
-    dates = historical_data['dates']
-    values = historical_data['values']
+    dates = np.asarray(historical_data['dates'], dtype="datetime64[D]")
+    values = np.asarray(historical_data['values'], dtype=float)
     variable = historical_data['variable']
     unit = historical_data['unit']
 
-    ax.plot(dates, values, marker='o', linestyle='-', linewidth=2, markersize=4, label='Historical Data')
-    ax.axhline(y=threshold, color='r', linestyle='--', linewidth=2, label=f'Threshold ({threshold} {unit})')
-
-    exceeding_indices = [i for i, v in enumerate(values) if v is not None and v > threshold]
-    if exceeding_indices:
-        exceeding_dates = [dates[i] for i in exceeding_indices]
-        exceeding_values = [values[i] for i in exceeding_indices]
-        ax.scatter(exceeding_dates, exceeding_values, color='red', s=50, zorder=5, label='Exceeds Threshold')
-
-    ax.set_xlabel('Date', fontsize=12, fontweight='bold')
-    ax.set_ylabel(f'{variable} ({unit})', fontsize=12, fontweight='bold')
-    ax.set_title(f'{variable} Historical Trend', fontsize=14, fontweight='bold')
-    ax.legend(loc='best')
-    ax.grid(True, alpha=0.3)
-
-    plt.xticks(rotation=45, ha='right')
-
-    date_step = max(1, len(dates) // 6)
-    ax.set_xticks(range(0, len(dates), date_step))
-    ax.set_xticklabels([dates[i] for i in range(0, len(dates), date_step)])
-
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    key = ("trend", mode, charts.data_hash(dates, values), float(threshold), variable, unit)
+    if mode == "vega":
+        spec = charts.cached_chart(key, lambda: charts.trend_spec(dates, values, threshold, variable, unit))
+        st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        png = charts.cached_chart(key, lambda: charts.trend_png(dates, values, threshold, variable, unit))
+        st.image(png, use_column_width=True)
 
-def plot_histogram(historical_data, threshold):
+@timed("plot_render", plot="histogram")
+def plot_histogram(historical_data, threshold, mode="png"):
     """
     Plots a histogram of the historical data with threshold line.
 
     Args:
         historical_data: Dictionary with 'values', 'variable', 'unit'
         threshold: Threshold value
+        mode: 'png' for a cached server-side image, 'vega' for a client-side Vega-Lite chart
     """
-    import datetime
-    values = historical_data['values']
+    values = np.asarray(historical_data['values'], dtype=float)
     variable = historical_data['variable']
     unit = historical_data['unit']
     dates = historical_data.get('dates', [])
 
     # Determine if this is a future date (prediction)
-    is_future = False
-    if dates:
-        try:
-            last_date = datetime.datetime.strptime(dates[-1], "%Y-%m-%d")
-            is_future = last_date > datetime.datetime.now()
-        except Exception:
-            pass
+    is_future = len(dates) > 0 and np.datetime64(dates[-1], "D") > np.datetime64("today", "D")
 
     # For future dates, use only the last 10 years of data
     if is_future:
-        values_to_plot = [v for v in values[-10:] if v is not None and not np.isnan(v)]
+        values = values[-10:]
         hist_label = "(last 10 years used for prediction)"
     else:
-        values_to_plot = [v for v in values if v is not None and not np.isnan(v)]
         hist_label = ""
 
-    if not values_to_plot:
+    if np.all(np.isnan(values)):
         st.warning(f"No data available to plot histogram for {variable}.")
         return
 
-    fig, ax = plt.subplots(figsize=(8, 5))
-    ax.hist(values_to_plot, bins=10, color='skyblue', edgecolor='black', alpha=0.7)
-    ax.axvline(x=threshold, color='r', linestyle='--', linewidth=2, label=f'Threshold ({threshold} {unit})')
-    ax.set_xlabel(f'{variable} ({unit})', fontsize=12, fontweight='bold')
-    ax.set_ylabel('Frequency', fontsize=12, fontweight='bold')
-    ax.set_title(f'{variable} Distribution {hist_label}', fontsize=14, fontweight='bold')
-    ax.legend(loc='best')
-    ax.grid(True, alpha=0.3, axis='y')
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    key = ("histogram", mode, charts.data_hash(values), float(threshold), variable, unit, hist_label)
+    if mode == "vega":
+        spec = charts.cached_chart(key, lambda: charts.histogram_spec(values, threshold, variable, unit, hist_label))
+        st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        png = charts.cached_chart(key, lambda: charts.histogram_png(values, threshold, variable, unit, hist_label))
+        st.image(png, use_column_width=True)
+
+GRID_FIELDS = {
+    'probability': ("Exceedance probability (%)", 0.0, 100.0),
+    'risk_index': ("Risk index", 0.0, 1.0),
+}
+
+@timed("plot_render", plot="risk_grid")
+def plot_risk_grid(grid, analysis, field="probability", opacity=0.65):
+    """
+    Displays a gridded analysis as a heatmap layer on an interactive map.
+
+    Args:
+        grid: RegionalGrid the analysis was computed from (for its bounds)
+        analysis: Result of modeling.main.analyze_grid
+        field: 'probability' or 'risk_index'
+        opacity: Opacity of the heatmap layer
+    """
+    import folium
+    from branca.colormap import LinearColormap
+    from matplotlib import colormaps
+
+    caption, vmin, vmax = GRID_FIELDS[field]
+    (south, west), (north, east) = grid.bounds
+    bounds = [[south, west], [north, east]]
+    fmap = folium.Map(location=[(south + north) / 2, (west + east) / 2], tiles="OpenStreetMap")
+    fmap.fit_bounds(bounds)
+    folium.raster_layers.ImageOverlay(
+        image=charts.grid_image(analysis[field], vmin, vmax), bounds=bounds, opacity=opacity,
+        name=f"{grid.variable} {caption.lower()}",
+    ).add_to(fmap)
+    folium.Rectangle(bounds, color="#333333", weight=1, fill=False).add_to(fmap)
+    cmap = colormaps["YlOrRd"]
+    LinearColormap([cmap(x) for x in np.linspace(0, 1, 9)], vmin=vmin, vmax=vmax, caption=caption).add_to(fmap)
+    folium.LayerControl().add_to(fmap)
+    # Static HTML (no round trip to Python on pan/zoom), like the location map
+    st.components.v1.html(fmap.get_root().render(), height=450)
 
 def plot_map(location):
     """
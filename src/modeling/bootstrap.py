@@ -0,0 +1,124 @@
+"""
+Bootstrap confidence intervals for exceedance probability and risk index.
+
+Resamples are drawn and fitted in vectorized blocks (one batched GEV fit per
+block). Blocks run on one process pool shared by every caller in the process
+(see process_pool), each with its own RNG stream spawned from a single seed, so
+results are reproducible regardless of how many workers ran them. Small jobs
+stay in-process, where pool overhead would dominate.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+import numpy as np
+from modeling.gev import fit_gev_batch, gev_sf
+
+DEFAULT_RESAMPLES = 1000
+DEFAULT_CONFIDENCE = 0.9
+BLOCK_SIZE = 250
+# MLE fits are iterative, so they use small blocks to honour the time budget closely.
+MLE_BLOCK_SIZE = 20
+# Below this many resampled values (resamples x series length) L-moments blocks run in-process.
+MIN_PARALLEL_WORK = 500_000
+
+POOL_WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool():
+    """The process-wide pool for model fits, with POOL_WORKERS processes; created once, on first use.
+
+    Callers share it and bound their own parallelism, so no caller ever replaces or shuts down the pool
+    under another's futures. Workers are spawned rather than forked, since the engine's event-loop
+    thread may hold locks at the moment the pool starts.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _bootstrap_block(values, threshold, n_resamples, seed, method):
+    """Probability (0-100) and risk index for `n_resamples` resamples of `values`."""
+    rng = np.random.default_rng(seed)
+    samples = values[rng.integers(0, len(values), size=(n_resamples, len(values)))]
+    c, loc, scale = fit_gev_batch(samples, method)
+    fitted = np.isfinite(scale)
+    prob = np.where(fitted, gev_sf(threshold, c, loc, scale), (samples > threshold).mean(axis=1))
+    probability = np.clip(prob * 100, 0, 100)
+    # Same risk index as analyze_variable: loc normalized by the 5th-95th percentile range
+    loc = np.where(fitted, loc, samples.mean(axis=1))
+    loc_min, loc_max = np.percentile(samples, [5, 95], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risk = np.where(loc_max > loc_min, np.clip((loc - loc_min) / (loc_max - loc_min), 0, 1), probability / 100)
+    return probability, risk
+
+
+def bootstrap_ci(values, threshold, n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0,
+                 workers=None, time_budget=None, method="lmoments"):
+    """
+    Percentile bootstrap intervals for the exceedance probability and risk index.
+    Args:
+        values: Series of data points (NaNs are dropped)
+        threshold: The threshold value to compare against
+        n_resamples: Number of bootstrap resamples
+        confidence: Interval coverage, e.g. 0.9 for a 90% interval
+        seed: Seed for the per-block RNG streams
+        workers: Blocks run at once on the shared pool (None for all its processes, 1 to stay in-process)
+        time_budget: Seconds to spend; blocks not finished by then are dropped
+        method: GEV fit method, as for analyze_variable
+    Returns:
+        Dictionary containing 'probability_ci' and 'risk_index_ci' (low, high) tuples and
+        'resamples', the number of resamples that finished within the budget
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) < 3 or n_resamples <= 0:
+        return {'probability_ci': (np.nan, np.nan), 'risk_index_ci': (np.nan, np.nan), 'resamples': 0}
+    block = BLOCK_SIZE if method == "lmoments" else MLE_BLOCK_SIZE
+    sizes = [min(block, n_resamples - start) for start in range(0, n_resamples, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    workers = workers or POOL_WORKERS
+    results = []
+
+    if workers == 1 or (method == "lmoments" and n_resamples * len(values) < MIN_PARALLEL_WORK):
+        for size, block_seed in zip(sizes, seeds):
+            if deadline is not None and results and time.monotonic() > deadline:
+                break
+            results.append(_bootstrap_block(values, threshold, size, block_seed, method))
+    else:
+        pool = process_pool()
+        blocks = list(zip(sizes, seeds))
+        pending = set()
+        while blocks or pending:
+            # Keep at most `workers` blocks queued, so concurrent callers share the pool
+            while blocks and len(pending) < workers:
+                size, block_seed = blocks.pop(0)
+                pending.add(pool.submit(_bootstrap_block, values, threshold, size, block_seed, method))
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            results.extend(f.result() for f in done)
+            if deadline is not None and time.monotonic() >= deadline:
+                for future in pending:
+                    future.cancel()
+                break
+
+    if not results:
+        return {'probability_ci': (np.nan, np.nan), 'risk_index_ci': (np.nan, np.nan), 'resamples': 0}
+    probability = np.concatenate([p for p, _ in results])
+    risk = np.concatenate([r for _, r in results])
+    tail = (1 - confidence) / 2 * 100
+    prob_lo, prob_hi = np.percentile(probability, [tail, 100 - tail])
+    risk_lo, risk_hi = np.percentile(risk, [tail, 100 - tail])
+    return {
+        'probability_ci': (round(float(prob_lo), 2), round(float(prob_hi), 2)),
+        'risk_index_ci': (round(float(risk_lo), 3), round(float(risk_hi), 3)),
+        'resamples': int(len(probability)),
+    }
@@ -0,0 +1,139 @@
+"""
+GEV fitting engine.
+
+The fast path is the closed-form L-moments estimator (Hosking, Wallis & Wood,
+1985): three probability-weighted moments and a rational approximation for the
+shape, no iteration. Maximum likelihood is still available and can be
+warm-started from the L-moments fit. Every estimator also works on many series
+at once, stacked as rows of a 2-D array (NaN marks missing values).
+
+Parameters follow scipy.stats.genextreme: shape `c`, `loc`, `scale`.
+"""
+import numpy as np
+
+EULER_GAMMA = 0.5772156649015329
+_SMALL_SHAPE = 1e-6
+METHODS = ("lmoments", "mle", "mle_cold")
+
+
+# --- L-moments ---
+def sample_lmoments(data):
+    """First two sample L-moments and the L-skewness of each row, ignoring NaNs.
+
+    Args:
+        data: 1-D series or 2-D array with one series per row
+    Returns:
+        Tuple of arrays (l1, l2, t3), one entry per row (NaN for rows with < 3 values)
+    """
+    x = np.sort(np.atleast_2d(np.asarray(data, dtype=float)), axis=1)  # NaNs sort last
+    n = np.sum(~np.isnan(x), axis=1).astype(float)[:, None]
+    j = np.arange(x.shape[1], dtype=float)[None, :]
+    xz = np.where(j < n, x, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b0 = xz.sum(axis=1) / n[:, 0]
+        b1 = (xz * j / (n - 1)).sum(axis=1) / n[:, 0]
+        b2 = (xz * j * (j - 1) / ((n - 1) * (n - 2))).sum(axis=1) / n[:, 0]
+        l1 = b0
+        l2 = 2 * b1 - b0
+        t3 = (6 * b2 - 6 * b1 + b0) / l2
+    too_short = n[:, 0] < 3
+    l1[too_short] = l2[too_short] = t3[too_short] = np.nan
+    return l1, l2, t3
+
+
+def fit_lmoments_batch(data):
+    """L-moments GEV fit of every row of `data`. Returns arrays (c, loc, scale).
+
+    Rows with fewer than three values or no spread get NaN parameters.
+    """
+    from scipy.special import gamma
+
+    l1, l2, t3 = sample_lmoments(data)
+    z = 2.0 / (3.0 + t3) - np.log(2) / np.log(3)
+    c = 7.8590 * z + 2.9554 * z ** 2
+    small = np.abs(c) < _SMALL_SHAPE
+    safe_c = np.where(small, 1.0, c)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        g = gamma(1 + safe_c)
+        scale = np.where(small, l2 / np.log(2), l2 * safe_c / ((1 - 2.0 ** -safe_c) * g))
+        loc = np.where(small, l1 - EULER_GAMMA * scale, l1 - scale * (1 - g) / safe_c)
+    bad = ~(l2 > 1e-10 * np.maximum(1.0, np.abs(l1))) | ~(scale > 0) | ~np.isfinite(loc)
+    c, loc, scale = (np.where(bad, np.nan, a) for a in (c, loc, scale))
+    return c, loc, scale
+
+
+def fit_lmoments(values):
+    """L-moments GEV fit of one series. Returns (c, loc, scale) floats."""
+    c, loc, scale = fit_lmoments_batch(np.asarray(values, dtype=float)[None, :])
+    return float(c[0]), float(loc[0]), float(scale[0])
+
+
+# --- Maximum likelihood ---
+def fit_mle(values, warm_start=True):
+    """Maximum-likelihood GEV fit, optionally starting the optimizer from the L-moments fit."""
+    from scipy.stats import genextreme  # scipy.stats takes about a second to import; MLE is opt-in
+
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if warm_start:
+        c0, loc0, scale0 = fit_lmoments(values)
+        if np.isfinite(c0):
+            return tuple(float(p) for p in genextreme.fit(values, c0, loc=loc0, scale=scale0))
+    return tuple(float(p) for p in genextreme.fit(values))
+
+
+def fit_mle_batch(data, warm_start=True):
+    """Row-by-row MLE fit of a 2-D array. Returns arrays (c, loc, scale)."""
+    data = np.atleast_2d(data)
+    params = np.full((data.shape[0], 3), np.nan)
+    for i, row in enumerate(data):
+        if np.sum(~np.isnan(row)) >= 3:
+            params[i] = fit_mle(row, warm_start)
+    return params[:, 0], params[:, 1], params[:, 2]
+
+
+def fit_gev(values, method="lmoments"):
+    """Fit one series with `method` ('lmoments', 'mle' warm-started, or 'mle_cold')."""
+    if method == "lmoments":
+        return fit_lmoments(values)
+    if method in ("mle", "mle_cold"):
+        return fit_mle(values, warm_start=(method == "mle"))
+    raise ValueError(f"Unknown GEV fit method '{method}'. Expected one of {METHODS}.")
+
+
+def fit_gev_batch(data, method="lmoments"):
+    """Fit every row of a 2-D array with `method`. Returns arrays (c, loc, scale)."""
+    if method == "lmoments":
+        return fit_lmoments_batch(data)
+    if method in ("mle", "mle_cold"):
+        return fit_mle_batch(data, warm_start=(method == "mle"))
+    raise ValueError(f"Unknown GEV fit method '{method}'. Expected one of {METHODS}.")
+
+
+# --- Distribution functions (vectorized over parameters and thresholds) ---
+def gev_cdf(x, c, loc, scale):
+    """Same as scipy.stats.genextreme.cdf, broadcasting over all arguments."""
+    x, c, loc, scale = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (x, c, loc, scale)))
+    y = (x - loc) / scale
+    small = np.abs(c) < _SMALL_SHAPE
+    safe_c = np.where(small, 1.0, c)
+    arg = 1 - safe_c * y
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        t = np.where(arg > 0, np.abs(arg) ** (1 / safe_c), np.where(safe_c > 0, 0.0, np.inf))
+        t = np.where(small, np.exp(-y), t)
+        return np.exp(-t)
+
+
+def gev_sf(x, c, loc, scale):
+    """Exceedance probability P(X > x)."""
+    return 1 - gev_cdf(x, c, loc, scale)
+
+
+def gev_return_level(period, c, loc, scale):
+    """Level exceeded on average once every `period` samples (the 1 - 1/period quantile)."""
+    period, c, loc, scale = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (period, c, loc, scale)))
+    y = -np.log1p(-1 / period)
+    small = np.abs(c) < _SMALL_SHAPE
+    safe_c = np.where(small, 1.0, c)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(small, loc - scale * np.log(y), loc + scale * (1 - y ** safe_c) / safe_c)
@@ -1,13 +1,64 @@
 # --- Real Statistical Modeling ---
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+from itertools import repeat
+
 import numpy as np
-from scipy.stats import genextreme
+from modeling.bootstrap import DEFAULT_CONFIDENCE, bootstrap_ci, process_pool
+from modeling.gev import fit_gev, fit_gev_batch, gev_return_level, gev_sf
+from telemetry.main import METRICS, timed
+
+RETURN_PERIODS = (2, 5, 10, 25, 50, 100)
+DEFAULT_THRESHOLDS = {
+    'Temperature': 25.0,
+    'Precipitation': 60.0,
+    'Wind Speed': 20.0,
+    'Humidity': 70.0,
+}
+DEFAULT_THRESHOLD = 50.0
+
+# --- Fit memoization ---
+# Fits do not depend on the threshold, so they are cached on a hash of the series contents.
+FIT_CACHE_SIZE = 4096
+_fit_cache = OrderedDict()
+_fit_cache_lock = threading.Lock()
+
+def _clean_values(historical_data):
+    values = np.asarray(historical_data['values'], dtype=float)
+    return values[~np.isnan(values)]  # Remove NaNs
 
-def analyze_variable(historical_data, threshold):
+def fit_params(values, method="lmoments"):
+    """GEV parameters (c, loc, scale) for a cleaned series, memoized on its contents."""
+    values = np.ascontiguousarray(values, dtype=float)
+    key = (hashlib.blake2b(values.tobytes(), digest_size=16).digest(), method)
+    with _fit_cache_lock:
+        params = _fit_cache.get(key)
+        if params is not None:
+            _fit_cache.move_to_end(key)
+            METRICS.inc("fit_cache_total", result="hit")
+            return params
+    METRICS.inc("fit_cache_total", result="miss")
+    with timed("gev_fit", method=method):
+        params = fit_gev(values, method)
+    with _fit_cache_lock:
+        _fit_cache[key] = params
+        while len(_fit_cache) > FIT_CACHE_SIZE:
+            _fit_cache.popitem(last=False)
+    return params
+
+def analyze_variable(historical_data, threshold, method="lmoments", bootstrap=0,
+                     confidence=DEFAULT_CONFIDENCE, time_budget=None):
     """
     Fits a General Extreme Value (GEV) distribution to the data and calculates exceedance probability and risk index.
     Args:
         historical_data: Dictionary containing 'values' key with list of data points
         threshold: The threshold value to compare against
+        method: GEV fit method: 'lmoments' (closed form, default), 'mle' (warm-started) or 'mle_cold'
+        bootstrap: Number of bootstrap resamples for confidence intervals (0 to skip)
+        confidence: Coverage of the bootstrap intervals
+        time_budget: Seconds the bootstrap may spend before returning with fewer resamples
     Returns:
         Dictionary containing:
             - probability: Float (0-100) representing probability of exceeding threshold
@@ -16,11 +67,12 @@ def analyze_variable(historical_data, threshold):
             - std: Standard deviation of historical data
             - max: Maximum value in historical data
             - min: Minimum value in historical data
+            - probability_ci, risk_index_ci: (low, high) bootstrap intervals, when bootstrap > 0
+              ((nan, nan) without data)
     """
-    values = np.array(historical_data['values'], dtype=float)
-    values = values[~np.isnan(values)]  # Remove NaNs
+    values = _clean_values(historical_data)
     if len(values) == 0:
-        return {
+        result = {
             'probability': 0.0,
             'risk_index': 0.0,
             'mean': float('nan'),
@@ -28,11 +80,17 @@ def analyze_variable(historical_data, threshold):
             'max': float('nan'),
             'min': float('nan')
         }
+        if bootstrap:
+            result['probability_ci'] = result['risk_index_ci'] = (float('nan'), float('nan'))
+        return result
 
-    # Fit GEV distribution
-    c, loc, scale = genextreme.fit(values)
-    gev_dist = genextreme(c, loc=loc, scale=scale)
-    prob = 1 - gev_dist.cdf(threshold)
+    # Fit GEV distribution; fall back to the empirical exceedance rate if the fit is degenerate
+    c, loc, scale = fit_params(values, method)
+    if np.isfinite(scale):
+        prob = float(gev_sf(threshold, c, loc, scale))
+    else:
+        prob = float(np.mean(values > threshold))
+        loc = float(np.mean(values))
     probability = float(np.clip(prob * 100, 0, 100))
 
     # Risk index: normalized location parameter (loc)
@@ -43,7 +101,7 @@ def analyze_variable(historical_data, threshold):
     else:
         risk_index = float(probability / 100)
 
-    return {
+    result = {
         'probability': round(probability, 2),
         'risk_index': round(risk_index, 3),
         'mean': round(np.mean(values), 2),
@@ -51,3 +109,116 @@ def analyze_variable(historical_data, threshold):
         'max': round(np.max(values), 2),
         'min': round(np.min(values), 2)
     }
+    if bootstrap:
+        with timed("bootstrap", method=method):
+            ci = bootstrap_ci(values, threshold, bootstrap, confidence, time_budget=time_budget, method=method)
+        result['probability_ci'] = ci['probability_ci']
+        result['risk_index_ci'] = ci['risk_index_ci']
+    return result
+
+def threshold_sweep(historical_data, thresholds, return_periods=RETURN_PERIODS, method="lmoments"):
+    """
+    Evaluates the fitted GEV for a whole array of thresholds in one vectorized call.
+    Args:
+        historical_data: Dictionary containing 'values' key with list of data points
+        thresholds: Array of threshold values
+        return_periods: Return periods (in samples, i.e. years for annual data) to compute levels for
+        method: GEV fit method, as for analyze_variable
+    Returns:
+        Dictionary containing:
+            - thresholds: The thresholds as a float array
+            - probability: Array (0-100) of exceedance probabilities per threshold
+            - return_period: Array of expected years between exceedances (inf if never exceeded)
+            - return_periods / return_levels: Levels exceeded on average once per return period
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    periods = np.asarray(return_periods, dtype=float)
+    values = _clean_values(historical_data)
+    c, loc, scale = fit_params(values, method) if len(values) else (np.nan, np.nan, np.nan)
+    if np.isfinite(scale):
+        prob = gev_sf(thresholds, c, loc, scale)
+        levels = gev_return_level(periods, c, loc, scale)
+    elif len(values):
+        prob = np.mean(values[None, :] > thresholds.reshape(-1, 1), axis=1).reshape(thresholds.shape)
+        levels = np.quantile(values, 1 - 1 / periods)
+    else:
+        prob = np.zeros(thresholds.shape)
+        levels = np.full(periods.shape, np.nan)
+    prob = np.clip(prob, 0, 1)
+    with np.errstate(divide="ignore"):
+        period = 1 / prob
+    return {
+        'thresholds': thresholds,
+        'probability': prob * 100,
+        'return_period': period,
+        'return_periods': periods,
+        'return_levels': levels,
+    }
+
+# --- Gridded analysis ---
+# Cells per process-pool task for iterative (MLE) grid fits; L-moments fits run in one vectorized call.
+GRID_CHUNK_SIZE = 64
+
+def _fit_cells(rows, method, workers):
+    if method == "lmoments" or workers == 1 or len(rows) <= GRID_CHUNK_SIZE:
+        return fit_gev_batch(rows, method)
+    chunks = [rows[i:i + GRID_CHUNK_SIZE] for i in range(0, len(rows), GRID_CHUNK_SIZE)]
+    parts = list(process_pool().map(fit_gev_batch, chunks, repeat(method)))
+    return tuple(np.concatenate([part[k] for part in parts]) for k in range(3))
+
+def _row_percentiles(rows, q):
+    """Linear-interpolated percentiles `q` (0-100) of each row, ignoring NaNs (np.nanpercentile loops over rows)."""
+    ordered = np.sort(rows, axis=1)  # NaNs sort last
+    n = np.sum(~np.isnan(rows), axis=1)
+    pos = np.asarray(q, dtype=float)[:, None] / 100 * np.maximum(n - 1, 0)[None, :]
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0)[None, :])
+    below = np.take_along_axis(ordered, lo.T, axis=1).T
+    above = np.take_along_axis(ordered, hi.T, axis=1).T
+    result = below + (above - below) * (pos - lo)
+    result[:, n == 0] = np.nan
+    return result
+
+def analyze_grid(values, threshold, method="lmoments", workers=None):
+    """
+    analyze_variable for every cell of a gridded series at once.
+    Args:
+        values: Array (time, lat, lon) of samples per cell; NaN marks missing values
+        threshold: The threshold value to compare against
+        method: GEV fit method, as for analyze_variable; 'lmoments' fits all cells in one vectorized call,
+            'mle' fits chunks of cells on the shared process pool
+        workers: 1 to fit in-process; otherwise MLE fits run on the shared process pool (see process_pool)
+    Returns:
+        Dictionary of (lat, lon) arrays:
+            - probability: Exceedance probability (0-100), NaN for cells without data
+            - risk_index: Normalized risk score (0-1), NaN for cells without data
+            - mean, std: Of each cell's samples
+            - years: Number of samples per cell
+    """
+    values = np.asarray(values, dtype=float)
+    shape = values.shape[1:]
+    rows = values.reshape(values.shape[0], -1).T  # one row per cell
+    with timed("grid_fit", method=method):
+        c, loc, scale = _fit_cells(rows, method, workers)
+    years = np.sum(~np.isnan(rows), axis=1)
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN cells
+        mean = np.nanmean(rows, axis=1)
+        std = np.nanstd(rows, axis=1)
+        loc_min, loc_max = _row_percentiles(rows, [5, 95])
+        # Same fallbacks as analyze_variable: empirical exceedance rate and mean for degenerate fits
+        fitted = np.isfinite(scale)
+        prob = np.where(fitted, gev_sf(threshold, c, loc, scale), np.sum(rows > threshold, axis=1) / years)
+        probability = np.clip(prob * 100, 0, 100)
+        loc = np.where(fitted, loc, mean)
+        risk_index = np.where(loc_max > loc_min, np.clip((loc - loc_min) / (loc_max - loc_min), 0, 1),
+                              probability / 100)
+    empty = years == 0
+    probability[empty] = risk_index[empty] = np.nan
+    return {
+        'probability': probability.reshape(shape),
+        'risk_index': risk_index.reshape(shape),
+        'mean': mean.reshape(shape),
+        'std': std.reshape(shape),
+        'years': years.reshape(shape),
+    }
@@ -0,0 +1,243 @@
+"""
+Headless batch pipeline for offline risk runs.
+
+Reads a sites file (CSV or Parquet with `lat`, `lon` and optionally `date` and
+`site_id` columns), fetches every site through the bulk data engine, fits the
+risk model on a process pool and streams the results into numbered Parquet part
+files. Each part holds complete sites and is written atomically, so a run that
+is interrupted can be restarted with the same arguments and skips every site
+already present in the output directory.
+
+    python src/pipeline/main.py sites.csv results/ --date 2024-07-01 --variables Temperature Precipitation
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data_engine.bulk import DEFAULT_CHUNK_SIZE, DEFAULT_CONCURRENCY, DEFAULT_RATE, iter_bulk_variables  # noqa: E402
+from data_engine.main import VARIABLE_MAP  # noqa: E402
+from modeling.main import DEFAULT_THRESHOLD, DEFAULT_THRESHOLDS, analyze_variable, threshold_sweep  # noqa: E402
+
+DEFAULT_BATCH_SIZE = 500  # sites per output part file
+
+logger = logging.getLogger(__name__)
+
+RESULT_SCHEMA = pa.schema([
+    ("site_id", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("date", pa.string()),
+    ("variable", pa.string()),
+    ("unit", pa.string()),
+    ("source", pa.string()),
+    ("years", pa.int32()),
+    ("threshold", pa.float64()),
+    ("probability", pa.float64()),
+    ("risk_index", pa.float64()),
+    ("return_period", pa.float64()),
+    ("mean", pa.float64()),
+    ("std", pa.float64()),
+    ("min", pa.float64()),
+    ("max", pa.float64()),
+    ("message", pa.string()),
+])
+
+
+# --- Input ---
+def read_sites(path, date=None):
+    """
+    Load a sites file into a DataFrame with site_id, lat, lon and date columns.
+    Args:
+        path: CSV or Parquet file with 'lat' and 'lon' columns, and optionally 'date' and 'site_id'
+        date: Analysis date ('YYYY-MM-DD') for sites without a 'date' column or value
+    Returns:
+        DataFrame in file order; site_id defaults to the row number
+    """
+    path = Path(path)
+    sites = pd.read_parquet(path) if path.suffix.lower() in (".parquet", ".pq") else pd.read_csv(path)
+    missing = {"lat", "lon"} - set(sites.columns)
+    if missing:
+        raise ValueError(f"Sites file {path} is missing column(s): {', '.join(sorted(missing))}")
+    if "site_id" not in sites.columns:
+        sites["site_id"] = np.arange(len(sites))
+    if "date" not in sites.columns:
+        sites["date"] = None
+    sites["date"] = pd.to_datetime(sites["date"].fillna(date)).dt.strftime("%Y-%m-%d")
+    if sites["date"].isna().any():
+        raise ValueError("Some sites have no date; pass --date or add a 'date' column.")
+    sites = sites.astype({"site_id": str, "lat": float, "lon": float})
+    return sites[["site_id", "lat", "lon", "date"]].reset_index(drop=True)
+
+
+# --- Checkpointing ---
+def completed_sites(output_dir):
+    """(site_id, date) pairs already written to part files in `output_dir`."""
+    done = set()
+    for part in sorted(Path(output_dir).glob("part-*.parquet")):
+        table = pq.read_table(part, columns=["site_id", "date"])
+        done.update(zip(table.column("site_id").to_pylist(), table.column("date").to_pylist()))
+    return done
+
+
+def write_part(output_dir, rows):
+    """Atomically write `rows` as the next numbered part file. Returns its path."""
+    output_dir = Path(output_dir)
+    numbers = [int(p.stem.split("-")[1]) for p in output_dir.glob("part-*.parquet")]
+    path = output_dir / f"part-{max(numbers, default=-1) + 1:05d}.parquet"
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(pa.Table.from_pylist(rows, schema=RESULT_SCHEMA), tmp)
+    os.replace(tmp, path)
+    return path
+
+
+# --- Fitting ---
+def analyze_sites(records, thresholds):
+    """
+    Fit the risk model for a batch of fetched sites (runs in a worker process).
+    Args:
+        records: List of (site_id, lat, lon, date, {variable: historical_data})
+        thresholds: Mapping of variable name to exceedance threshold
+    Returns:
+        List of result rows matching RESULT_SCHEMA
+    """
+    rows = []
+    for site_id, lat, lon, date, results in records:
+        for variable, data in results.items():
+            threshold = thresholds.get(variable, DEFAULT_THRESHOLD)
+            row = {"site_id": site_id, "lat": lat, "lon": lon, "date": date, "variable": variable,
+                   "unit": data.get("unit"), "source": data["source"], "years": 0, "threshold": threshold,
+                   "message": data.get("message")}
+            values = np.asarray(data["values"], dtype=float)
+            if np.any(~np.isnan(values)):
+                analysis = analyze_variable(data, threshold)
+                row.update({key: analysis[key] for key in ("probability", "risk_index", "mean", "std", "min", "max")})
+                row["years"] = int(np.sum(~np.isnan(values)))
+                row["return_period"] = float(threshold_sweep(data, [threshold])["return_period"][0])
+            rows.append(row)
+    return rows
+
+
+# --- Pipeline ---
+async def run_pipeline(sites, variables, output_dir, thresholds=None, batch_size=DEFAULT_BATCH_SIZE,
+                       workers=None, chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                       rate=DEFAULT_RATE):
+    """
+    Fetch, fit and write every (site, date) not already present in `output_dir`.
+    Args:
+        sites: DataFrame from read_sites
+        variables: Variable names to analyze for every site
+        output_dir: Directory for the part files (created if needed)
+        thresholds: Mapping of variable name to threshold (defaults to DEFAULT_THRESHOLDS)
+        batch_size: Sites per part file
+        workers: Fitting processes (None for all cores, 1 to fit in-process)
+        chunk_size, concurrency, rate: Passed to iter_bulk_variables
+    Returns:
+        Dictionary with 'sites' processed, 'skipped' (already done) and 'parts' written
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    done = completed_sites(output_dir)
+    # A site may be listed for several dates, so resume on the pair
+    pending = np.array([pair not in done for pair in zip(sites["site_id"], sites["date"])], dtype=bool)
+    todo = sites[pending]
+    stats = {"sites": 0, "skipped": len(sites) - len(todo), "parts": 0}
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    loop = asyncio.get_running_loop()
+    write_lock = asyncio.Lock()
+    in_flight = asyncio.Semaphore(2)
+    writes = []
+
+    async def flush(records):
+        # Fitting runs off the event loop, so fetching the next batch carries on meanwhile
+        try:
+            slices = [records[k::workers] for k in range(min(workers, len(records)))]
+            parts = await asyncio.gather(*(loop.run_in_executor(pool, analyze_sites, part, thresholds)
+                                           for part in slices))
+            # Part numbers are picked at write time, so writes must not overlap
+            async with write_lock:
+                await asyncio.to_thread(write_part, output_dir, [row for part in parts for row in part])
+        finally:
+            in_flight.release()
+        stats["sites"] += len(records)
+        stats["parts"] += 1
+        logger.info("Wrote %d site(s); %d/%d done.", len(records), stats["sites"], len(todo))
+
+    async def submit(records):
+        # At most two batches wait on the fitting pool; the fetch pauses behind them
+        await in_flight.acquire()
+        writes.append(asyncio.create_task(flush(records)))
+
+    try:
+        for date, group in todo.groupby("date", sort=False):
+            group = group.reset_index(drop=True)
+            records = []
+            async for i, results in iter_bulk_variables(
+                group[["lat", "lon"]].to_numpy(), variables, date,
+                chunk_size=chunk_size, concurrency=concurrency, rate=rate,
+            ):
+                site = group.iloc[i]
+                records.append((site["site_id"], float(site["lat"]), float(site["lon"]), date, results))
+                if len(records) >= batch_size:
+                    await submit(records)
+                    records = []
+            if records:
+                await submit(records)
+        await asyncio.gather(*writes)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return stats
+
+
+def _parse_thresholds(items):
+    thresholds = {}
+    for item in items or []:
+        name, _, value = item.rpartition("=")
+        if not name:
+            raise argparse.ArgumentTypeError(f"Expected VARIABLE=VALUE, got '{item}'")
+        thresholds[name] = float(value)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the risk analysis for a file of sites without the UI.")
+    parser.add_argument("sites", help="CSV or Parquet file with lat, lon and optional date / site_id columns")
+    parser.add_argument("output", help="Directory for the Parquet result parts (re-run to resume)")
+    parser.add_argument("--date", help="Analysis date (YYYY-MM-DD) for sites without one")
+    parser.add_argument("--variables", nargs="+", default=list(VARIABLE_MAP), choices=list(VARIABLE_MAP))
+    parser.add_argument("--threshold", action="append", metavar="VARIABLE=VALUE",
+                        help="Override a variable's threshold; may be repeated")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Sites per part file")
+    parser.add_argument("--workers", type=int, help="Fitting processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Coordinates per API request")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="API requests in flight")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="API requests per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    sites = read_sites(args.sites, args.date)
+    start = time.perf_counter()
+    stats = asyncio.run(run_pipeline(
+        sites, args.variables, args.output, _parse_thresholds(args.threshold), batch_size=args.batch_size,
+        workers=args.workers, chunk_size=args.chunk_size, concurrency=args.concurrency, rate=args.rate,
+    ))
+    print(f"Processed {stats['sites']} site(s) into {stats['parts']} part(s) in "
+          f"{time.perf_counter() - start:.1f}s; skipped {stats['skipped']} already done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+JSON HTTP service for the data engine and risk model, without Streamlit.
+
+    GET  /health                       liveness and source health
+    GET  /v1/variables                 supported variables and default thresholds
+    GET  /v1/fetch?lat=&lon=&date=     annual samples per variable (`variables`, `window` optional)
+    GET  /v1/analyze?lat=&lon=&date=   the same plus the GEV analysis (`threshold.<Variable>=`, `bootstrap`)
+    POST /v1/bulk                      {"points": [[lat, lon], ...], "date": ..., "variables": [...],
+                                        "thresholds": {...}, "values": false} -> analysis per point
+    GET  /metrics                      telemetry in Prometheus text format
+
+Engine coroutines run on the engine's own event loop (data_engine.http_client),
+so the pooled provider connections, single-flight registry and result memo are
+shared by all requests of a worker. Workers started with `--workers N` bind the
+same port with SO_REUSEPORT and share the on-disk Parquet cache. Responses are
+gzip/deflate compressed when the client accepts it, and GET responses carry an
+ETag so clients can revalidate with If-None-Match.
+
+    python src/service/main.py --port 8080 --workers 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import sys
+from pathlib import Path
+
+import numpy as np
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data_engine.bulk import get_bulk_variables  # noqa: E402
+from data_engine.grid import MAX_CELLS  # noqa: E402
+from data_engine.http_client import submit  # noqa: E402
+from data_engine.main import (  # noqa: E402
+    SOURCES,
+    VARIABLE_MAP,
+    get_multiple_variables_cached_async,
+    meteomatics_auth,
+)
+from modeling.main import DEFAULT_THRESHOLD, DEFAULT_THRESHOLDS, analyze_variable, threshold_sweep  # noqa: E402
+from telemetry.main import METRICS  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+REQUEST_TIMEOUT = 60.0       # seconds a fetch may take before the service answers 504
+MAX_BULK_POINTS = MAX_CELLS
+MAX_BOOTSTRAP = 1000
+MAX_WINDOW = 15
+COMPRESS_MIN_BYTES = 1024    # smaller bodies are sent uncompressed
+CACHE_MAX_AGE = 300          # Cache-Control max-age of GET responses, in seconds
+
+
+# --- Responses ---
+def _plain(value):
+    """`value` with numpy scalars and arrays made JSON-native and non-finite floats as None."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def json_response(request, payload, status=200):
+    """Compact JSON response; GETs get a weak ETag (bodies may be compressed) and answer 304 when it matches."""
+    body = json.dumps(_plain(payload), separators=(",", ":")).encode()
+    headers = {}
+    if request.method == "GET" and status == 200:
+        etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": f"max-age={CACHE_MAX_AGE}"}
+        if _etag_matches(request, etag):
+            return web.Response(status=304, headers=headers)
+    response = web.Response(body=body, status=status, content_type="application/json", headers=headers)
+    if len(body) >= COMPRESS_MIN_BYTES:
+        response.enable_compression()
+    return response
+
+
+def _bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+# --- Parameters ---
+def _number(value, name, low, high):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise _bad_request(f"'{name}' must be a number")
+    if not low <= number <= high:
+        raise _bad_request(f"'{name}' must be between {low:g} and {high:g}")
+    return number
+
+
+def _integer(value, name, low, high):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise _bad_request(f"'{name}' must be an integer")
+    if not low <= number <= high:
+        raise _bad_request(f"'{name}' must be between {low} and {high}")
+    return number
+
+
+def _date(value):
+    try:
+        return str(np.datetime64(value, "D"))
+    except (TypeError, ValueError):
+        raise _bad_request("'date' must be YYYY-MM-DD")
+
+
+def _variables(value):
+    names = value.split(",") if isinstance(value, str) else list(value or VARIABLE_MAP)
+    names = [name.strip() for name in names if name.strip()]
+    unknown = [name for name in names if name not in VARIABLE_MAP]
+    if unknown:
+        raise _bad_request(f"Unknown variable(s) {unknown}; expected some of {list(VARIABLE_MAP)}")
+    return list(dict.fromkeys(names)) or list(VARIABLE_MAP)
+
+
+def _point_query(request):
+    query = request.query
+    if "date" not in query:
+        raise _bad_request("'date' is required")
+    location = {"lat": _number(query.get("lat"), "lat", -90, 90), "lon": _number(query.get("lon"), "lon", -180, 180)}
+    return location, _date(query["date"]), _variables(query.get("variables")), _integer(
+        query.get("window", 0), "window", 0, MAX_WINDOW)
+
+
+def _thresholds(items):
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for name, value in items:
+        if name not in VARIABLE_MAP:
+            raise _bad_request(f"Threshold for unknown variable '{name}'")
+        thresholds[name] = _number(value, f"threshold.{name}", -math.inf, math.inf)
+    return thresholds
+
+
+# --- Analysis ---
+def _analysis(result, threshold, bootstrap=0):
+    """analyze_variable plus the threshold's return period for one result, or None without values."""
+    if not np.any(~np.isnan(np.asarray(result["values"], dtype=float))):
+        return None
+    analysis = analyze_variable(result, threshold, bootstrap=bootstrap)
+    analysis["threshold"] = threshold
+    analysis["years"] = int(np.sum(~np.isnan(np.asarray(result["values"], dtype=float))))
+    analysis["return_period"] = float(threshold_sweep(result, [threshold])["return_period"][0])
+    return analysis
+
+
+async def _fetch(location, selected_date, variables, window):
+    try:
+        return await get_multiple_variables_cached_async(selected_date, variables, location, window,
+                                                         timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise web.HTTPGatewayTimeout(text=json.dumps({"error": f"Fetch took over {REQUEST_TIMEOUT:g}s"}),
+                                     content_type="application/json")
+
+
+# --- Handlers ---
+async def health(request):
+    return json_response(request, {
+        "status": "ok",
+        "sources": {s.name: {"available": s.available(), "healthy": s.healthy()} for s in SOURCES},
+        "meteomatics_credentials": meteomatics_auth() is not None,
+    })
+
+
+async def variables(request):
+    return json_response(request, {
+        name: {"unit": unit, "default_threshold": DEFAULT_THRESHOLDS.get(name, DEFAULT_THRESHOLD)}
+        for name, (_, unit, _, _) in VARIABLE_MAP.items()
+    })
+
+
+async def fetch(request):
+    location, selected_date, names, window = _point_query(request)
+    results = await _fetch(location, selected_date, names, window)
+    return json_response(request, {"location": location, "date": selected_date, "window": window,
+                                   "results": {name: r.as_dict() for name, r in zip(names, results)}})
+
+
+async def analyze(request):
+    location, selected_date, names, window = _point_query(request)
+    thresholds = _thresholds((k.removeprefix("threshold."), v) for k, v in request.query.items()
+                             if k.startswith("threshold."))
+    bootstrap = _integer(request.query.get("bootstrap", 0), "bootstrap", 0, MAX_BOOTSTRAP)
+    results = await _fetch(location, selected_date, names, window)
+    loop = asyncio.get_running_loop()
+    analyses = await loop.run_in_executor(None, lambda: [
+        _analysis(r, thresholds.get(name, DEFAULT_THRESHOLD), bootstrap) for name, r in zip(names, results)])
+    return json_response(request, {
+        "location": location, "date": selected_date, "window": window,
+        "results": {name: {**r.as_dict(), "analysis": a} for name, r, a in zip(names, results, analyses)},
+    })
+
+
+async def bulk(request):
+    try:
+        body = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        raise _bad_request("Body must be JSON")
+    if not isinstance(body, dict):
+        raise _bad_request("Body must be a JSON object")
+    try:
+        points = np.asarray(body.get("points", []), dtype=float).reshape(-1, 2)
+    except (TypeError, ValueError):
+        raise _bad_request("'points' must be a list of [lat, lon] pairs")
+    if not 0 < len(points) <= MAX_BULK_POINTS:
+        raise _bad_request(f"'points' must hold 1 to {MAX_BULK_POINTS} pairs")
+    if np.any(np.abs(points[:, 0]) > 90) or np.any(np.abs(points[:, 1]) > 180):
+        raise _bad_request("'points' hold coordinates out of range")
+    if "date" not in body:
+        raise _bad_request("'date' is required")
+    selected_date = _date(body["date"])
+    names = _variables(body.get("variables"))
+    thresholds = _thresholds((body.get("thresholds") or {}).items())
+    with_values = bool(body.get("values", False))
+
+    future = submit(get_bulk_variables(points, names, selected_date))
+    try:
+        results = await asyncio.wait_for(asyncio.wrap_future(future), REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise web.HTTPGatewayTimeout(text=json.dumps({"error": f"Fetch took over {REQUEST_TIMEOUT:g}s"}),
+                                     content_type="application/json")
+
+    def summarize():
+        rows = []
+        for (lat, lon), point_results in zip(points, results):
+            row = {"lat": lat, "lon": lon, "results": {}}
+            for name in names:
+                r = point_results[name]
+                entry = r.as_dict() if with_values else {"source": r["source"], "unit": r["unit"]}
+                entry["analysis"] = _analysis(r, thresholds.get(name, DEFAULT_THRESHOLD))
+                row["results"][name] = entry
+            rows.append(row)
+        return rows
+
+    rows = await asyncio.get_running_loop().run_in_executor(None, summarize)
+    return json_response(request, {"date": selected_date, "points": rows})
+
+
+async def metrics(request):
+    return web.Response(text=METRICS.render(), content_type="text/plain", charset="utf-8")
+
+
+@web.middleware
+async def count_requests(request, handler):
+    route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+    with METRICS.timed("service_request", route=route):
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            METRICS.inc("service_requests_total", route=route, status=e.status)
+            raise
+    METRICS.inc("service_requests_total", route=route, status=response.status)
+    return response
+
+
+def create_app():
+    app = web.Application(middlewares=[count_requests], client_max_size=8 * 1024 * 1024)
+    app.router.add_get("/health", health)
+    app.router.add_get("/v1/variables", variables)
+    app.router.add_get("/v1/fetch", fetch)
+    app.router.add_get("/v1/analyze", analyze)
+    app.router.add_post("/v1/bulk", bulk)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+# --- Workers ---
+def serve(host="127.0.0.1", port=DEFAULT_PORT, reuse_port=False):
+    """Run one worker until interrupted."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    web.run_app(create_app(), host=host, port=port, reuse_port=reuse_port, print=None,
+                access_log=None)
+
+
+def run(host="127.0.0.1", port=DEFAULT_PORT, workers=1):
+    """
+    Serve on `host:port` with `workers` processes sharing the port (SO_REUSEPORT, Linux and BSD).
+    Each worker has its own engine loop and in-memory caches; the Parquet cache on disk is shared.
+    """
+    if workers <= 1:
+        serve(host, port)
+        return
+    processes = [multiprocessing.Process(target=serve, args=(host, port, True), name=f"service-{i}")
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info("Serving on http://%s:%s with %d workers", host, port, workers)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the data engine and risk model as a JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="Processes sharing the port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    run(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+In-process metrics for the data engine, modeling and UI.
+
+Counters and per-stage timing histograms are kept in one process-wide
+registry (`METRICS`), keyed by metric name and labels. Components that already
+keep their own statistics (memory cache, single-flight, spatial index) register
+collectors that are read at render time. The registry renders the Prometheus
+text exposition format, either on demand or from a small HTTP exporter thread.
+
+    from telemetry.main import METRICS, timed
+    with timed("network", source="meteomatics"):
+        ...
+    METRICS.inc("cache_requests_total", tier="memory", result="hit")
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "risk_explorer_"
+# Upper bounds in seconds, from sub-millisecond cache hits to multi-second API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_METRIC = "stage_seconds"
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (an overestimate by at most one bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Thread-safe registry of counters, histograms and collected gauges."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to the counter `name` with `labels`."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in the histogram `name` with `labels`."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        """Time the body of a `with` block as `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_METRIC, time.perf_counter() - start, stage=stage, **labels)
+
+    def register_collector(self, name, collect):
+        """Read `collect()` (a dict of numbers) as gauges named `<name>_<key>` at render time."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+        gauges = {}
+        for name, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", name, e)
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    gauges[f"{name}_{key}"] = float(value)
+        return gauges
+
+    def snapshot(self):
+        """
+        Current values as plain data, for display.
+        Returns:
+            Dictionary containing:
+                - stages: {stage: {count, total_s, mean_ms, p95_ms, max_ms}} merged over other labels
+                - counters: {name: {label string: value}}
+                - gauges: {name: value} from the registered collectors
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, h.max, h.quantile(0.95)) for key, h in self._histograms.items()}
+        stages = {}
+        for (name, labels), (count, total, peak, p95) in histograms.items():
+            if name != STAGE_METRIC:
+                continue
+            stage = dict(labels)["stage"]
+            entry = stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_ms": 0.0, "p95_ms": 0.0})
+            entry["count"] += count
+            entry["total_s"] += total
+            entry["max_ms"] = max(entry["max_ms"], peak * 1000)
+            entry["p95_ms"] = max(entry["p95_ms"], p95 * 1000)
+        for entry in stages.values():
+            entry["mean_ms"] = entry["total_s"] / entry["count"] * 1000 if entry["count"] else 0.0
+        counter_view = {}
+        for (name, labels), value in counters.items():
+            counter_view.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+        return {"stages": stages, "counters": counter_view, "gauges": self._collect()}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.count, h.sum)) for key, h in self._histograms.items()
+            )
+        lines = []
+        last = None
+        for (name, labels), value in counters:
+            if name != last:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                last = name
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+        last = None
+        for (name, labels), (counts, count, total) in histograms:
+            if name != last:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                last = name
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        for name, value in sorted(self._collect().items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop all counters and histograms (collectors stay registered)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Shared by every module in this process.
+METRICS = Metrics()
+inc = METRICS.inc
+observe = METRICS.observe
+timed = METRICS.timed
+
+
+# --- Exporter ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(port=9464, host="127.0.0.1", metrics=METRICS):
+    """Serve `/metrics` from a daemon thread. Safe to call repeatedly; returns the running server."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            server.metrics = metrics
+            threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+            logger.info("Metrics exporter listening on http://%s:%s/metrics", host, server.server_address[1])
+            _exporter = server
+        return _exporter
+
+
+def stop_exporter():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.shutdown()
+            _exporter.server_close()
+            _exporter = None
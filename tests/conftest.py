@@ -0,0 +1,59 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from data_engine.fake_servers import fake_meteomatics, fake_nasa_power  # noqa: E402
+from data_engine.http_client import close_client, configure_client  # noqa: E402
+
+
+@pytest.fixture
+def meteomatics_server():
+    """A running fake Meteomatics API with the shared engine client pointed at it."""
+    with fake_meteomatics() as server:
+        configure_client(base_url=server.url)
+        yield server
+        close_client()
+
+
+@pytest.fixture
+def nasa_power_server():
+    with fake_nasa_power() as server:
+        yield server
+
+
+@pytest.fixture
+def credentials(monkeypatch):
+    monkeypatch.setenv("RISK_EXPLORER_CONFIG", os.devnull)
+    monkeypatch.setenv("METEOMATICS_USERNAME", "test")
+    monkeypatch.setenv("METEOMATICS_PASSWORD", "test")
+    from data_engine.config import load_config
+    load_config(reload=True)
+    yield
+    load_config(reload=True)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch, credentials, meteomatics_server):
+    """data_engine.main on an empty store, fetching from the fake Meteomatics server only."""
+    import data_engine.main as engine
+    from data_engine.memcache import MEMORY_CACHE
+    from data_engine.scheduler import RequestScheduler
+    from data_engine.spatial import SpatialIndex
+    from data_engine.store import CacheStore
+
+    scheduler = RequestScheduler(max_retries=1, backoff_base=0.01, name="meteomatics")
+    monkeypatch.setattr(engine, "STORE", CacheStore(tmp_path / "store"))
+    monkeypatch.setattr(engine, "SPATIAL", SpatialIndex())
+    monkeypatch.setattr(engine, "_spatial_loaded", False)
+    monkeypatch.setattr(engine, "SCHEDULER", scheduler)
+    monkeypatch.setattr(engine.METEOMATICS, "scheduler", scheduler)
+    monkeypatch.setattr(engine, "SOURCES", [engine.METEOMATICS])
+    MEMORY_CACHE.clear()
+    engine.RESULTS.clear()
+    yield engine
+    MEMORY_CACHE.clear()
+    engine.RESULTS.clear()
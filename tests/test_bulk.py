@@ -0,0 +1,38 @@
+import time
+
+from data_engine.bulk import get_bulk_variables
+
+POINTS = [(46.0 + i, 7.0 + i) for i in range(7)]
+
+
+def bulk(engine, points=POINTS, variables=("Temperature", "Humidity"), **kwargs):
+    return engine.run_sync(get_bulk_variables(points, list(variables), "2024-07-01", **kwargs))
+
+
+def test_points_are_fetched_in_chunks_and_then_served_from_cache(engine, meteomatics_server):
+    results = bulk(engine, chunk_size=3, concurrency=2, rate=None)
+    assert meteomatics_server.stats["requests"] == 3
+    assert len(results) == len(POINTS)
+    for point in results:
+        assert point["Temperature"]["source"] == point["Humidity"]["source"] == "Meteomatics"
+        assert len(point["Temperature"].values) == 30
+
+    again = bulk(engine, chunk_size=3, rate=None)
+    assert meteomatics_server.stats["requests"] == 3
+    assert {point["Temperature"]["source"] for point in again} == {"Meteomatics (cache)"}
+    assert [list(p["Temperature"].values) for p in again] == [list(p["Temperature"].values) for p in results]
+
+
+def test_concurrency_bounds_requests_in_flight(engine, meteomatics_server):
+    meteomatics_server.latency = 0.2
+    start = time.perf_counter()
+    bulk(engine, chunk_size=2, concurrency=1, rate=None)
+    assert time.perf_counter() - start >= 4 * 0.2  # four chunks, one at a time
+    assert meteomatics_server.stats["requests"] == 4
+
+
+def test_unsupported_variables_are_reported_unavailable(engine, meteomatics_server):
+    results = bulk(engine, points=POINTS[:2], variables=("Temperature", "Sea Level"), rate=None)
+    assert meteomatics_server.stats["requests"] == 1
+    assert all(point["Sea Level"]["source"] == "Unavailable" for point in results)
+    assert all(point["Temperature"]["source"] == "Meteomatics" for point in results)
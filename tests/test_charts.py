@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from frontend.charts import (
+    cached_chart,
+    data_hash,
+    downsample,
+    histogram,
+    histogram_spec,
+    lttb,
+    minmax_buckets,
+    trend_png,
+    trend_spec,
+)
+
+DATES = np.datetime64("1995-01-01") + np.arange(10_000)
+VALUES = np.sin(np.arange(10_000) / 50) * 10 + np.random.default_rng(0).normal(0, 1, 10_000)
+VALUES[1234], VALUES[8765] = 40.0, -40.0  # spikes that must survive downsampling
+
+
+def test_lttb_keeps_the_requested_points_the_ends_and_the_spikes():
+    keep = lttb(DATES.astype(float), VALUES, 500)
+    assert len(keep) == 500
+    assert keep[0] == 0 and keep[-1] == len(VALUES) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert {1234, 8765} <= set(keep)
+
+
+def test_minmax_keeps_every_buckets_extremes():
+    keep = minmax_buckets(VALUES, 250)
+    assert len(keep) <= 500
+    assert np.all(np.diff(keep) > 0)
+    for bucket in np.array_split(np.arange(len(VALUES)), 250):
+        kept = VALUES[keep[(keep >= bucket[0]) & (keep <= bucket[-1])]]
+        assert kept.max() == VALUES[bucket].max() and kept.min() == VALUES[bucket].min()
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_drops_nans_and_bounds_the_point_count(method):
+    values = VALUES.copy()
+    values[::7] = np.nan
+    dates, kept = downsample(DATES, values, max_points=1000, method=method)
+    assert len(kept) <= 1000 and len(dates) == len(kept)
+    assert not np.isnan(kept).any()
+    assert kept.max() == 40.0 and kept.min() == -40.0
+
+    short_dates, short = downsample(DATES[:10], values[:10])
+    assert len(short) == 8  # only the NaNs at 0 and 7 are dropped
+
+
+def test_downsample_rejects_unknown_methods():
+    with pytest.raises(ValueError):
+        downsample(DATES, VALUES, max_points=10, method="random")
+
+
+def test_histogram_ignores_nans():
+    counts, edges = histogram([1.0, 2.0, np.nan, 3.0, 4.0], bins=3)
+    assert counts.sum() == 4 and len(edges) == 4
+    counts, edges = histogram([np.nan])
+    assert len(counts) == len(edges) == 0
+
+
+def test_charts_are_cached_by_content():
+    renders = []
+    key = ("trend", data_hash(DATES, VALUES), 25.0)
+    for _ in range(3):
+        chart = cached_chart(key, lambda: renders.append(1) or trend_spec(DATES, VALUES, 25.0, "Temperature", "°C"))
+    assert len(renders) == 1
+    assert len(chart["layer"][0]["data"]["values"]) == 1000
+    assert all(row["value"] > 25.0 for row in chart["layer"][1]["data"]["values"])
+    assert data_hash(VALUES) != data_hash(VALUES.astype(np.float32))
+
+
+def test_renderers_produce_png_and_vega_lite():
+    png = trend_png(DATES, VALUES, 25.0, "Temperature", "°C", max_points=200)
+    assert png.startswith(b"\x89PNG")
+    spec = histogram_spec(VALUES, 25.0, "Temperature", "°C")
+    assert sum(row["count"] for row in spec["layer"][0]["data"]["values"]) == len(VALUES)
@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+
+import numpy as np
+
+from data_engine.http_client import run_sync
+
+LOCATION = {"lat": 46.95, "lon": 7.45}
+
+
+def gather(*calls):
+    async def main():
+        return await asyncio.gather(*calls)
+    return run_sync(main())
+
+
+def test_concurrent_requests_for_other_spans_fetch_their_own(engine):
+    recent, older = gather(
+        engine.get_multiple_variables("2024-07-01", ["Temperature"], LOCATION),
+        engine.get_multiple_variables("2010-07-01", ["Temperature"], LOCATION, window=3),
+    )
+    assert recent[0]["source"] == older[0]["source"] == "Meteomatics"
+    assert np.all(~np.isnan(recent[0].values))
+    assert np.all(~np.isnan(older[0].values))
+
+
+def chunks(engine, selected_date):
+    start, end = engine.history_span(selected_date)
+    return math.ceil((int((end - start).astype(int)) + 1) / engine.MAX_DAYS_PER_REQUEST)
+
+
+def test_variables_are_fetched_in_one_request(engine, meteomatics_server):
+    variables = list(engine.VARIABLE_MAP)
+    results = engine.run_sync(engine.get_multiple_variables("2024-07-01", variables, LOCATION))
+    assert [r["variable"] for r in results] == variables
+    assert {r["source"] for r in results} == {"Meteomatics"}
+    assert meteomatics_server.stats["requests"] == chunks(engine, "2024-07-01")
+
+
+def test_one_request_returns_every_point_and_variable(engine, meteomatics_server):
+    points = [(46.95, 7.45), (47.37, 8.54)]
+    results = engine.run_sync(engine.fetch_meteomatics_series(
+        points, np.datetime64("2024-01-01"), np.datetime64("2024-01-31"), ["Temperature", "Humidity", "Unknown"]))
+    assert meteomatics_server.stats["requests"] == 1
+    for result in results:
+        assert result["Unknown"] is None
+        for variable in ("Temperature", "Humidity"):
+            dates, values = result[variable]
+            assert len(dates) == len(values) == 31
+    assert not np.array_equal(results[0]["Temperature"][1], results[1]["Temperature"][1])
+
+
+def test_cached_results_are_reused_across_reruns(engine, meteomatics_server):
+    first = engine.get_multiple_variables_cached("2024-07-01", ["Temperature"], LOCATION)
+    sent = meteomatics_server.stats["requests"]
+    assert engine.get_multiple_variables_cached("2024-07-01", ["Temperature"], dict(LOCATION)) is first
+    assert meteomatics_server.stats["requests"] == sent
+    wider = engine.get_multiple_variables_cached("2024-07-01", ["Temperature"], LOCATION, window=2)
+    assert wider is not first and len(wider[0].values) == 5 * len(first[0].values)
+
+
+def test_stale_results_are_served_while_they_refresh(engine, meteomatics_server):
+    first = engine.get_multiple_variables_cached("2024-07-01", ["Temperature"], LOCATION)
+    key = engine._result_key("2024-07-01", ["Temperature"], LOCATION, 0)
+    fetched_at = engine.RESULTS.get(key)["fetched_at"]
+    assert engine.get_multiple_variables_cached("2024-07-01", ["Temperature"], LOCATION, max_age=0) is first
+    deadline = time.monotonic() + 5
+    while engine.RESULTS.get(key)["fetched_at"] == fetched_at and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refreshed = engine.RESULTS.get(key)
+    assert refreshed["fetched_at"] > fetched_at
+    assert refreshed["results"][0]["source"] == "Meteomatics (cache)"
+
+
+def test_stream_yields_ready_variables_before_fetched_ones(engine, meteomatics_server):
+    engine.run_sync(engine.get_multiple_variables("2024-07-01", ["Humidity"], LOCATION))
+    order = [var for var, _ in engine.stream_multiple_variables("2024-07-01", ["Temperature", "Humidity", "Sea Level"],
+                                                               LOCATION)]
+    assert order == ["Humidity", "Sea Level", "Temperature"]
+    key = engine._result_key("2024-07-01", ["Temperature", "Humidity", "Sea Level"], LOCATION, 0)
+    assert engine.RESULTS.get(key) is not None
+
+
+def test_stream_times_out_slow_variables_without_memoizing_them(engine, meteomatics_server):
+    meteomatics_server.latency = 0.5
+    results = dict(engine.stream_multiple_variables("2024-07-01", ["Temperature"], LOCATION, timeout=0.1))
+    assert results["Temperature"]["source"] == "Unavailable"
+    assert results["Temperature"].get("timed_out")
+    assert engine.RESULTS.get(engine._result_key("2024-07-01", ["Temperature"], LOCATION, 0)) is None
+
+    # The fetch carries on in the background and fills the cache for the next run
+    deadline = time.monotonic() + 10
+    while engine.cache_load(LOCATION["lat"], LOCATION["lon"], "Temperature", "meteomatics") is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    results = dict(engine.stream_multiple_variables("2024-07-01", ["Temperature"], LOCATION, timeout=0.1))
+    assert results["Temperature"]["source"] == "Meteomatics (cache)"
+
+
+def test_history_slices_span_year_boundaries_and_leap_days():
+    import data_engine.main as engine
+
+    assert list(engine.annual_targets("2024-02-29", years=4).astype(str)) == [
+        "2021-02-28", "2022-02-28", "2023-02-28", "2024-02-29"]
+    assert list(engine.annual_targets("2023-03-01", years=2).astype(str)) == ["2022-03-01", "2023-03-01"]
+
+    start, end = engine.history_span("2024-01-01", window=2, years=2)
+    assert (str(start), str(end)) == ("2022-12-30", "2025-01-02")
+
+    # Daily history with 2024-01-01 missing
+    dates = np.arange(np.datetime64("2022-12-25"), np.datetime64("2024-01-10"))
+    dates = dates[dates != np.datetime64("2024-01-01")]
+    values = (dates - np.datetime64("2022-12-25")).astype(float)
+    targets, sliced = engine.slice_history(dates, values, "2024-01-01", window=2, years=2)
+    assert list(targets.astype(str)) == ["2022-12-30", "2022-12-31", "2023-01-01", "2023-01-02", "2023-01-03",
+                                         "2023-12-30", "2023-12-31", "2024-01-01", "2024-01-02", "2024-01-03"]
+    assert list(sliced[:5]) == [5, 6, 7, 8, 9]
+    assert np.isnan(sliced[7]) and np.isnan(sliced).sum() == 1
+
+    assert engine.missing_spans(dates, start, np.datetime64("2024-01-09")) == [
+        (np.datetime64("2024-01-01"), np.datetime64("2024-01-01"))]
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from frontend.geocoding import GeocodeCache, Gazetteer, Geocoder, normalize_query
+
+PLACES = [
+    ("Zürich", 47.37, 8.54, "CH", 420_000, ["Zurich", "Zurigo"]),
+    ("Bern", 46.95, 7.45, "CH", 130_000, ["Berne"]),
+    ("Bern", 35.10, -77.04, "US", 30_000, []),
+    ("Bergen", 60.39, 5.32, "NO", 285_000, []),
+    ("Berlin", 52.52, 13.40, "DE", 3_600_000, []),
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GeocodeCache(tmp_path / "geocode.sqlite")
+
+
+def remote_lookup(places, calls, delay=0.0):
+    def lookup(query, api_key):
+        calls.append(query)
+        time.sleep(delay)
+        return places.get(normalize_query(query))
+    return lookup
+
+
+def test_normalize_query():
+    assert normalize_query("  Zürich,CH ") == "zurich, ch"
+    assert normalize_query("São  Paulo!") == "sao paulo"
+    assert normalize_query(None) == ""
+
+
+def test_gazetteer_lookup_and_suggest():
+    gazetteer = Gazetteer(PLACES)
+    assert gazetteer.lookup("bern")["name"] == "Bern, CH"  # most populous first
+    assert gazetteer.lookup("Bern, US")["lat"] == 35.10
+    assert gazetteer.lookup("zurigo")["name"] == "Zürich, CH"
+    assert gazetteer.lookup("Bernstadt") is None
+    assert [p["name"] for p in gazetteer.suggest("ber")] == ["Berlin, DE", "Bergen, NO", "Bern, CH", "Bern, US"]
+    assert [p["name"] for p in gazetteer.suggest("ber", limit=2)] == ["Berlin, DE", "Bergen, NO"]
+    assert gazetteer.suggest("") == []
+
+
+def test_gazetteer_answers_are_cached(cache):
+    calls = []
+    geocoder = Geocoder(cache, Gazetteer(PLACES), remote=remote_lookup({}, calls), api_key="key")
+    assert geocoder.geocode("Zürich") == ("found", {"name": "Zürich, CH", "lat": 47.37, "lon": 8.54,
+                                                   "source": "gazetteer"})
+    assert cache.get("zurich")["source"] == "gazetteer"
+    assert calls == []
+
+
+def test_remote_answers_and_misses_are_cached(cache, tmp_path):
+    calls = []
+    places = {"eiger": {"name": "Eiger", "lat": 46.58, "lon": 8.01, "source": "google"}}
+    geocoder = Geocoder(cache, remote=remote_lookup(places, calls), api_key="key")
+    assert geocoder.geocode("Eiger") == ("found", places["eiger"])
+    assert geocoder.geocode("Nowhere") == ("not_found", None)
+    assert calls == ["Eiger", "Nowhere"]
+
+    # A new process reads the same answers from disk without calling the API
+    reopened = Geocoder(GeocodeCache(tmp_path / "geocode.sqlite"), remote=remote_lookup(places, calls), api_key="key")
+    assert reopened.geocode(" eiger ") == ("found", places["eiger"])
+    assert reopened.geocode("nowhere") == ("not_found", None)
+    assert calls == ["Eiger", "Nowhere"]
+
+
+def test_slow_remote_lookups_are_pending_then_served_from_cache(cache):
+    calls = []
+    places = {"eiger": {"name": "Eiger", "lat": 46.58, "lon": 8.01, "source": "google"}}
+    geocoder = Geocoder(cache, remote=remote_lookup(places, calls, delay=0.3), api_key="key")
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(geocoder.geocode("Eiger", wait=0.05)[0]))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == ["pending"] * 3
+    time.sleep(0.4)
+    assert geocoder.geocode("Eiger", wait=0) == ("found", places["eiger"])
+    assert calls == ["Eiger"]  # concurrent lookups shared one request
+
+
+def test_remote_errors_are_not_cached(cache):
+    def broken(query, api_key):
+        raise RuntimeError("Geocoding API status OVER_QUERY_LIMIT")
+
+    geocoder = Geocoder(cache, remote=broken, api_key="key")
+    assert geocoder.geocode("Eiger") == ("error", None)
+    assert cache.get("eiger") is None
+    assert Geocoder(cache, remote=broken, api_key=None).geocode("Eiger") == ("not_found", None)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from data_engine.grid import MAX_CELLS, bbox_around, fetch_grid, grid_axes
+from data_engine.spatial import haversine_km
+from modeling.main import analyze_grid, analyze_variable
+
+
+def test_axes_are_cell_centres():
+    lats, lons = grid_axes((46.0, 7.0, 47.0, 9.0), (2, 4))
+    assert list(lats) == [46.25, 46.75]
+    assert list(lons) == [7.25, 7.75, 8.25, 8.75]
+
+
+def test_bbox_around_is_square_in_kilometres():
+    south, west, north, east = bbox_around(60.0, 10.0, 50)
+    assert haversine_km(south, 10.0, north, 10.0) == pytest.approx(100, rel=1e-3)
+    assert haversine_km(60.0, west, 60.0, east) == pytest.approx(100, rel=1e-2)
+
+
+def test_fetch_grid_fills_every_cell(engine, meteomatics_server):
+    grid = engine.run_sync(fetch_grid((46.0, 7.0, 47.0, 9.0), (3, 4), "Temperature", "2024-07-01", rate=None))
+    assert grid.shape == (30, 3, 4) and grid.values.dtype == np.float32
+    assert grid.coverage() == 1.0
+    assert np.allclose(grid.bounds, ((46.0, 7.0), (47.0, 9.0)))
+    cell = grid.cell(2, 1)
+    assert (cell["lat"], cell["lon"]) == (grid.lats[2], grid.lons[1])
+    assert not np.array_equal(grid.values[:, 0, 0], grid.values[:, 2, 3])
+
+    with pytest.raises(ValueError):
+        engine.run_sync(fetch_grid((46.0, 7.0, 47.0, 9.0), (MAX_CELLS, 2), "Temperature", "2024-07-01"))
+
+
+@pytest.mark.parametrize("method", ["lmoments", "mle"])
+def test_analyze_grid_matches_per_cell_analysis(method):
+    values = np.random.default_rng(4).gumbel(25, 3, size=(30, 2, 3))
+    values[:, 1, 2] = np.nan  # a cell without data
+    values[:5, 0, 1] = np.nan
+    result = analyze_grid(values, 28.0, method=method, workers=1)
+    assert result["probability"].shape == (2, 3)
+    assert np.isnan(result["probability"][1, 2]) and result["years"][1, 2] == 0
+    assert result["years"][0, 1] == 25
+    for i, j in [(0, 0), (0, 1), (1, 1)]:
+        single = analyze_variable({"values": values[:, i, j]}, 28.0, method=method)
+        assert result["probability"][i, j] == pytest.approx(single["probability"], abs=0.01)
+        assert result["risk_index"][i, j] == pytest.approx(single["risk_index"], abs=0.001)
+        assert result["mean"][i, j] == pytest.approx(single["mean"], abs=0.01)
@@ -0,0 +1,70 @@
+import asyncio
+import math
+
+import pytest
+
+from data_engine.http_client import get_client, run_sync
+from data_engine.singleflight import SingleFlight
+
+PATH = "/2024-01-01T00:00:00Z--2024-01-03T00:00:00Z:P1D/t_2m:C/46.9,7.4/json"
+
+
+def test_client_reuses_pooled_connections(meteomatics_server):
+    for _ in range(20):
+        assert run_sync(get_client().get(PATH)).status_code == 200
+    assert meteomatics_server.stats["connections"] == 1
+
+    async def burst():
+        return await asyncio.gather(*(get_client().get(PATH) for _ in range(8)))
+
+    assert all(r.status_code == 200 for r in run_sync(burst()))
+    opened = meteomatics_server.stats["connections"]
+    assert opened <= 8
+    run_sync(burst())  # the second burst finds its connections in the pool
+    assert meteomatics_server.stats["connections"] == opened
+    assert meteomatics_server.stats["requests"] == 36
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert flights.coalesced == 4
+
+
+def test_identical_concurrent_queries_share_one_fetch(engine, meteomatics_server):
+    location = {"lat": 46.95, "lon": 7.45}
+
+    async def main():
+        return await asyncio.gather(*(engine.get_multiple_variables("2024-07-01", ["Temperature"], location)
+                                      for _ in range(5)))
+
+    results = run_sync(main())
+    assert {r[0]["source"] for r in results} == {"Meteomatics"}
+    start, end = engine.history_span("2024-07-01")
+    days = int((end - start).astype(int)) + 1
+    assert meteomatics_server.stats["requests"] == math.ceil(days / engine.MAX_DAYS_PER_REQUEST)
+
+
+def test_engine_loop_persists_across_calls():
+    async def running_loop():
+        return asyncio.get_running_loop()
+
+    loop = run_sync(running_loop())
+    assert run_sync(running_loop()) is loop and loop.is_running()
+
+    async def nested():
+        run_sync(running_loop())
+
+    with pytest.raises(RuntimeError):
+        run_sync(nested())
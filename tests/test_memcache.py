@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pytest
+
+from data_engine.memcache import MemoryCache
+from data_engine.timeseries import TimeSeries
+
+
+def array(n):
+    return np.zeros(n // 8)  # n bytes
+
+
+def test_lru_eviction_respects_the_byte_bound():
+    cache = MemoryCache(max_bytes=3000)
+    for key in "abc":
+        cache.put(key, array(1000))
+    cache.get("a")  # most recently used now
+    cache.put("d", array(1000))
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 3
+    assert stats["bytes"] == 3000
+
+
+def test_entries_expire_after_their_ttl():
+    cache = MemoryCache(ttl=60)
+    cache.put("short", array(80), ttl=0.01)
+    cache.put("long", array(80))
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") is not None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes"] == 80
+
+
+def test_oversized_put_drops_the_old_value():
+    cache = MemoryCache(max_bytes=1000)
+    cache.put("key", array(800))
+    cache.put("key", array(8000))
+    assert cache.get("key") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_cached_values_are_read_only():
+    cache = MemoryCache()
+    series = TimeSeries(np.array(["2024-01-01"], dtype="datetime64[D]"), np.array([1.0]))
+    cache.put("series", {"series": series, "raw": np.ones(3)})
+    value = cache.get("series")
+    with pytest.raises(ValueError):
+        value["raw"][0] = 2.0
+    with pytest.raises(ValueError):
+        value["series"].values[0] = 2.0
@@ -0,0 +1,67 @@
+import numpy as np
+
+from modeling.gev import fit_gev_batch, fit_mle
+from modeling.main import analyze_variable
+
+
+def test_bootstrap_intervals_present_without_data():
+    result = analyze_variable({"values": [None, None]}, 25.0, bootstrap=50)
+    assert np.isnan(result["probability_ci"][0]) and np.isnan(result["risk_index_ci"][1])
+
+
+def test_mle_batch_accepts_a_single_series():
+    series = np.random.default_rng(0).gumbel(20, 3, size=40)
+    c, loc, scale = fit_gev_batch(series, method="mle")
+    assert c.shape == (1,)
+    assert np.allclose((c[0], loc[0], scale[0]), fit_mle(series))
+
+
+def test_concurrent_bootstraps_share_one_pool():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from modeling.bootstrap import bootstrap_ci, process_pool
+
+    values = np.random.default_rng(1).gumbel(20, 3, size=500)
+    expected = bootstrap_ci(values, 25.0, n_resamples=1000, workers=1)
+    with ThreadPoolExecutor(4) as threads:
+        results = list(threads.map(lambda w: bootstrap_ci(values, 25.0, n_resamples=1000, workers=w), [2, 3, 2, 4]))
+    assert all(r == expected for r in results)
+    assert process_pool() is process_pool()
+
+
+def test_fits_are_memoized_on_the_series_contents(monkeypatch):
+    import modeling.main as model
+
+    calls = []
+    fit = model.fit_gev
+    monkeypatch.setattr(model, "fit_gev", lambda values, method: calls.append(method) or fit(values, method))
+    values = np.random.default_rng(2).gumbel(10, 2, size=30)
+    first = model.analyze_variable({"values": list(values)}, 12.0)
+    second = model.analyze_variable({"values": values.copy()}, 15.0)  # same series, other threshold
+    assert calls == ["lmoments"]
+    assert first["probability"] > second["probability"]
+    model.analyze_variable({"values": values}, 12.0, method="mle")
+    assert calls == ["lmoments", "mle"]
+
+
+def test_threshold_sweep_matches_single_threshold_analysis():
+    from modeling.main import threshold_sweep
+
+    data = {"values": list(np.random.default_rng(3).gumbel(25, 4, size=30))}
+    thresholds = np.linspace(20, 45, 11)
+    sweep = threshold_sweep(data, thresholds)
+    singles = [analyze_variable(data, t)["probability"] for t in thresholds]
+    assert np.allclose(sweep["probability"], singles, atol=0.01)
+    assert np.all(np.diff(sweep["probability"]) <= 0)
+    assert np.allclose(sweep["return_period"], 100 / sweep["probability"])
+    assert np.all(np.diff(sweep["return_levels"]) > 0)
+    assert list(sweep["return_periods"]) == [2, 5, 10, 25, 50, 100]
+
+
+def test_threshold_sweep_without_data():
+    from modeling.main import threshold_sweep
+
+    sweep = threshold_sweep({"values": [np.nan]}, [1.0, 2.0])
+    assert list(sweep["probability"]) == [0.0, 0.0]
+    assert np.all(np.isinf(sweep["return_period"]))
+    assert np.all(np.isnan(sweep["return_levels"]))
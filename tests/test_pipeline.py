@@ -0,0 +1,19 @@
+import asyncio
+
+import pandas as pd
+
+from pipeline.main import completed_sites, run_pipeline
+
+
+def test_resume_skips_only_the_dates_already_written(engine, tmp_path):
+    output = tmp_path / "out"
+    sites = pd.DataFrame({"site_id": ["a", "b"], "lat": [46.95, 47.37], "lon": [7.45, 8.54],
+                          "date": ["2024-07-01", "2024-07-01"]})
+    stats = asyncio.run(run_pipeline(sites, ["Temperature"], output, workers=1))
+    assert stats == {"sites": 2, "skipped": 0, "parts": 1}
+
+    # The same sites for another date are new work, not a resume
+    later = pd.concat([sites, sites.assign(date="2024-08-01")], ignore_index=True)
+    stats = asyncio.run(run_pipeline(later, ["Temperature"], output, workers=1))
+    assert stats == {"sites": 2, "skipped": 2, "parts": 1}
+    assert completed_sites(output) == {(s, d) for s in "ab" for d in ("2024-07-01", "2024-08-01")}
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import data_engine.prefetch as prefetch
+from data_engine.http_client import get_client
+
+DAY = "2024-07-10"
+SPAN = ("2024-07-01", DAY)
+PATH = "/2024-01-01T00:00:00Z--2024-01-03T00:00:00Z:P1D/t_2m:C/46.9,7.4/json"
+
+
+@pytest.fixture
+def prefetcher(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch, "STORE", engine.STORE)
+    monkeypatch.setattr(prefetch, "SOURCES", engine.SOURCES)
+    return prefetch.Prefetcher(queue=prefetch.PrefetchQueue(tmp_path / "prefetch.sqlite"), max_age=None,
+                               max_bytes=None)
+
+
+def run_with_user_traffic(engine, prefetcher, requests=5):
+    """Run the prefetcher while other callers send `requests` through the same scheduler."""
+    async def main():
+        user = [engine.SCHEDULER.request(lambda: get_client().get(PATH)) for _ in range(requests)]
+        summary, *_ = await asyncio.gather(prefetcher.run_once(today=DAY), *user)
+        return summary
+    return engine.run_sync(main())
+
+
+def test_cost_counts_only_the_prefetchers_own_requests(engine, prefetcher, meteomatics_server):
+    meteomatics_server.latency = 0.05
+    prefetcher.queue.enqueue(46.95, 7.45, "Temperature", *SPAN)
+    summary = run_with_user_traffic(engine, prefetcher)
+    assert summary["done"] == 1
+    assert summary["requests"] == 1
+    assert engine.SCHEDULER.counts["attempts"] == 6
+    assert prefetcher.queue.spent(DAY) == 1
+    assert prefetcher.stats()["requests_spent_total"] == 1
+
+
+def test_requeued_jobs_are_reported_as_retried(engine, prefetcher, meteomatics_server):
+    meteomatics_server.error_rate = 1.0
+    prefetcher.queue.enqueue(46.95, 7.45, "Temperature", *SPAN)
+    summary = engine.run_sync(prefetcher.run_once(today=DAY))
+    assert (summary["done"], summary["retried"], summary["failed"]) == (0, 1, 0)
+    assert summary["requests"] == engine.SCHEDULER.counts["attempts"] == 2  # one try and one retry
+    assert len(prefetcher.queue.pending(limit=10)) == 1
+
+
+def test_memoized_reruns_do_not_count_as_accesses(tmp_path):
+    queue = prefetch.PrefetchQueue(tmp_path / "prefetch.sqlite")
+    queue.record_access(46.95, 7.45, "Temperature", DAY, "api")
+    for _ in range(20):
+        queue.record_access(47.37, 8.54, "Temperature", DAY, "memo")
+    queue.record_access(47.37, 8.54, "Temperature", DAY, "cache")
+    assert [hits for *_, hits in queue.hot_keys()] == [1, 1]
+    assert queue.warm_stats() == {"accesses": 2, "warm_hits": 1, "warm_hit_ratio": 0.5}
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from data_engine.fake_servers import fake_meteomatics
+from data_engine.scheduler import CircuitOpenError, RequestScheduler, RetryableError
+
+PATH = "/2024-01-01T00:00:00Z--2024-01-03T00:00:00Z:P1D/t_2m:C/46.9,7.4/json"
+
+
+def run(scheduler, server, sends=1, path=PATH, timeout=None):
+    """Send `sends` requests through `scheduler` to `server`; returns the responses or exceptions."""
+    async def main():
+        async with httpx.AsyncClient(base_url=server.url) as client:
+            async def one():
+                return await asyncio.wait_for(scheduler.request(lambda: client.get(path)), timeout)
+            return await asyncio.gather(*(one() for _ in range(sends)), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_retries_injected_errors_until_success():
+    scheduler = RequestScheduler(max_retries=5, backoff_base=0.001, seed=1)
+    with fake_meteomatics(error_rate=0.5, seed=3) as server:
+        results = run(scheduler, server, sends=10)
+    assert all(isinstance(r, httpx.Response) and r.status_code == 200 for r in results)
+    assert scheduler.counts["retries"] == server.stats["errors"] > 0
+
+
+def test_retry_honours_retry_after():
+    scheduler = RequestScheduler(max_retries=2, backoff_base=0.001, backoff_max=5)
+    with fake_meteomatics(rate_limit=1, burst=1) as server:
+        start = time.perf_counter()
+        results = run(scheduler, server, sends=2)
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in results)
+    assert server.stats["rate_limited"] >= 1
+    assert elapsed >= 0.9  # the server asked for Retry-After: 1
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    scheduler = RequestScheduler(max_retries=0, breaker_threshold=2, breaker_reset=0.2)
+    with fake_meteomatics(error_rate=1.0) as server:
+        assert all(isinstance(r, RetryableError) for r in run(scheduler, server, sends=2))
+        assert scheduler.breaker.state == "open"
+        sent = server.stats["requests"]
+        assert isinstance(run(scheduler, server)[0], CircuitOpenError)
+        assert server.stats["requests"] == sent
+
+        time.sleep(0.25)
+        assert scheduler.breaker.state == "half_open"
+        server.error_rate = 0.0
+        assert run(scheduler, server)[0].status_code == 200
+    assert scheduler.breaker.state == "closed"
+    assert scheduler.breaker.trips == 1
+
+
+def test_failed_half_open_trial_reopens():
+    scheduler = RequestScheduler(max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+    with fake_meteomatics(error_rate=1.0) as server:
+        run(scheduler, server)
+        time.sleep(0.15)
+        assert isinstance(run(scheduler, server)[0], RetryableError)
+        assert scheduler.breaker.is_open
+    assert scheduler.breaker.trips == 2
+
+
+def _open(scheduler, server):
+    server.error_rate = 1.0
+    run(scheduler, server)
+    server.error_rate = 0.0
+    time.sleep(scheduler.breaker.reset_after + 0.05)
+    assert scheduler.breaker.state == "half_open"
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    scheduler = RequestScheduler(max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+    with fake_meteomatics() as server:
+        _open(scheduler, server)
+        server.latency = 1.0
+        assert isinstance(run(scheduler, server, timeout=0.1)[0], asyncio.TimeoutError)
+        assert not scheduler.breaker.is_open
+        assert scheduler.breaker.allow()  # a new trial may go out
+        scheduler.breaker.release()
+        server.latency = 0.0
+        assert run(scheduler, server)[0].status_code == 200
+    assert scheduler.breaker.state == "closed"
+
+
+def test_unexpected_error_in_half_open_trial_counts_as_failure():
+    scheduler = RequestScheduler(max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+    with fake_meteomatics() as server:
+        _open(scheduler, server)
+
+    async def broken():
+        raise ValueError("bad request parameters")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.request(broken))
+    assert scheduler.breaker.state == "open"
+    time.sleep(0.15)
+    assert scheduler.breaker.allow()
+
+
+def test_hedge_wins_and_cancels_the_slow_attempt():
+    scheduler = RequestScheduler(hedge_percentile=50, hedge_min_samples=1)
+    scheduler._latencies.append(0.01)
+    cancelled = []
+
+    async def main():
+        calls = 0
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            return httpx.Response(200, request=httpx.Request("GET", "http://test"))
+
+        start = time.perf_counter()
+        resp = await scheduler.request(send)
+        await asyncio.sleep(0)  # let the loser observe its cancellation
+        return resp, time.perf_counter() - start
+
+    resp, elapsed = asyncio.run(main())
+    assert resp.status_code == 200
+    assert elapsed < 1
+    assert scheduler.counts["hedges"] == scheduler.counts["hedge_wins"] == 1
+    assert cancelled == [True]
@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import service.main as service
+
+QUERY = {"lat": "46.95", "lon": "7.45", "date": "2024-07-01", "variables": "Temperature"}
+
+
+def call(*requests):
+    """Run `requests` (coroutine functions taking a TestClient) against a fresh app, in order."""
+    async def main():
+        async with TestClient(TestServer(service.create_app())) as client:
+            return [await request(client) for request in requests]
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def app_engine(engine, monkeypatch):
+    monkeypatch.setattr(service, "SOURCES", engine.SOURCES)
+    return engine
+
+
+def test_get_answers_304_when_the_etag_matches():
+    async def first(client):
+        response = await client.get("/v1/variables")
+        return response.status, response.headers["ETag"], await response.json()
+
+    status, etag, body = call(first)[0]
+    assert status == 200 and etag.startswith('W/"')
+    assert "Temperature" in body
+
+    async def revalidate(client):
+        responses = [await client.get("/v1/variables", headers={"If-None-Match": tag})
+                     for tag in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*", '"other"')]
+        return [(r.status, await r.read()) for r in responses]
+
+    (exact, strong, listed, star, other), = call(revalidate)
+    assert exact == strong == listed == star == (304, b"")
+    assert other[0] == 200 and other[1]
+
+
+def test_large_bodies_are_compressed_when_accepted(app_engine):
+    def fetch(encoding):
+        async def request(client):
+            response = await client.get("/v1/fetch", params={**QUERY, "window": "3"},
+                                        headers={"Accept-Encoding": encoding},
+                                        auto_decompress=False)
+            return response.headers.get("Content-Encoding"), await response.read()
+        return request
+
+    (plain_encoding, plain), (gzip_encoding, compressed) = call(fetch("identity"), fetch("gzip"))
+    assert len(plain) >= service.COMPRESS_MIN_BYTES
+    assert plain_encoding is None
+    assert gzip_encoding == "gzip"
+    assert gzip.decompress(compressed) == plain
+
+
+def test_small_bodies_are_sent_uncompressed():
+    async def health(client):
+        response = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+        return response.headers.get("Content-Encoding"), await response.json()
+
+    encoding, body = call(health)[0]
+    assert encoding is None
+    assert body["status"] == "ok"
+
+
+def test_analyze_returns_samples_and_the_gev_fit(app_engine):
+    async def analyze(client):
+        response = await client.get("/v1/analyze", params={**QUERY, "threshold.Temperature": "25"})
+        return response.status, await response.json()
+
+    status, body = call(analyze)[0]
+    assert status == 200
+    result = body["results"]["Temperature"]
+    assert result["source"] == "Meteomatics"
+    assert result["analysis"]["threshold"] == 25
+    assert result["analysis"]["years"] == len(result["values"])
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"lat": "46.95", "lon": "7.45"}, "'date' is required"),
+    ({**QUERY, "lat": "91"}, "'lat' must be between"),
+    ({**QUERY, "variables": "Snow"}, "Unknown variable"),
+    ({**QUERY, "window": "x"}, "'window' must be an integer"),
+])
+def test_bad_queries_answer_400(params, message):
+    async def fetch(client):
+        response = await client.get("/v1/fetch", params=params)
+        return response.status, await response.json()
+
+    status, body = call(fetch)[0]
+    assert status == 400
+    assert message in body["error"]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from data_engine.scheduler import RequestScheduler
+from data_engine.sources import NasaPowerSource, fetch_first_good
+
+SPAN = [(np.datetime64("2024-07-01"), np.datetime64("2024-07-10"))]
+VARIABLES = ["Temperature", "Precipitation"]
+
+
+@pytest.fixture
+def nasa(engine, nasa_power_server):
+    scheduler = RequestScheduler(max_retries=0, name="nasa_power")
+    return NasaPowerSource(engine.VARIABLE_MAP, url=nasa_power_server.url + "/api/temporal/daily/point",
+                           scheduler=scheduler)
+
+
+def fetch(engine, sources, policy):
+    return engine.run_sync(fetch_first_good(sources, 46.95, 7.45, VARIABLES, lambda source, var: SPAN, policy))
+
+
+def winners(answers):
+    return {var: source.name for var, (source, _) in answers.items()}
+
+
+def test_fallback_asks_only_the_first_source_with_data(engine, nasa, meteomatics_server, nasa_power_server):
+    answers = fetch(engine, [engine.METEOMATICS, nasa], "fallback")
+    assert winners(answers) == dict.fromkeys(VARIABLES, "meteomatics")
+    assert len(answers["Temperature"][1][0]) == 10
+    assert nasa_power_server.stats["requests"] == 0
+
+
+def test_fallback_uses_the_next_source_when_the_first_fails(engine, nasa, meteomatics_server, nasa_power_server):
+    meteomatics_server.error_rate = 1.0
+    answers = fetch(engine, [engine.METEOMATICS, nasa], "fallback")
+    assert winners(answers) == dict.fromkeys(VARIABLES, "nasa_power")
+    assert meteomatics_server.stats["requests"] > 0
+    assert nasa_power_server.stats["requests"] == 1
+
+
+def test_fallback_skips_a_source_without_credentials(engine, nasa, meteomatics_server, monkeypatch):
+    monkeypatch.setattr(engine.METEOMATICS, "available", lambda: False)
+    answers = fetch(engine, [engine.METEOMATICS, nasa], "fallback")
+    assert winners(answers) == dict.fromkeys(VARIABLES, "nasa_power")
+    assert meteomatics_server.stats["requests"] == 0
+
+
+def test_race_keeps_the_faster_source(engine, nasa, meteomatics_server, nasa_power_server):
+    meteomatics_server.latency = 1.0
+    answers = fetch(engine, [engine.METEOMATICS, nasa], "race")
+    assert winners(answers) == dict.fromkeys(VARIABLES, "nasa_power")
+    assert nasa_power_server.stats["requests"] == 1
+    assert meteomatics_server.stats["requests"] >= 1  # racing spends a request at both providers
+
+
+def test_unknown_policy_is_rejected(engine, nasa):
+    with pytest.raises(ValueError):
+        fetch(engine, [engine.METEOMATICS, nasa], "fastest")
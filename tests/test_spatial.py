@@ -0,0 +1,39 @@
+import numpy as np
+
+from data_engine.spatial import SpatialIndex, haversine_km
+
+NS = ("Temperature", "meteomatics")
+
+
+def test_grid_hit_is_not_returned_when_a_point_outside_the_cells_is_nearer():
+    index = SpatialIndex(snap_deg=0.01)
+    index.add(NS, 0.0001, 7.005)   # two cells down, inside the 3x3 block
+    index.add(NS, 0.0305, 7.005)   # just outside the block, but closer
+    lat, lon, _ = index.nearest(NS, 0.0195, 7.005, tolerance_km=5)
+    assert (lat, lon) == (0.0305, 7.005)
+
+
+def test_nearest_matches_brute_force_across_tree_rebuilds():
+    rng = np.random.default_rng(0)
+    index = SpatialIndex(snap_deg=0.01, rebuild_every=16)
+    points = []
+    for step in range(200):
+        point = (float(rng.uniform(69.9, 70.1)), float(rng.uniform(19.9, 20.1)))
+        index.add(NS, *point)
+        points.append(point)
+        if step % 7 == 0:
+            lat, lon = rng.uniform(69.9, 70.1), rng.uniform(19.9, 20.1)
+            arr = np.array(points)
+            expected = haversine_km(lat, lon, arr[:, 0], arr[:, 1]).min()
+            assert np.isclose(index.nearest(NS, lat, lon, tolerance_km=100)[2], expected)
+
+
+def test_adds_do_not_discard_the_tree():
+    index = SpatialIndex(rebuild_every=4)
+    for i in range(4):
+        index.add(NS, 40 + i, 10)
+    index.nearest(NS, 45, 10, tolerance_km=500)
+    tree = index._trees[NS]
+    index.add(NS, 50, 10)
+    assert index.nearest(NS, 49.9, 10, tolerance_km=50)[:2] == (50, 10)
+    assert index._trees[NS] is tree
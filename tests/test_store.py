@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_engine.store import CacheStore, cache_key, migrate_legacy_cache
+
+VAR = "Temperature"
+LAT, LON = 46.95, 7.45
+KEY = cache_key(LAT, LON, "meteomatics")
+
+
+def days(start, n):
+    return np.datetime64(start, "D") + np.arange(n)
+
+
+def test_append_and_read_back(tmp_path):
+    store = CacheStore(tmp_path)
+    assert store.get(VAR, KEY, LAT, LON) is None
+    store.append(VAR, KEY, LAT, LON, "meteomatics", days("2024-01-01", 5), [1.0, 2.0, np.nan, 4.0, 5.0])
+    dates, values = store.get(VAR, KEY, LAT, LON)
+    assert list(dates) == list(days("2024-01-01", 5))
+    assert np.array_equal(values, [1.0, 2.0, np.nan, 4.0, 5.0], equal_nan=True)
+    assert store.get(VAR, cache_key(LAT, LON, "nasa_power"), LAT, LON) is None
+
+
+def test_later_writes_win_and_survive_compaction(tmp_path):
+    store = CacheStore(tmp_path)
+    store.append(VAR, KEY, LAT, LON, "meteomatics", days("2024-01-01", 3), [1.0, 2.0, 3.0])
+    store.append(VAR, KEY, LAT, LON, "meteomatics", days("2024-01-03", 2), [30.0, 40.0])
+    other = cache_key(LAT + 0.1, LON, "meteomatics")
+    store.append_many(VAR, "meteomatics", [(other, LAT + 0.1, LON, days("2024-01-01", 2), [7.0, 8.0])])
+    expected = [1.0, 2.0, 30.0, 40.0]
+    assert list(store.get(VAR, KEY, LAT, LON)[1]) == expected
+
+    partition = store.partition_dir(VAR, LAT, LON)
+    assert len(store.fragments(partition)) == 3
+    assert store.compact() == 1
+    assert len(store.fragments(partition)) == 1
+    assert list(store.get(VAR, KEY, LAT, LON)[1]) == expected
+    assert list(store.get(VAR, other, LAT + 0.1, LON)[1]) == [7.0, 8.0]
+    assert set(store.keys()["key"]) == {KEY, other}
+
+
+def test_scan_filters_by_range(tmp_path):
+    store = CacheStore(tmp_path)
+    store.append(VAR, KEY, LAT, LON, "meteomatics", days("2024-01-01", 10), np.arange(10.0))
+    store.append(VAR, cache_key(10.0, 10.0, "meteomatics"), 10.0, 10.0, "meteomatics", days("2024-01-01", 10),
+                 np.arange(10.0))
+    df = store.scan(VAR, lat_range=(46, 47), date_range=("2024-01-03", "2024-01-05"))
+    assert set(df["key"]) == {KEY}
+    assert list(df["value"]) == [2.0, 3.0, 4.0]
+
+
+def test_migrates_legacy_files(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    path = legacy / f"Wind_Speed_{LAT}_{LON}_2024-07-01_meteomatics.parquet"
+    pd.DataFrame({"dates": ["2020-07-01", "2021-07-01"], "values": [3.0, 4.0]}).to_parquet(path)
+    (legacy / "not_a_cache_file.parquet").write_text("garbage")
+    store = CacheStore(tmp_path / "store")
+    assert migrate_legacy_cache(store, legacy, remove=True) == 1
+    assert not path.exists()
+    dates, values = store.get("Wind Speed", KEY, LAT, LON)
+    assert list(dates.astype(str)) == ["2020-07-01", "2021-07-01"]
+    assert list(values) == [3.0, 4.0]
+
+
+def test_expiry_by_age_and_size_keeps_hot_keys(tmp_path):
+    store = CacheStore(tmp_path)
+    hot, cold = KEY, cache_key(LAT + 0.2, LON, "meteomatics")
+    store.append(VAR, hot, LAT, LON, "meteomatics", days("2024-01-01", 3), [1.0, 2.0, 3.0])
+    store.append(VAR, cold, LAT + 0.2, LON, "meteomatics", days("2024-01-01", 3), [1.0, 2.0, 3.0])
+    far = cache_key(-30.0, 140.0, "meteomatics")
+    store.append(VAR, far, -30.0, 140.0, "meteomatics", days("2024-01-01", 3), [1.0, 2.0, 3.0])
+    time.sleep(0.01)
+
+    summary = store.expire(max_age=0, keep={hot})
+    assert summary["keys_removed"] == 2
+    assert store.get(VAR, hot, LAT, LON) is not None
+    assert store.get(VAR, cold, LAT + 0.2, LON) is None
+    assert store.get(VAR, far, -30.0, 140.0) is None
+
+    store.append(VAR, far, -30.0, 140.0, "meteomatics", days("2024-01-01", 3), [1.0, 2.0, 3.0])
+    summary = store.expire(max_bytes=0, keep={hot})
+    assert summary["partitions_removed"] == 1
+    assert store.get(VAR, hot, LAT, LON) is not None
+    assert store.get(VAR, far, -30.0, 140.0) is None
+
+
+def test_concurrent_writers_see_each_others_fragments(tmp_path):
+    first, second = CacheStore(tmp_path), CacheStore(tmp_path)
+    first.append(VAR, KEY, LAT, LON, "meteomatics", days("2024-01-01", 2), [1.0, 2.0])
+    assert first.get(VAR, KEY, LAT, LON) is not None  # indexes the partition
+
+    # Another process writes within the same directory-timestamp tick
+    partition = first.partition_dir(VAR, LAT, LON)
+    mtime = partition.stat().st_mtime_ns
+    other = cache_key(LAT + 0.1, LON, "meteomatics")
+    second.append(VAR, other, LAT + 0.1, LON, "meteomatics", days("2024-01-01", 2), [5.0, 6.0])
+    os.utime(partition, ns=(mtime, mtime))
+    assert list(first.get(VAR, other, LAT + 0.1, LON)[1]) == [5.0, 6.0]
+
+    def write(store, i):
+        lat = LAT + 0.001 * i
+        store.append(VAR, cache_key(lat, LON, "meteomatics"), lat, LON, "meteomatics", days("2024-02-01", 2),
+                     [float(i), float(i)])
+
+    threads = [threading.Thread(target=write, args=(store, i)) for i, store in enumerate([first, second] * 5, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(2, 12):
+        lat = LAT + 0.001 * i
+        for store in (first, second):
+            assert list(store.get(VAR, cache_key(lat, LON, "meteomatics"), lat, LON)[1]) == [float(i)] * 2
@@ -0,0 +1,53 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from data_engine.timeseries import TimeSeries
+
+LEGACY = {"dates": ["2023-07-01", "2024-07-01"], "values": [21.5, None], "variable": "Temperature",
+          "unit": "°C", "source": "Meteomatics", "message": "partial"}
+
+
+def test_dict_round_trip_and_access():
+    series = TimeSeries.from_dict(LEGACY)
+    assert series.dates.dtype == np.dtype("datetime64[D]")
+    assert np.isnan(series.values[1])
+    assert series["source"] == "Meteomatics" and series.get("message") == "partial"
+    assert "unit" in series and "distance_km" not in series
+    assert series.get("distance_km") is None
+    series["distance_km"] = 0.4
+    assert series.meta["distance_km"] == 0.4
+    with pytest.raises(KeyError):
+        series["missing"]
+    assert TimeSeries.from_dict(series.as_dict()).as_dict() == series.as_dict()
+    assert series.as_dict()["values"] == [21.5, None]
+
+
+def test_arrow_round_trip_shares_the_value_buffer():
+    series = TimeSeries(np.array(["2024-01-01", "2024-01-02"], dtype="datetime64[D]"), [1.0, 2.0],
+                        "Temperature", "°C", "Meteomatics")
+    table = series.to_arrow()
+    assert table.schema.field("date").type == pa.date32()
+    back = TimeSeries.from_arrow(table)
+    assert (back.variable, back.unit, back.source) == ("Temperature", "°C", "Meteomatics")
+    assert np.array_equal(back.dates, series.dates) and np.array_equal(back.values, series.values)
+    assert np.shares_memory(back.values, table.column("value").chunk(0).to_numpy())
+    assert TimeSeries.from_arrow(table, source="cache").source == "cache"
+
+
+def test_arrow_nulls_become_nan():
+    table = pa.table({"date": pa.array(np.array(["2024-01-01", "2024-01-02"], dtype="datetime64[D]"), pa.date32()),
+                      "value": pa.array([1.0, None], pa.float64())})
+    assert np.isnan(TimeSeries.from_arrow(table).values[1])
+
+
+def test_shape_mismatch_and_freeze():
+    with pytest.raises(ValueError):
+        TimeSeries(["2024-01-01"], [1.0, 2.0])
+    series = TimeSeries(["2024-01-01", "2024-01-02"], [1.0, np.nan]).freeze()
+    with pytest.raises(ValueError):
+        series.values[0] = 3.0
+    assert list(series.valid_values()) == [1.0]
+    assert len(series) == 2 and series.nbytes == 32
+    assert not hasattr(series, "__dict__")
+    assert len(TimeSeries.empty("Humidity")) == 0